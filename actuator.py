@@ -1,30 +1,66 @@
 import json
+import heapq
 import threading
 import time
-from datetime import datetime, timedelta
-import paho.mqtt.client as mqtt
+from collections import defaultdict
+from datetime import timedelta
+from types import MappingProxyType
+from simclock import get_clock
+from codec import decode_payload
+from sensor import create_client
+from rules import RuleEngine
+from notifications import NotificationFilter
+from climate import MODE_LIMITS, hvac_state, make_controller, state_output
 
 # MQTT Configuration
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
-MQTT_SENSOR_TOPIC = "smartroom/sensors/+"
+MQTT_SENSOR_PREFIX = "smartroom/sensors"
+MQTT_SENSOR_TOPIC = "smartroom/sensors/#"  # JSON and compact (/bin) readings
 MQTT_ACTUATOR_TOPIC = "smartroom/actuators"
 MQTT_COMMAND_TOPIC = "smartroom/commands"
+MQTT_ACK_TOPIC = "smartroom/acks"  # Command acknowledgements, keyed by command_id
+
+# Evaluation Configuration
+ACTUATOR_MIN_INTERVAL = 0.2  # Min real seconds between evaluations (debounce)
+ACTUATOR_IDLE_INTERVAL = None  # Simulated seconds before re-evaluating without updates
+ACTUATOR_HEARTBEAT = 60  # Simulated seconds between unchanged state publishes (None disables)
+HOST_TIMER_TICK = 1.0  # Max real seconds between ActuatorHost heartbeat/idle checks
+RULES_PATH = "rules.json"  # Declarative actuator rules, reloaded when the file changes
+CLIMATE_CONTROLLER = None  # "pid" or "hysteresis" for closed-loop control (see climate.py)
+CLIMATE_MODES = ("OFF", "COOL", "HEAT", "AUTO")
 
 class Actuator:
-    """Base actuator class"""
+    """Base actuator class
+    
+    Actuators re-evaluate when one of their relevant_sensors reports, at most
+    once per min_interval: a burst of updates collapses into one evaluation
+    and an idle actuator blocks without using CPU. State is published
+    (retained) only when it changes, plus a heartbeat for liveness.
+    """
+    relevant_sensors = ()  # Sensor types that trigger process_sensor_data
+    command_fields = ('state',)  # Fields a manual command may set
+    
     def __init__(self, actuator_id, actuator_type):
         self.actuator_id = actuator_id
         self.actuator_type = actuator_type
         self.state = "OFF"
-        try:
-            # Try new version (2.0+) with callback API version
-            self.mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, f"{actuator_type}_{actuator_id}")
-        except AttributeError:
-            # Fall back to old version
-            self.mqtt_client = mqtt.Client(f"{actuator_type}_{actuator_id}")
+        self.mqtt_client = create_client(f"{actuator_type}_{actuator_id}")
         self.sensor_data = {}
         self.running = False
+        self.owns_client = True  # False when an ActuatorHost shares its client
+        self.clock = get_clock()
+        self.min_interval = ACTUATOR_MIN_INTERVAL
+        self.idle_interval = ACTUATOR_IDLE_INTERVAL
+        self.update_event = threading.Event()
+        self.last_evaluated = 0
+        self.evaluations = 0
+        self.heartbeat_interval = ACTUATOR_HEARTBEAT
+        self.last_published_state = None
+        self.last_published_at = None
+        self.state_publishes = 0
+        self.rule_engine = None  # Set by ActuatorDispatcher when rules are loaded
+        self.notification_filter = NotificationFilter(self.clock)
         
     def connect_mqtt(self):
         """Connect to MQTT broker and subscribe to topics"""
@@ -47,35 +83,101 @@ class Actuator:
     def on_message(self, client, userdata, msg):
         """Handle incoming MQTT messages"""
         try:
-            if msg.topic.startswith("smartroom/sensors"):
+            if msg.topic.startswith(MQTT_SENSOR_PREFIX):
                 # Update sensor data
-                data = json.loads(msg.payload.decode())
+                data = decode_payload(msg.topic, msg.payload)
                 self.sensor_data[data['type']] = data
-            elif msg.topic.startswith("smartroom/commands"):
+                if data['type'] in self.relevant_sensors:
+                    self.update_event.set()
+            elif msg.topic.startswith(MQTT_COMMAND_TOPIC):
                 # Handle manual commands
                 command = json.loads(msg.payload.decode())
-                self.handle_command(command)
+                if self.handle_command(command):
+                    self.update_event.set()  # Re-evaluate under the new settings
         except Exception as e:
             print(f"Error processing message: {e}")
     
     def handle_command(self, command):
-        """Handle manual control commands"""
-        if command.get('actuator_id') == self.actuator_id:
-            self.state = command.get('state', self.state)
-            self.publish_state()
-    
-    def publish_state(self):
-        """Publish actuator state"""
-        data = {
+        """Apply a manual command addressed to this actuator and acknowledge it
+        
+        Returns True when a setting other than the state itself was applied,
+        so the caller re-evaluates under the new settings (a manual state is
+        left until the next sensor update).
+        """
+        if command.get('actuator_id') != self.actuator_id:
+            return False
+        applied = []
+        ignored = []
+        for name, value in command.items():
+            if name in ('actuator_id', 'command_id'):
+                continue
+            if self.accepts(name, value):
+                setattr(self, name, value)
+                applied.append(name)
+            else:
+                ignored.append(name)
+        self.publish_state(force=True)
+        self.acknowledge(command, applied, ignored)
+        return any(name != 'state' for name in applied)
+    
+    def accepts(self, name, value):
+        """Whether a command may set field `name` to `value`"""
+        return name in self.command_fields
+    
+    def acknowledge(self, command, applied, ignored):
+        """Publish an ack with the resulting state for commands with a command_id"""
+        if 'command_id' not in command:
+            return
+        ack = {
+            "command_id": command['command_id'],
+            "actuator_id": self.actuator_id,
+            "type": self.actuator_type,
+            "status": "applied" if applied else "rejected",
+            "applied": applied,
+            "ignored": ignored,
+            "state": self.state_fields(),
+            "timestamp": self.clock.now().isoformat()
+        }
+        self.mqtt_client.publish(f"{MQTT_ACK_TOPIC}/{self.actuator_type}", json.dumps(ack), qos=1)
+    
+    def state_fields(self):
+        """Published state, compared between publishes to detect changes"""
+        return {
             "actuator_id": self.actuator_id,
             "type": self.actuator_type,
-            "state": self.state,
-            "timestamp": datetime.now().isoformat()
+            "state": self.state
         }
+    
+    def state_summary(self):
+        return f"{self.actuator_type}: {self.state}"
+    
+    def heartbeat_remaining(self):
+        """Simulated seconds until the next heartbeat is due (None if disabled)"""
+        if not self.heartbeat_interval:
+            return None
+        if self.last_published_at is None:
+            return 0
+        return max(0, self.last_published_at + self.heartbeat_interval - self.clock.time())
+    
+    def publish_state(self, force=False):
+        """Publish actuator state (retained) if it changed or a heartbeat is due
         
+        Returns True when a message was sent.
+        """
+        fields = self.state_fields()
+        changed = fields != self.last_published_state
+        if not (force or changed or self.heartbeat_remaining() == 0):
+            return False
+        
+        data = dict(fields, timestamp=self.clock.now().isoformat())
         topic = f"{MQTT_ACTUATOR_TOPIC}/{self.actuator_type}"
-        self.mqtt_client.publish(topic, json.dumps(data))
-        print(f"{self.actuator_type}: {self.state}")
+        self.mqtt_client.publish(topic, json.dumps(data), retain=True)
+        self.last_published_state = fields
+        self.last_published_at = self.clock.time()
+        self.state_publishes += 1
+        if changed:
+            print(self.state_summary())
+        return True
     
     def run(self):
         """Main actuator loop"""
@@ -83,8 +185,85 @@ class Actuator:
         self.connect_mqtt()
         
         while self.running:
-            self.process_sensor_data()
-            time.sleep(5)  # Process every 5 seconds
+            updated = self.update_event.wait(self.wait_timeout())
+            if not self.running:
+                break
+            if not updated:
+                self.on_timeout()
+                continue
+            
+            # Debounce: let further updates accumulate until min_interval has passed
+            delay = self.last_evaluated + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.update_event.clear()
+            self.evaluate()
+    
+    def wait_timeout(self):
+        """Real seconds to wait for updates before idle evaluation or a heartbeat"""
+        timeouts = [t for t in (self.idle_interval, self.heartbeat_remaining()) if t is not None]
+        return self.clock.real_seconds(min(timeouts)) if timeouts else None
+    
+    def on_timeout(self):
+        """No updates arrived: re-evaluate if idle_interval is set, else just heartbeat"""
+        if self.idle_interval:
+            self.evaluate()
+        self.publish_state()
+        self.flush_notifications()
+    
+    def evaluate(self):
+        """Run the rules for this actuator type (or process_sensor_data) once"""
+        self.last_evaluated = time.monotonic()
+        self.evaluations += 1
+        try:
+            if self.uses_rules():
+                self.apply_rules()
+            else:
+                self.process_sensor_data()
+        except Exception as e:
+            print(f"Error evaluating {self.actuator_type}: {e}")
+    
+    def uses_rules(self):
+        return self.rule_engine is not None and self.rule_engine.has_rules(self.actuator_type)
+    
+    def apply_rules(self):
+        """Apply the winning rule of each group, then publish any state change"""
+        for rule, fields in self.rule_engine.select(self):
+            for name, value in rule.actions.items():
+                current = getattr(self, name, None)
+                if name.startswith('_') or callable(current) or not hasattr(self, name):
+                    print(f"Rule {rule.name}: {self.actuator_type} has no field {name!r}")
+                    continue
+                if isinstance(value, dict):
+                    # Relative change: {"add": n, "min": low, "max": high}
+                    changed = current + value.get('add', 0)
+                    changed = min(value.get('max', changed), max(value.get('min', changed), changed))
+                    value = changed
+                setattr(self, name, value)
+            if rule.notify:
+                self.notify(rule.notify.format_map(fields))
+        self.publish_state()
+    
+    def notify(self, message):
+        """Send a notification unless it is a duplicate or over its rate limit"""
+        if self.notification_filter.admit(message):
+            self.deliver_notification(message)
+    
+    def flush_notifications(self):
+        """Send summaries of notifications suppressed during the last window"""
+        for message, count in self.notification_filter.due_summaries():
+            self.deliver_notification(message, count)
+    
+    def deliver_notification(self, message, count=1):
+        """Publish a notification (subclasses route it to their own topic)"""
+        notification = {
+            "actuator_id": self.actuator_id,
+            "type": "notification",
+            "message": message,
+            "count": count,
+            "timestamp": self.clock.now().isoformat()
+        }
+        self.mqtt_client.publish(f"{MQTT_ACTUATOR_TOPIC}/notifications", json.dumps(notification))
     
     def process_sensor_data(self):
         """Override in subclasses to implement specific logic"""
@@ -93,11 +272,16 @@ class Actuator:
     def stop(self):
         """Stop the actuator"""
         self.running = False
-        self.mqtt_client.loop_stop()
-        self.mqtt_client.disconnect()
+        self.update_event.set()
+        if self.owns_client:
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
 
 class SmartLight(Actuator):
     """Smart lighting control based on ambient light and motion"""
+    relevant_sensors = ('light', 'motion')
+    command_fields = ('state', 'brightness', 'auto_mode')
+    
     def __init__(self, actuator_id="light_01"):
         super().__init__(actuator_id, "smart_light")
         self.brightness = 0
@@ -137,29 +321,41 @@ class SmartLight(Actuator):
         
         self.publish_state()
     
-    def publish_state(self):
-        """Publish light state with brightness"""
-        data = {
-            "actuator_id": self.actuator_id,
-            "type": self.actuator_type,
-            "state": self.state,
-            "brightness": self.brightness,
-            "auto_mode": self.auto_mode,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        topic = f"{MQTT_ACTUATOR_TOPIC}/{self.actuator_type}"
-        self.mqtt_client.publish(topic, json.dumps(data))
-        print(f"Smart Light: {self.state} (Brightness: {self.brightness}%)")
+    def state_fields(self):
+        """Light state with brightness"""
+        fields = super().state_fields()
+        fields["brightness"] = self.brightness
+        fields["auto_mode"] = self.auto_mode
+        return fields
+    
+    def state_summary(self):
+        return f"Smart Light: {self.state} (Brightness: {self.brightness}%)"
 
 class ClimateControl(Actuator):
     """HVAC control based on temperature and humidity"""
+    relevant_sensors = ('temperature', 'humidity')
+    command_fields = ('state', 'mode', 'target_temp', 'target_humidity')
+    
     def __init__(self, actuator_id="climate_01"):
         super().__init__(actuator_id, "climate_control")
-        self.mode = "AUTO"  # OFF, COOL, HEAT, AUTO
+        self.mode = "AUTO"  # One of CLIMATE_MODES
         self.target_temp = 22
         self.target_humidity = 50
+        self.controller = make_controller(CLIMATE_CONTROLLER, self.target_temp)
+        self.output = 0.0  # HVAC output in [-1, 1] when closed-loop
+        self.plant = None  # In-process ThermalPlant to drive directly (see async_runtime.py)
         
+    def uses_rules(self):
+        """Closed-loop control replaces the climate rules"""
+        return self.controller is None and super().uses_rules()
+    
+    def accepts(self, name, value):
+        if name == 'mode':
+            return value in CLIMATE_MODES
+        if name in ('target_temp', 'target_humidity'):
+            return isinstance(value, (int, float)) and not isinstance(value, bool)
+        return super().accepts(name, value)
+    
     def process_sensor_data(self):
         """Adjust climate based on sensor data"""
         temp_data = self.sensor_data.get('temperature', {})
@@ -172,7 +368,15 @@ class ClimateControl(Actuator):
         current_humidity = humidity_data.get('value', 50) if humidity_data else 50
         
         # Temperature control logic
-        if self.mode == "AUTO":
+        if self.controller is not None:
+            self.control(current_temp)
+        elif self.mode == "OFF":
+            self.state = "OFF"
+        elif self.mode == "COOL":
+            self.state = "COOLING" if current_temp > self.target_temp else "IDLE"
+        elif self.mode == "HEAT":
+            self.state = "HEATING" if current_temp < self.target_temp else "IDLE"
+        elif self.mode == "AUTO":
             if current_temp > self.target_temp + 2:
                 self.state = "COOLING"
             elif current_temp < self.target_temp - 2:
@@ -182,24 +386,57 @@ class ClimateControl(Actuator):
         
         # Humidity alert
         if current_humidity < 30 or current_humidity > 70:
-            self.publish_alert("Humidity out of comfort range!")
+            self.notify("Humidity out of comfort range!")
         
         self.publish_state()
     
-    def publish_alert(self, message):
+    def control(self, temperature):
+        """Closed-loop step: the controller output, limited by mode, sets the HVAC state
+
+        The mode's limits go into the controller itself, so its anti-windup
+        sees them and a mode switch does not release a wound-up integral.
+        """
+        self.controller.setpoint = self.target_temp
+        self.controller.low, self.controller.high = MODE_LIMITS[self.mode]
+        self.output = self.controller.update(temperature, self.clock.time())
+        self.state = "OFF" if self.mode == "OFF" else hvac_state(self.output)
+    
+    def evaluate(self):
+        """Evaluate, then apply the resulting HVAC output to an in-process plant"""
+        super().evaluate()
+        if self.plant is not None:
+            output = self.output if self.controller is not None else state_output(self.state)
+            self.plant.set_output(output)
+    
+    def state_fields(self):
+        """Climate state, with the HVAC output when closed-loop"""
+        fields = super().state_fields()
+        if self.controller is not None:
+            fields["output"] = round(self.output, 1)
+        return fields
+    
+    def deliver_notification(self, message, count=1):
+        self.publish_alert(message, count)
+    
+    def publish_alert(self, message, count=1):
         """Publish climate alerts"""
         alert = {
             "actuator_id": self.actuator_id,
             "type": "alert",
             "message": message,
-            "timestamp": datetime.now().isoformat()
+            "count": count,
+            "timestamp": self.clock.now().isoformat()
         }
         self.mqtt_client.publish(f"{MQTT_ACTUATOR_TOPIC}/alerts", json.dumps(alert))
 
 class FocusMode(Actuator):
     """Focus mode controller based on noise levels and study patterns"""
+    relevant_sensors = ('noise', 'motion')
+    command_fields = ('state', 'noise_threshold')
+    
     def __init__(self, actuator_id="focus_01"):
         super().__init__(actuator_id, "focus_mode")
+        self.idle_interval = 60  # Keep the study timer running without updates
         self.noise_threshold = 50
         self.study_start = None
         self.break_reminder_sent = False
@@ -218,36 +455,40 @@ class FocusMode(Actuator):
         # Noise level monitoring
         if noise_level > self.noise_threshold:
             self.state = "NOISY"
-            self.publish_notification("High noise level detected! Consider using headphones.")
+            self.notify("High noise level detected! Consider using headphones.")
         else:
             self.state = "QUIET"
         
         # Study session tracking
         if motion_detected:
             if not self.study_start:
-                self.study_start = datetime.now()
+                self.study_start = self.clock.now()
                 self.break_reminder_sent = False
-                self.publish_notification("Study session started. Good luck!")
+                self.notify("Study session started. Good luck!")
             elif not self.break_reminder_sent and \
-                 (datetime.now() - self.study_start) > timedelta(minutes=45):
-                self.publish_notification("You've been studying for 45 minutes. Time for a break!")
+                 (self.clock.now() - self.study_start) > timedelta(minutes=45):
+                self.notify("You've been studying for 45 minutes. Time for a break!")
                 self.break_reminder_sent = True
         else:
             if self.study_start:
-                duration = (datetime.now() - self.study_start).seconds // 60
+                duration = (self.clock.now() - self.study_start).seconds // 60
                 if duration > 5:  # Only log sessions longer than 5 minutes
-                    self.publish_notification(f"Study session ended. Duration: {duration} minutes")
+                    self.notify(f"Study session ended. Duration: {duration} minutes")
                 self.study_start = None
         
         self.publish_state()
     
-    def publish_notification(self, message):
+    def deliver_notification(self, message, count=1):
+        self.publish_notification(message, count)
+    
+    def publish_notification(self, message, count=1):
         """Publish focus mode notifications"""
         notification = {
             "actuator_id": self.actuator_id,
             "type": "notification",
             "message": message,
-            "timestamp": datetime.now().isoformat()
+            "count": count,
+            "timestamp": self.clock.now().isoformat()
         }
         self.mqtt_client.publish(f"{MQTT_ACTUATOR_TOPIC}/notifications", json.dumps(notification))
         print(f"Focus Mode Notification: {message}")
@@ -263,6 +504,7 @@ class NotificationSystem(Actuator):
             'light': (300, 700),
             'noise': (0, 45)
         }
+        self.relevant_sensors = tuple(self.comfort_ranges)
         
     def process_sensor_data(self):
         """Monitor all conditions and generate consolidated alerts"""
@@ -279,7 +521,7 @@ class NotificationSystem(Actuator):
         if len(alerts) >= 2:
             self.state = "ALERT"
             message = "Multiple comfort issues detected:\n" + "\n".join(alerts)
-            self.publish_notification(message)
+            self.notify(message)
         elif alerts:
             self.state = "WARNING"
         else:
@@ -287,20 +529,239 @@ class NotificationSystem(Actuator):
         
         self.publish_state()
     
-    def publish_notification(self, message):
+    def deliver_notification(self, message, count=1):
+        self.publish_notification(message, count)
+    
+    def publish_notification(self, message, count=1):
         """Publish system-wide notifications"""
         notification = {
             "actuator_id": self.actuator_id,
             "type": "system_notification",
             "message": message,
             "severity": "warning" if self.state == "WARNING" else "alert",
-            "timestamp": datetime.now().isoformat()
+            "count": count,
+            "timestamp": self.clock.now().isoformat()
         }
         self.mqtt_client.publish(f"{MQTT_ACTUATOR_TOPIC}/system_notifications", json.dumps(notification))
         print(f"System Notification: {message}")
 
+class ActuatorDispatcher:
+    """Decodes each message once and routes it to the actuators that need it
+    
+    Sensor readings are decoded into one read-only mapping shared by every
+    actuator whose relevant_sensors (or rules) include the reading's type;
+    commands go to the actuators of the addressed type. With a RuleEngine,
+    each reading is also observed once by the rules that reference it.
+    """
+    def __init__(self, rule_engine=None):
+        self.actuators = []
+        self.rule_engine = rule_engine
+        self.by_sensor = defaultdict(list)  # sensor type -> actuators
+        self.by_type = defaultdict(list)  # actuator type -> actuators
+        
+        # Counters
+        self.decoded = 0
+        self.delivered = 0
+    
+    def add(self, actuator):
+        self.actuators.append(actuator)
+        if self.rule_engine is not None:
+            actuator.rule_engine = self.rule_engine
+            self.rule_engine.register(actuator)
+        self.index(actuator)
+    
+    def index(self, actuator):
+        sensors = set(actuator.relevant_sensors)
+        if self.rule_engine is not None:
+            sensors |= self.rule_engine.sensors_for(actuator.actuator_type)
+        for sensor_type in sensors:
+            self.by_sensor[sensor_type].append(actuator)
+        self.by_type[actuator.actuator_type].append(actuator)
+    
+    def reindex(self):
+        """Rebuild the routing tables after the rules changed"""
+        self.by_sensor = defaultdict(list)
+        self.by_type = defaultdict(list)
+        for actuator in self.actuators:
+            self.index(actuator)
+    
+    def command_topics(self):
+        return [f"{MQTT_COMMAND_TOPIC}/{actuator_type}" for actuator_type in self.by_type]
+    
+    def dispatch(self, topic, payload):
+        """Deliver a raw message; returns the actuators that should re-evaluate"""
+        reloaded = self.rule_engine is not None and self.rule_engine.maybe_reload()
+        if reloaded:
+            self.reindex()
+        targets = self.route(topic, payload)
+        # After a reload every actuator re-evaluates under the new rules
+        return self.actuators if reloaded else targets
+    
+    def route(self, topic, payload):
+        if topic.startswith(MQTT_SENSOR_PREFIX):
+            reading = MappingProxyType(decode_payload(topic, payload))
+            self.decoded += 1
+            sensor_type = reading['type']
+            if self.rule_engine is not None:
+                self.rule_engine.observe(sensor_type, reading.get('value'))
+            targets = self.by_sensor.get(sensor_type, ())
+            for actuator in targets:
+                actuator.sensor_data[sensor_type] = reading
+            self.delivered += len(targets)
+            return targets
+        if topic.startswith(MQTT_COMMAND_TOPIC):
+            command = json.loads(payload.decode())
+            # Actuators that applied the command re-evaluate under the new settings
+            return [actuator for actuator in self.by_type.get(topic.rsplit('/', 1)[-1], ())
+                    if actuator.handle_command(command)]
+        return ()
+
+class ActuatorHost:
+    """Runs many actuators over one MQTT connection and one evaluation thread
+    
+    Messages are decoded once by an ActuatorDispatcher. Actuators with new
+    readings are queued in a heap by the earliest time their min_interval
+    allows, so a burst of updates still yields one evaluation each, and a
+    periodic sweep handles heartbeats and idle re-evaluation.
+    """
+    def __init__(self, client_id="actuator_host", rules_path=RULES_PATH):
+        self.mqtt_client = create_client(client_id)
+        self.dispatcher = ActuatorDispatcher(RuleEngine(rules_path) if rules_path else None)
+        self.heap = []  # (due time, sequence, actuator)
+        self.scheduled = set()  # id() of actuators in the heap
+        self.counter = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        
+        # Counters
+        self.evaluations = 0
+        self.errors = 0
+    
+    @property
+    def actuators(self):
+        return self.dispatcher.actuators
+    
+    def add(self, actuator):
+        """Host an actuator on the shared connection"""
+        actuator.mqtt_client = self.mqtt_client
+        actuator.owns_client = False
+        actuator.running = True
+        self.dispatcher.add(actuator)
+        if self.running and self.mqtt_client.is_connected():
+            self.mqtt_client.subscribe(f"{MQTT_COMMAND_TOPIC}/{actuator.actuator_type}")
+    
+    def connect_mqtt(self):
+        """Connect the shared client to the MQTT broker"""
+        self.mqtt_client.on_connect = self.on_connect
+        self.mqtt_client.on_message = self.on_message
+        try:
+            self.mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
+            self.mqtt_client.loop_start()
+            print("Actuator host connected to MQTT broker")
+        except Exception as e:
+            print(f"Failed to connect actuator host: {e}")
+    
+    def on_connect(self, client, userdata, flags, rc):
+        print(f"Actuator host connected with result code {rc}")
+        client.subscribe(MQTT_SENSOR_TOPIC)
+        for topic in self.dispatcher.command_topics():
+            client.subscribe(topic)
+    
+    def on_message(self, client, userdata, msg):
+        self.handle(msg.topic, msg.payload)
+    
+    def handle(self, topic, payload):
+        """Decode and route one message, queueing affected actuators"""
+        try:
+            targets = self.dispatcher.dispatch(topic, payload)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error processing message on {topic}: {e}")
+            return
+        if targets:
+            self.schedule(targets)
+    
+    def schedule(self, actuators):
+        now = time.monotonic()
+        with self.condition:
+            for actuator in actuators:
+                if id(actuator) in self.scheduled:
+                    continue  # Already queued; it will see the newest reading
+                self.scheduled.add(id(actuator))
+                due = max(now, actuator.last_evaluated + actuator.min_interval)
+                heapq.heappush(self.heap, (due, self.counter, actuator))
+                self.counter += 1
+            self.condition.notify()
+    
+    def start(self, connect=True):
+        """Start the evaluation thread (and connect unless connect=False)"""
+        self.running = True
+        if connect:
+            self.connect_mqtt()
+        self.thread = threading.Thread(target=self.run_evaluator, name="actuator-evaluator")
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def timer_tick(self):
+        """Real seconds between sweeps, short enough for the tightest heartbeat"""
+        tick = HOST_TIMER_TICK
+        for actuator in self.actuators:
+            for interval in (actuator.heartbeat_interval, actuator.idle_interval):
+                if interval:
+                    tick = min(tick, actuator.clock.real_seconds(interval))
+        return max(0.01, tick)
+    
+    def check_timers(self, now):
+        """Idle re-evaluation, heartbeats and notification summaries"""
+        for actuator in self.actuators:
+            if actuator.idle_interval and \
+               now - actuator.last_evaluated >= actuator.clock.real_seconds(actuator.idle_interval):
+                actuator.evaluate()
+                self.evaluations += 1
+            actuator.publish_state()  # Sends only when a heartbeat is due
+            actuator.flush_notifications()
+    
+    def run_evaluator(self):
+        """Evaluate queued actuators when their debounce allows"""
+        next_sweep = time.monotonic()
+        while True:
+            with self.condition:
+                while self.running:
+                    now = time.monotonic()
+                    deadline = min(self.heap[0][0], next_sweep) if self.heap else next_sweep
+                    if deadline <= now:
+                        break
+                    self.condition.wait(deadline - now)
+                if not self.running:
+                    return
+                due = []
+                while self.heap and self.heap[0][0] <= now:
+                    actuator = heapq.heappop(self.heap)[2]
+                    self.scheduled.discard(id(actuator))
+                    due.append(actuator)
+            
+            for actuator in due:
+                actuator.evaluate()
+                self.evaluations += 1
+            if now >= next_sweep:
+                self.check_timers(now)
+                next_sweep = now + self.timer_tick()
+    
+    def stop(self):
+        """Stop evaluating and close the shared connection"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
+        for actuator in self.actuators:
+            actuator.running = False
+        self.mqtt_client.loop_stop()
+        self.mqtt_client.disconnect()
+
 def run_all_actuators():
-    """Run all actuators in separate threads"""
+    """Run all actuators on one shared connection and dispatcher"""
     actuators = [
         SmartLight(),
         ClimateControl(),
@@ -308,16 +769,12 @@ def run_all_actuators():
         NotificationSystem()
     ]
     
-    threads = []
-    
     print("Starting Smart Study Room Actuators...")
     
+    host = ActuatorHost()
     for actuator in actuators:
-        thread = threading.Thread(target=actuator.run)
-        thread.daemon = True
-        thread.start()
-        threads.append((thread, actuator))
-        time.sleep(0.5)  # Stagger actuator starts
+        host.add(actuator)
+    host.start()
     
     try:
         # Keep running until interrupted
@@ -325,10 +782,7 @@ def run_all_actuators():
             time.sleep(1)
     except KeyboardInterrupt:
         print("\nShutting down actuators...")
-        for _, actuator in threads:
-            actuator.stop()
-        for thread, _ in threads:
-            thread.join()
+        host.stop()
         print("All actuators stopped.")
 
 if __name__ == "__main__":
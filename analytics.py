@@ -0,0 +1,524 @@
+import math
+from collections import deque
+import numpy as np
+
+# Rollup Configuration - (bucket width in seconds, buckets retained)
+ROLLUP_LEVELS = (
+    (1, 3600),        # 1 hour of 1s buckets
+    (60, 1440),       # 1 day of 1m buckets
+    (3600, 24 * 35)   # 5 weeks of 1h buckets
+)
+
+# Bucket layout: [start, count, min, max, sum, sumsq, first, last]
+START, COUNT, MIN, MAX, SUM, SUMSQ, FIRST, LAST = range(8)
+
+def new_bucket(start, value):
+    """Create an aggregate bucket holding a single value"""
+    return [start, 1, value, value, value, value * value, value, value]
+
+def bucket_to_dict(bucket):
+    """Convert a bucket to its API shape"""
+    count = bucket[COUNT]
+    mean = bucket[SUM] / count
+    variance = max(0.0, bucket[SUMSQ] / count - mean * mean)
+    return {
+        'start': bucket[START],
+        'count': count,
+        'min': bucket[MIN],
+        'max': bucket[MAX],
+        'sum': bucket[SUM],
+        'sumsq': bucket[SUMSQ],
+        'mean': mean,
+        'std_dev': math.sqrt(variance),
+        'first': bucket[FIRST],
+        'last': bucket[LAST]
+    }
+
+class RollupLevel:
+    """Fixed-width aggregate buckets for one sensor at one resolution
+
+    Buckets are kept in start order in a bounded deque, so appends in time
+    order are O(1) and the oldest bucket expires automatically. Late readings
+    are merged into their existing bucket; ones older than the retained range
+    are ignored.
+    """
+    def __init__(self, resolution, retention):
+        self.resolution = resolution
+        self.retention = retention
+        self.buckets = deque(maxlen=retention)
+
+    def bucket_start(self, timestamp):
+        return int(timestamp // self.resolution) * self.resolution
+
+    def add(self, timestamp, value):
+        """Fold one reading into its bucket"""
+        start = self.bucket_start(timestamp)
+        buckets = self.buckets
+
+        if not buckets or start > buckets[-1][START]:
+            buckets.append(new_bucket(start, value))
+            return
+
+        # Usually the newest bucket; otherwise scan back for a late reading
+        for index in range(len(buckets) - 1, -1, -1):
+            bucket = buckets[index]
+            if bucket[START] == start:
+                bucket[COUNT] += 1
+                bucket[MIN] = min(bucket[MIN], value)
+                bucket[MAX] = max(bucket[MAX], value)
+                bucket[SUM] += value
+                bucket[SUMSQ] += value * value
+                bucket[LAST] = value
+                return
+            if bucket[START] < start:
+                if len(buckets) < self.retention:
+                    buckets.insert(index + 1, new_bucket(start, value))
+                return
+
+    def load(self, buckets):
+        """Replace contents with pre-aggregated buckets in start order"""
+        self.buckets = deque((list(bucket) for bucket in buckets), maxlen=self.retention)
+
+    def query(self, start=None, end=None):
+        """Return buckets overlapping [start, end]"""
+        return [
+            bucket for bucket in self.buckets
+            if (start is None or bucket[START] + self.resolution > start)
+            and (end is None or bucket[START] <= end)
+        ]
+
+    def oldest(self):
+        """Start time of the oldest retained bucket, or None"""
+        return self.buckets[0][START] if self.buckets else None
+
+class Rollups:
+    """Multi-resolution streaming rollups for every sensor"""
+    def __init__(self, levels=ROLLUP_LEVELS):
+        self.level_specs = levels
+        self.sensors = {}
+
+    def levels_for(self, sensor):
+        levels = self.sensors.get(sensor)
+        if levels is None:
+            levels = {resolution: RollupLevel(resolution, retention)
+                      for resolution, retention in self.level_specs}
+            self.sensors[sensor] = levels
+        return levels
+
+    def add(self, sensor, timestamp, value):
+        """Update every resolution with one reading (None is skipped)"""
+        if value is None:
+            return
+        for level in self.levels_for(sensor).values():
+            level.add(timestamp, value)
+
+    def resolutions(self):
+        return [resolution for resolution, _ in self.level_specs]
+
+    def query(self, sensor, resolution, start=None, end=None):
+        """Return bucket dicts for one sensor at one resolution"""
+        levels = self.sensors.get(sensor)
+        if levels is None:
+            return []
+        if resolution not in levels:
+            raise ValueError(f"Unknown rollup resolution: {resolution}")
+        return [bucket_to_dict(bucket) for bucket in levels[resolution].query(start, end)]
+
+    def load(self, sensor, resolution, buckets):
+        """Seed one level from pre-aggregated buckets (e.g. the history store)"""
+        self.levels_for(sensor)[resolution].load(buckets)
+
+def lttb(times, values, threshold):
+    """Largest-Triangle-Three-Buckets downsampling to at most `threshold` points
+
+    Keeps the first and last point and, for each bucket in between, the point
+    forming the largest triangle with the previously kept point and the
+    average of the next bucket. Preserves visual peaks better than averaging.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return times, values
+
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    previous = 0
+
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_lo, next_hi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        next_hi = max(next_hi, next_lo + 1)
+        avg_t = times[next_lo:next_hi].mean()
+        avg_v = values[next_lo:next_hi].mean()
+
+        t0, v0 = times[previous], values[previous]
+        areas = np.abs((t0 - avg_t) * (values[lo:hi] - v0) -
+                       (t0 - times[lo:hi]) * (avg_v - v0))
+        previous = lo + int(np.argmax(areas))
+        keep[i + 1] = previous
+
+    return times[keep], values[keep]
+
+def minmax_decimate(times, mins, maxs, max_points):
+    """Reduce per-bucket (min, max) series to at most `max_points` points
+
+    Buckets are grouped and each group contributes its minimum and maximum,
+    in time order, so spikes survive decimation.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    mins = np.asarray(mins, dtype=np.float64)
+    maxs = np.asarray(maxs, dtype=np.float64)
+    groups = max(1, max_points // 2)
+    n = len(times)
+    if n <= groups:
+        return times, (mins + maxs) / 2
+
+    out_times, out_values = [], []
+    for chunk in np.array_split(np.arange(n), groups):
+        lo_index = chunk[np.argmin(mins[chunk])]
+        hi_index = chunk[np.argmax(maxs[chunk])]
+        for index, value in sorted(((lo_index, mins[lo_index]), (hi_index, maxs[hi_index]))):
+            out_times.append(times[index])
+            out_values.append(value)
+    return np.array(out_times), np.array(out_values)
+
+# Streaming statistics configuration - (label, window in seconds)
+STATS_WINDOWS = (('1m', 60), ('15m', 900), ('1h', 3600))
+TREND_THRESHOLD = 0.1  # Relative change across a window that counts as a trend
+TREND_MIN_POINTS = 5
+STATS_BUCKETS = 60  # Sub-buckets per window; expiry is exact to window / STATS_BUCKETS
+
+# WindowStats bucket layout: [index, count, mean, m2, sum_t, sum_tt, sum_tv, first, last]
+W_COUNT, W_MEAN, W_M2, W_SUM_T, W_SUM_TT, W_SUM_TV, W_FIRST, W_LAST = range(1, 9)
+
+def new_window_bucket(index):
+    return [index, 0, 0.0, 0.0, 0.0, 0.0, 0.0, math.inf, -math.inf]
+
+class WindowStats:
+    """Sliding time-window statistics kept in fixed sub-buckets
+
+    The window is split into `buckets` sub-buckets that each hold a count,
+    Welford mean/M2 and least-squares sums with times relative to the bucket
+    start, so memory is O(buckets) whatever the reading rate. Expiry drops
+    whole buckets, so the window is exact to one bucket width. Buckets are
+    combined when read (parallel variance, shifted regression sums), which
+    keeps the sums well conditioned. The EWMA is time-decayed with a time
+    constant equal to the window.
+    """
+    def __init__(self, window, buckets=STATS_BUCKETS):
+        self.window = window
+        self.slots = buckets
+        self.width = window / buckets
+        self.buckets = deque()  # [index, count, mean, m2, sum_t, sum_tt, sum_tv, first, last]
+        self.reset()
+
+    def reset(self):
+        self.buckets.clear()
+        self.totals = None  # Combined buckets, rebuilt after changes
+        self.ewma = None
+        self.ewma_time = None
+        self.last_value = None
+
+    def add(self, timestamp, value):
+        index = int(timestamp // self.width)
+        bucket = self._bucket(index)
+        if bucket is None:
+            return  # Older than the window
+
+        count = bucket[W_COUNT] = bucket[W_COUNT] + 1
+        delta = value - bucket[W_MEAN]
+        bucket[W_MEAN] += delta / count
+        bucket[W_M2] += delta * (value - bucket[W_MEAN])
+        t = timestamp - index * self.width
+        bucket[W_SUM_T] += t
+        bucket[W_SUM_TT] += t * t
+        bucket[W_SUM_TV] += t * value
+        bucket[W_FIRST] = min(bucket[W_FIRST], timestamp)
+        bucket[W_LAST] = max(bucket[W_LAST], timestamp)
+        self.totals = None
+        self.last_value = value
+
+        # Time-aware EWMA with time constant equal to the window
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            alpha = 1 - math.exp(-max(0.0, timestamp - self.ewma_time) / self.window)
+            self.ewma += alpha * (value - self.ewma)
+        self.ewma_time = timestamp
+
+    def _bucket(self, index):
+        """Bucket for `index`, creating it and expiring old buckets as needed"""
+        buckets = self.buckets
+        if not buckets or index > buckets[-1][0]:
+            buckets.append(new_window_bucket(index))
+            while buckets[0][0] <= index - self.slots:
+                buckets.popleft()
+            return buckets[-1]
+        if index <= buckets[-1][0] - self.slots:
+            return None
+        for position in range(len(buckets) - 1, -1, -1):
+            if buckets[position][0] == index:
+                return buckets[position]
+            if buckets[position][0] < index:
+                bucket = new_window_bucket(index)
+                buckets.insert(position + 1, bucket)
+                return bucket
+        bucket = new_window_bucket(index)
+        buckets.appendleft(bucket)
+        return bucket
+
+    def combined(self):
+        """(count, mean, m2, sum_t, sum_tt, sum_v, sum_tv) over the window
+
+        Times are relative to the start of the oldest bucket.
+        """
+        if self.totals is not None:
+            return self.totals
+        n = 0
+        mean = m2 = sum_t = sum_tt = sum_v = sum_tv = 0.0
+        origin = self.buckets[0][0] if self.buckets else 0
+        for bucket in self.buckets:
+            count = bucket[W_COUNT]
+            if not count:
+                continue
+            # Chan et al. parallel update of mean and M2
+            total = n + count
+            delta = bucket[W_MEAN] - mean
+            mean += delta * count / total
+            m2 += bucket[W_M2] + delta * delta * n * count / total
+            n = total
+            # Shift the bucket's regression sums to the common origin
+            shift = (bucket[0] - origin) * self.width
+            bucket_sum = bucket[W_MEAN] * count
+            sum_tv += bucket[W_SUM_TV] + shift * bucket_sum
+            sum_tt += bucket[W_SUM_TT] + 2 * shift * bucket[W_SUM_T] + count * shift * shift
+            sum_t += bucket[W_SUM_T] + count * shift
+            sum_v += bucket_sum
+        self.totals = (n, mean, m2, sum_t, sum_tt, sum_v, sum_tv)
+        return self.totals
+
+    @property
+    def count(self):
+        return self.combined()[0]
+
+    @property
+    def mean(self):
+        return self.combined()[1]
+
+    def slope(self):
+        """Least-squares slope in units per second"""
+        n, _, _, sum_t, sum_tt, sum_v, sum_tv = self.combined()
+        denominator = n * sum_tt - sum_t * sum_t
+        if n < 2 or denominator <= 1e-12:
+            return 0.0
+        return (n * sum_tv - sum_t * sum_v) / denominator
+
+    def std_dev(self):
+        n, _, m2 = self.combined()[:3]
+        return math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+
+    def span(self):
+        """Seconds between the oldest and newest reading in the window"""
+        first = min((bucket[W_FIRST] for bucket in self.buckets if bucket[W_COUNT]), default=None)
+        last = max((bucket[W_LAST] for bucket in self.buckets if bucket[W_COUNT]), default=None)
+        return last - first if first is not None else 0.0
+
+    def trend(self):
+        """Classify the window as increasing, decreasing or stable"""
+        if self.count < TREND_MIN_POINTS:
+            return "insufficient_data"
+        change = self.slope() * self.span()
+        scale = max(abs(self.mean), self.std_dev(), 1e-9)
+        if change > scale * TREND_THRESHOLD:
+            return "increasing"
+        if change < -scale * TREND_THRESHOLD:
+            return "decreasing"
+        return "stable"
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 4),
+            'std_dev': round(self.std_dev(), 4),
+            'ewma': round(self.ewma, 4) if self.ewma is not None else None,
+            'slope_per_min': round(self.slope() * 60, 6),
+            'trend': self.trend()
+        }
+
+class StreamingStats:
+    """Per-sensor WindowStats for each configured window"""
+    def __init__(self, windows=STATS_WINDOWS):
+        self.windows = windows
+        self.sensors = {}
+
+    def add(self, sensor, timestamp, value):
+        """Feed one reading to every window (None is skipped)"""
+        if value is None or value != value:
+            return
+        stats = self.sensors.get(sensor)
+        if stats is None:
+            stats = {label: WindowStats(seconds) for label, seconds in self.windows}
+            self.sensors[sensor] = stats
+        for window in stats.values():
+            window.add(timestamp, value)
+
+    def summary(self, sensor):
+        """Return current value, headline average/trend and per-window stats"""
+        stats = self.sensors.get(sensor)
+        if not stats:
+            return None
+        primary = stats[self.windows[0][0]]
+        return {
+            'current': primary.last_value,
+            'average': round(primary.mean, 2),
+            'trend': primary.trend(),
+            'windows': {label: window.summary() for label, window in stats.items()}
+        }
+
+# Comfort accounting configuration
+COMFORT_WINDOW = 900  # Seconds of history the comfort score covers
+COMFORT_BUCKET = 60  # Seconds per sliding bucket
+COMFORT_HISTORY = 1440  # Score samples kept per room (one per bucket)
+
+class WindowedCounter:
+    """Sliding-window violation/sample counter over fixed time buckets
+
+    Buckets live in a ring indexed by bucket number; a slot is cleared when
+    the window advances past it, so updates and expiry are O(1) amortized.
+    """
+    def __init__(self, window=COMFORT_WINDOW, bucket=COMFORT_BUCKET):
+        self.bucket = bucket
+        self.slots = max(1, int(math.ceil(window / bucket)))
+        self.epochs = [None] * self.slots
+        self.violations = [0] * self.slots
+        self.samples = [0] * self.slots
+        self.total_violations = 0
+        self.total_samples = 0
+        self.current = None  # Newest bucket number seen
+
+    def advance(self, timestamp):
+        """Expire buckets that fell out of the window ending at timestamp"""
+        index = int(timestamp // self.bucket)
+        if self.current is not None and index <= self.current:
+            return
+        start = index - self.slots + 1
+        if self.current is not None:
+            start = max(start, self.current + 1)
+        for bucket_index in range(start, index + 1):
+            slot = bucket_index % self.slots
+            if self.epochs[slot] is not None:
+                self.total_violations -= self.violations[slot]
+                self.total_samples -= self.samples[slot]
+            self.epochs[slot] = bucket_index
+            self.violations[slot] = 0
+            self.samples[slot] = 0
+        self.current = index
+
+    def add(self, timestamp, violated):
+        """Count one sample (and a violation if `violated`)"""
+        self.advance(timestamp)
+        index = int(timestamp // self.bucket)
+        slot = index % self.slots
+        if self.epochs[slot] != index:
+            return  # Older than the window
+        self.samples[slot] += 1
+        self.total_samples += 1
+        if violated:
+            self.violations[slot] += 1
+            self.total_violations += 1
+
+    def totals(self, window=None):
+        """Return (violations, samples) for the full window or its newest part"""
+        if window is None or self.current is None:
+            return self.total_violations, self.total_samples
+        buckets = min(self.slots, max(1, int(math.ceil(window / self.bucket))))
+        violations = samples = 0
+        for index in range(self.current - buckets + 1, self.current + 1):
+            slot = index % self.slots
+            if self.epochs[slot] == index:
+                violations += self.violations[slot]
+                samples += self.samples[slot]
+        return violations, samples
+
+def comfort_score(violations, samples):
+    """Percentage of in-range samples (100 when nothing was sampled)"""
+    if samples == 0:
+        return 100
+    return round(100 * (1 - violations / samples), 1)
+
+class ComfortTracker:
+    """Windowed comfort violation accounting per sensor and per room
+
+    The score covers only the recent window, so it recovers once conditions
+    return to the comfort range. A per-room score sample is recorded each
+    time a bucket closes to provide a historical series.
+    """
+    def __init__(self, window=COMFORT_WINDOW, bucket=COMFORT_BUCKET, history=COMFORT_HISTORY):
+        self.window = window
+        self.bucket = bucket
+        self.history_size = history
+        self.counters = {}  # room -> {sensor: WindowedCounter}
+        self.latest = {}  # room -> newest timestamp seen
+        self.history = {}  # room -> deque of (bucket_end, score)
+
+    def record(self, room, sensor, timestamp, violated):
+        counters = self.counters.setdefault(room, {})
+        latest = self.latest.get(room)
+
+        # Close the previous bucket into the score history before moving on
+        if latest is not None and int(timestamp // self.bucket) > int(latest // self.bucket):
+            closed_at = (int(latest // self.bucket) + 1) * self.bucket
+            history = self.history.setdefault(room, deque(maxlen=self.history_size))
+            history.append((closed_at, self.score(room)))
+
+        counter = counters.get(sensor)
+        if counter is None:
+            counter = counters[sensor] = WindowedCounter(self.window, self.bucket)
+        counter.add(timestamp, violated)
+        if latest is None or timestamp > latest:
+            self.latest[room] = timestamp
+
+    def _counters(self, room):
+        """Counters for a room advanced to its newest reading"""
+        counters = self.counters.get(room, {})
+        latest = self.latest.get(room)
+        if latest is not None:
+            for counter in counters.values():
+                counter.advance(latest)
+        return counters
+
+    def room_violations(self, room, window=None):
+        """Return {sensor: {'violations', 'samples'}} for one room"""
+        result = {}
+        for sensor, counter in self._counters(room).items():
+            violations, samples = counter.totals(window)
+            result[sensor] = {'violations': violations, 'samples': samples}
+        return result
+
+    def score(self, room=None, window=None):
+        """Comfort score for one room, or across all rooms when room is None"""
+        rooms = [room] if room is not None else list(self.counters)
+        violations = samples = 0
+        for name in rooms:
+            for counts in self.room_violations(name, window).values():
+                violations += counts['violations']
+                samples += counts['samples']
+        return comfort_score(violations, samples)
+
+    def violations(self, window=None):
+        """Windowed violation counts per sensor summed across rooms"""
+        totals = {}
+        for room in self.counters:
+            for sensor, counts in self.room_violations(room, window).items():
+                totals[sensor] = totals.get(sensor, 0) + counts['violations']
+        return totals
+
+    def rooms(self):
+        return list(self.counters)
+
+    def score_history(self, room):
+        """Return [(bucket_end, score), ...] for one room"""
+        return list(self.history.get(room, ()))
@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import socket
+import time
+import paho.mqtt.client as mqtt
+from sensor import (MQTT_BROKER, MQTT_PORT, create_client, TemperatureSensor,
+                    HumiditySensor, LightSensor, NoiseSensor, MotionSensor)
+from actuator import (MQTT_SENSOR_TOPIC, RULES_PATH, ActuatorDispatcher, SmartLight,
+                      ClimateControl, FocusMode, NotificationSystem)
+from rules import RuleEngine
+from climate import ThermalPlant
+
+# Runtime Configuration
+CONNECT_TIMEOUT = 10  # Seconds to wait for the CONNACK, and for queued publishes on disconnect
+# Kernel send buffer of the shared socket. Thousands of sensors publish in
+# bursts on one connection; a 2 MB buffer absorbs a burst without the
+# event loop stalling on a full socket between loop_write calls.
+MQTT_SEND_BUFFER = 2 * 1024 * 1024
+
+class AsyncMQTTClient:
+    """paho-mqtt client driven by the asyncio event loop
+
+    Uses paho's external-loop socket callbacks: the event loop watches the
+    socket and calls loop_read/loop_write when it is ready, and a small task
+    runs loop_misc for keepalives. No network thread is started. The
+    publish(topic, payload) signature matches paho, so it can stand in for
+    the mqtt_client of Sensor and Actuator objects.
+    """
+    def __init__(self, client_id):
+        self.client = create_client(client_id)
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.loop = None
+        self.misc_task = None
+        self.connected = None
+        self.closed = None
+        self.subscriptions = []
+        self.message_handler = None
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self.misc_task = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self.misc_task:
+            self.misc_task.cancel()
+        self.closed.set()
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def _misc_loop(self):
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                break
+
+    def _on_connect(self, client, userdata, flags, rc):
+        for topic in self.subscriptions:
+            client.subscribe(topic)
+        self.connected.set()
+
+    def _on_message(self, client, userdata, msg):
+        if self.message_handler:
+            self.message_handler(msg)
+
+    async def connect(self, host=MQTT_BROKER, port=MQTT_PORT):
+        """Connect and wait for the broker's CONNACK"""
+        self.loop = asyncio.get_running_loop()
+        self.connected = asyncio.Event()
+        self.closed = asyncio.Event()
+        self.client.connect(host, port, 60)
+        self.client.socket().setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MQTT_SEND_BUFFER)
+        await asyncio.wait_for(self.connected.wait(), CONNECT_TIMEOUT)
+
+    def subscribe(self, topic):
+        """Subscribe now and again after any reconnect"""
+        if topic not in self.subscriptions:
+            self.subscriptions.append(topic)
+            if self.connected is not None and self.connected.is_set():
+                self.client.subscribe(topic)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        return self.client.publish(topic, payload, qos, retain)
+
+    async def disconnect(self):
+        """Disconnect once queued publishes have been written by the event loop"""
+        open_socket = self.client.socket() is not None
+        self.client.disconnect()
+        if open_socket:
+            try:
+                await asyncio.wait_for(self.closed.wait(), CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                print("Timed out flushing MQTT publishes on disconnect")
+        if self.misc_task:
+            self.misc_task.cancel()
+
+class AsyncRuntime:
+    """Runs sensors and actuators as coroutines on one event loop
+
+    Each sensor is a task with its own fixed-rate schedule measured against
+    the loop's monotonic clock and each actuator a task woken by relevant
+    updates, so tens of thousands of simulated devices fit in one process
+    and stopping the runtime cancels them cleanly.
+    """
+    def __init__(self, client_id="async_runtime"):
+        self.mqtt = AsyncMQTTClient(client_id)
+        self.mqtt.message_handler = self.dispatch
+        self.sensors = []
+        self.actuators = []
+        self.dispatcher = ActuatorDispatcher(RuleEngine(RULES_PATH))
+        self.wakeups = {}  # actuator_id -> asyncio.Event set on relevant updates
+        self.plant = None  # ThermalPlant closing the climate loop, if any
+        self.tasks = []
+
+        # Counters
+        self.published = 0
+
+    def add_sensor(self, sensor, delay=0):
+        sensor.mqtt_client = self.mqtt
+        sensor.owns_client = False
+        self.sensors.append((sensor, delay))
+
+    def add_actuator(self, actuator):
+        actuator.mqtt_client = self.mqtt
+        actuator.owns_client = False
+        self.actuators.append(actuator)
+        self.dispatcher.add(actuator)
+
+    def dispatch(self, msg):
+        """Decode a message once and wake the actuators that depend on it"""
+        try:
+            targets = self.dispatcher.dispatch(msg.topic, msg.payload)
+        except Exception as e:
+            print(f"Error processing message on {msg.topic}: {e}")
+            return
+        for actuator in targets:
+            wakeup = self.wakeups.get(id(actuator))
+            if wakeup:
+                wakeup.set()
+
+    async def run_sensor(self, sensor, delay):
+        loop = asyncio.get_running_loop()
+        next_fire = loop.time() + delay
+        sensor.running = True
+        while sensor.running:
+            await asyncio.sleep(max(0, next_fire - loop.time()))
+            try:
+                sensor.publish_data(sensor.generate_data())
+                self.published += 1
+            except Exception as e:
+                print(f"Error publishing {sensor.sensor_type}: {e}")
+            interval = sensor.clock.real_seconds(sensor.interval)
+            next_fire += interval
+            if next_fire < loop.time():
+                next_fire = loop.time() + interval  # Fell behind; skip missed slots
+
+    async def run_actuator(self, actuator):
+        """Evaluate an actuator when dispatch reports a relevant update (debounced)"""
+        wakeup = self.wakeups[id(actuator)] = asyncio.Event()
+        actuator.running = True
+        while actuator.running:
+            try:
+                await asyncio.wait_for(wakeup.wait(), actuator.wait_timeout())
+            except asyncio.TimeoutError:
+                actuator.on_timeout()
+                continue
+            delay = actuator.last_evaluated + actuator.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            wakeup.clear()
+            actuator.evaluate()
+
+    async def run(self, duration=None):
+        """Connect, start every device task and run until cancelled or timed out"""
+        if self.actuators:
+            self.mqtt.subscribe(MQTT_SENSOR_TOPIC)
+            for topic in self.dispatcher.command_topics():
+                self.mqtt.subscribe(topic)
+        await self.mqtt.connect()
+        print(f"Async runtime connected: {len(self.sensors)} sensors, {len(self.actuators)} actuators")
+
+        self.tasks = [asyncio.ensure_future(self.run_sensor(sensor, delay))
+                      for sensor, delay in self.sensors]
+        self.tasks += [asyncio.ensure_future(self.run_actuator(actuator))
+                       for actuator in self.actuators]
+        try:
+            if duration is None:
+                await asyncio.gather(*self.tasks)
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Cancel every device task, flush partial frames and disconnect"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for sensor, _ in self.sensors:
+            sensor.running = False
+            try:
+                sensor.publish_frame()
+            except Exception as e:
+                print(f"Error flushing {sensor.sensor_type} frame: {e}")
+        await self.mqtt.disconnect()
+
+def build_runtime(rooms=1, with_actuators=True, compact=False, thermal_plant=False):
+    """Create a runtime with the standard sensor set per room
+    
+    With thermal_plant, the first room's temperature sensor measures a
+    ThermalPlant that the climate actuator drives directly (closed loop).
+    """
+    runtime = AsyncRuntime()
+    runtime.plant = ThermalPlant() if thermal_plant and with_actuators else None
+    sensor_classes = [TemperatureSensor, HumiditySensor, LightSensor, NoiseSensor, MotionSensor]
+    for room in range(rooms):
+        for index, sensor_class in enumerate(sensor_classes):
+            sensor = sensor_class()
+            sensor.compact = compact
+            if rooms > 1:
+                sensor.sensor_id = f"{sensor.sensor_id}_{room:05d}"
+                sensor.set_clock(sensor.clock)  # Re-derive the RNG for the new id
+                sensor.room = f"room_{room:05d}"
+                sensor.verbose = False
+            if room == 0 and isinstance(sensor, TemperatureSensor):
+                sensor.plant = runtime.plant
+            # Spread first publishes across the interval
+            runtime.add_sensor(sensor, delay=(room * len(sensor_classes) + index) % 20 * 0.1)
+    if with_actuators:
+        climate = ClimateControl()
+        climate.plant = runtime.plant
+        for actuator in (SmartLight(), climate, FocusMode(), NotificationSystem()):
+            runtime.add_actuator(actuator)
+    return runtime
+
+def main():
+    parser = argparse.ArgumentParser(description="Run sensors and actuators on asyncio")
+    parser.add_argument('--rooms', type=int, default=1, help="Simulated rooms of 5 sensors each")
+    parser.add_argument('--no-actuators', action='store_true')
+    parser.add_argument('--compact', action='store_true', help="Publish the compact binary format")
+    parser.add_argument('--thermal-plant', action='store_true',
+                        help="Close the loop: room 0's temperature follows the climate actuator")
+    parser.add_argument('--duration', type=float, default=None, help="Seconds to run (default: forever)")
+    args = parser.parse_args()
+
+    runtime = build_runtime(args.rooms, not args.no_actuators, args.compact, args.thermal_plant)
+    try:
+        asyncio.run(runtime.run(args.duration))
+    except KeyboardInterrupt:
+        print("\nShutting down async runtime...")
+    print(f"Async runtime stopped after publishing {runtime.published} readings.")
+    if runtime.plant:
+        print(f"Thermal plant: {runtime.plant.get_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import argparse
+import json
+import math
+import threading
+from datetime import datetime
+from simclock import VirtualClock, get_clock, parse_start
+
+# Closed-Loop Climate Configuration
+CLIMATE_STATE_TOPIC = "smartroom/actuators/climate_control"  # HVAC state fed back to the plant
+OUTPUT_DEADBAND = 0.05  # |output| below this counts as IDLE
+PID_GAINS = (0.5, 0.5 / 1800, 0.0)  # kp (per °C), ki (per °C·s), kd (per °C/s)
+PID_FILTER = 30  # Simulated seconds time constant of the measurement low-pass filter
+HYSTERESIS_BAND = 0.5  # °C either side of the setpoint before switching on
+HYSTERESIS_MIN_CYCLE = 300  # Simulated seconds the HVAC must stay in a state
+THRESHOLD_BAND = 2  # °C band of the original on/off logic
+MODE_LIMITS = {  # (low, high) controller output allowed in each climate mode
+    'OFF': (0.0, 0.0),
+    'COOL': (-1.0, 0.0),
+    'HEAT': (0.0, 1.0),
+    'AUTO': (-1.0, 1.0)
+}
+
+# Thermal plant (simulated room) parameters
+PLANT_TIME_CONSTANT = 7200  # Seconds for the room to close 63% of the gap to equilibrium
+PLANT_HVAC_GAIN = 12  # °C equilibrium shift at full heating/cooling output
+PLANT_HVAC_POWER = 3.0  # kW drawn at full output
+PLANT_OUTDOOR_MEAN = 15  # °C
+PLANT_OUTDOOR_SWING = 6  # °C amplitude of the daily outdoor cycle, peak at 15:00
+PLANT_INTERNAL_GAIN = 3  # °C from occupants/equipment between 08:00 and 20:00
+PLANT_MAX_STEP = 60  # Max simulated seconds per integration step
+PLANT_NOISE = 0.1  # °C standard deviation of sensor noise
+
+def hvac_state(output):
+    if output > OUTPUT_DEADBAND:
+        return "HEATING"
+    if output < -OUTPUT_DEADBAND:
+        return "COOLING"
+    return "IDLE"
+
+def state_output(state):
+    """HVAC output implied by an on/off climate state"""
+    return {"HEATING": 1.0, "COOLING": -1.0}.get(state, 0.0)
+
+class PIDController:
+    """PID controller with output clamping and integral anti-windup
+
+    Output is in [-1, 1]: positive heats, negative cools. The integral only
+    accumulates while the output is unsaturated (or the error pulls it back
+    from saturation), and the derivative acts on the measurement so setpoint
+    changes do not kick the output. Measurements are low-pass filtered so
+    sensor noise does not chatter the output. `low`/`high` may be changed
+    between updates (e.g. by the climate mode); the integral follows them.
+    """
+    def __init__(self, setpoint, gains=PID_GAINS, limits=(-1.0, 1.0), filter_time=PID_FILTER):
+        self.setpoint = setpoint
+        self.kp, self.ki, self.kd = gains
+        self.low, self.high = limits
+        self.filter_time = filter_time
+        self.integral = 0.0
+        self.last_measurement = None
+        self.last_time = None
+        self.output = 0.0
+
+    def update(self, measurement, now):
+        dt = now - self.last_time if self.last_time is not None else 0.0
+        if self.last_measurement is not None and self.filter_time:
+            alpha = dt / (self.filter_time + dt)
+            measurement = self.last_measurement + alpha * (measurement - self.last_measurement)
+        error = self.setpoint - measurement
+        derivative = 0.0
+        if dt > 0 and self.last_measurement is not None:
+            derivative = -(measurement - self.last_measurement) / dt
+
+        integral = self.integral + self.ki * error * dt
+        output = self.kp * error + integral + self.kd * derivative
+        clamped = min(self.high, max(self.low, output))
+        # Anti-windup: keep the new integral only if it does not push further into saturation
+        if clamped == output or (output > self.high and error < 0) or (output < self.low and error > 0):
+            self.integral = integral
+        self.integral = min(self.high, max(self.low, self.integral))
+
+        self.last_measurement = measurement
+        self.last_time = now
+        self.output = clamped
+        return clamped
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_measurement = None
+        self.last_time = None
+        self.output = 0.0
+
+class HysteresisController:
+    """On/off control with a switching band and a minimum cycle time
+
+    Heating starts below setpoint - band and stops at the setpoint (cooling
+    mirrors this), and a state is held for at least min_cycle simulated
+    seconds so the HVAC does not short-cycle on sensor noise. The output is
+    kept within `low`/`high`; a state those limits no longer allow ends at
+    once, whatever the minimum cycle.
+    """
+    def __init__(self, setpoint, band=HYSTERESIS_BAND, min_cycle=HYSTERESIS_MIN_CYCLE,
+                 limits=(-1.0, 1.0)):
+        self.setpoint = setpoint
+        self.band = band
+        self.min_cycle = min_cycle
+        self.low, self.high = limits
+        self.output = 0.0
+        self.switched_at = None
+
+    def update(self, measurement, now):
+        held = self.switched_at is not None and now - self.switched_at < self.min_cycle
+        if held and self.low <= self.output <= self.high:
+            return self.output
+        output = self.output
+        if output > 0 and measurement >= self.setpoint:
+            output = 0.0
+        elif output < 0 and measurement <= self.setpoint:
+            output = 0.0
+        elif output == 0 and measurement < self.setpoint - self.band:
+            output = 1.0
+        elif output == 0 and measurement > self.setpoint + self.band:
+            output = -1.0
+        output = min(self.high, max(self.low, output))
+        if output != self.output:
+            self.output = output
+            self.switched_at = now
+        return self.output
+
+    def reset(self):
+        self.output = 0.0
+        self.switched_at = None
+
+class ThresholdController:
+    """The original ±THRESHOLD_BAND on/off logic, kept for comparison"""
+    def __init__(self, setpoint, band=THRESHOLD_BAND, limits=(-1.0, 1.0)):
+        self.setpoint = setpoint
+        self.band = band
+        self.low, self.high = limits
+        self.output = 0.0
+
+    def update(self, measurement, now):
+        if measurement > self.setpoint + self.band:
+            self.output = -1.0
+        elif measurement < self.setpoint - self.band:
+            self.output = 1.0
+        else:
+            self.output = 0.0
+        self.output = min(self.high, max(self.low, self.output))
+        return self.output
+
+    def reset(self):
+        self.output = 0.0
+
+CONTROLLERS = {
+    'threshold': ThresholdController,
+    'hysteresis': HysteresisController,
+    'pid': PIDController
+}
+
+def make_controller(name, setpoint):
+    """Controller by name, or None for the rule-driven/threshold behaviour"""
+    if not name:
+        return None
+    if name not in CONTROLLERS:
+        raise ValueError(f"Unknown climate controller {name!r}; choose from {sorted(CONTROLLERS)}")
+    return CONTROLLERS[name](setpoint)
+
+class ThermalPlant:
+    """First-order thermal model of the study room
+
+    The room relaxes towards an equilibrium set by the outdoor temperature,
+    internal gains and the HVAC output with time constant
+    PLANT_TIME_CONSTANT. Each step is integrated exactly over at most
+    PLANT_MAX_STEP simulated seconds, so large jumps of an accelerated clock
+    stay accurate. Energy is the HVAC power integrated over time.
+    """
+    def __init__(self, clock=None, initial=None, time_constant=PLANT_TIME_CONSTANT,
+                 hvac_gain=PLANT_HVAC_GAIN, hvac_power=PLANT_HVAC_POWER):
+        self.clock = clock or get_clock()
+        self.time_constant = time_constant
+        self.hvac_gain = hvac_gain
+        self.hvac_power = hvac_power
+        self.lock = threading.Lock()
+        self.updated = None
+        self.output = 0.0
+        self.room_temp = initial
+
+        # Counters
+        self.energy_kwh = 0.0
+        self.hvac_seconds = 0.0  # Output-weighted seconds, for the duty cycle
+        self.elapsed = 0.0
+
+    def outdoor_temp(self, now):
+        moment = datetime.fromtimestamp(now)
+        hour = moment.hour + moment.minute / 60
+        return PLANT_OUTDOOR_MEAN + PLANT_OUTDOOR_SWING * math.cos((hour - 15) / 24 * 2 * math.pi)
+
+    def internal_gain(self, now):
+        return PLANT_INTERNAL_GAIN if 8 <= datetime.fromtimestamp(now).hour < 20 else 0
+
+    def equilibrium(self, now):
+        return self.outdoor_temp(now) + self.internal_gain(now) + self.output * self.hvac_gain
+
+    def advance(self, now):
+        """Integrate the room temperature up to simulated time `now`"""
+        if self.updated is None:
+            self.updated = now
+            if self.room_temp is None:
+                self.room_temp = self.equilibrium(now)
+            return
+        while self.updated < now:
+            dt = min(PLANT_MAX_STEP, now - self.updated)
+            target = self.equilibrium(self.updated)
+            self.room_temp = target + (self.room_temp - target) * math.exp(-dt / self.time_constant)
+            self.energy_kwh += abs(self.output) * self.hvac_power * dt / 3600
+            self.hvac_seconds += abs(self.output) * dt
+            self.elapsed += dt
+            self.updated += dt
+
+    def temperature(self, now=None):
+        now = self.clock.time() if now is None else now
+        with self.lock:
+            self.advance(now)
+            return self.room_temp
+
+    def set_output(self, output, now=None):
+        """Apply a new HVAC output in [-1, 1] from simulated time `now` on"""
+        now = self.clock.time() if now is None else now
+        with self.lock:
+            self.advance(now)
+            self.output = min(1.0, max(-1.0, output))
+
+    def handle_state(self, payload):
+        """Apply a climate_control state message (JSON) to the HVAC output"""
+        data = json.loads(payload)
+        output = data.get('output')
+        if output is None:
+            output = state_output(data.get('state'))
+        self.set_output(output)
+
+    def on_message(self, client, userdata, msg):
+        try:
+            self.handle_state(msg.payload)
+        except Exception as e:
+            print(f"Error applying climate state to thermal plant: {e}")
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'temperature': round(self.room_temp, 2) if self.room_temp is not None else None,
+                'output': self.output,
+                'energy_kwh': round(self.energy_kwh, 3),
+                'duty_cycle': round(self.hvac_seconds / self.elapsed, 3) if self.elapsed else 0.0
+            }
+
+class ControlMetrics:
+    """Stability statistics of a closed-loop run against a setpoint"""
+    def __init__(self, setpoint, comfort_band=1.0):
+        self.setpoint = setpoint
+        self.comfort_band = comfort_band
+        self.last_time = None
+        self.last_state = None
+        self.duration = 0.0
+        self.abs_error = 0.0
+        self.squared_error = 0.0
+        self.in_band = 0.0
+        self.max_above = 0.0
+        self.max_below = 0.0
+        self.switches = 0
+
+    def record(self, now, temperature, output):
+        error = temperature - self.setpoint
+        if self.last_time is not None:
+            dt = now - self.last_time
+            self.duration += dt
+            self.abs_error += abs(error) * dt
+            self.squared_error += error * error * dt
+            if abs(error) <= self.comfort_band:
+                self.in_band += dt
+        self.max_above = max(self.max_above, error)
+        self.max_below = max(self.max_below, -error)
+        state = hvac_state(output)
+        if self.last_state is not None and state != self.last_state:
+            self.switches += 1
+        self.last_state = state
+        self.last_time = now
+
+    def summary(self):
+        duration = self.duration or 1.0
+        return {
+            'mean_abs_error': round(self.abs_error / duration, 3),
+            'rms_error': round(math.sqrt(self.squared_error / duration), 3),
+            'max_above': round(self.max_above, 2),
+            'max_below': round(self.max_below, 2),
+            'time_in_band': round(self.in_band / duration, 3),
+            'switches_per_hour': round(self.switches / (duration / 3600), 2)
+        }
+
+def simulate(controller_name, hours=24, interval=2, setpoint=22, seed=1, start=None):
+    """Run TemperatureSensor, a controller and the plant on a VirtualClock
+
+    Returns the ControlMetrics summary merged with the plant's energy and
+    duty cycle. Deterministic for a given seed, and runs as fast as the CPU
+    allows.
+    """
+    from sensor import TemperatureSensor
+    if start is None:
+        start = datetime(2024, 1, 15).timestamp()
+    clock = VirtualClock(start=start, seed=seed)
+    plant = ThermalPlant(clock, initial=setpoint)
+    sensor = TemperatureSensor()
+    sensor.set_clock(clock)
+    sensor.plant = plant
+    controller = make_controller(controller_name, setpoint)
+    metrics = ControlMetrics(setpoint)
+
+    end = start + hours * 3600
+    while clock.time() < end:
+        now = clock.time()
+        measured = sensor.generate_data()
+        output = controller.update(measured, now)
+        plant.set_output(output, now)
+        metrics.record(now, plant.temperature(now), output)
+        clock.advance(interval)
+
+    results = metrics.summary()
+    stats = plant.get_stats()
+    results['energy_kwh'] = stats['energy_kwh']
+    results['duty_cycle'] = stats['duty_cycle']
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark climate controllers against the thermal plant")
+    parser.add_argument('--controller', choices=sorted(CONTROLLERS) + ['all'], default='all')
+    parser.add_argument('--hours', type=float, default=24 * 7, help="Simulated hours per run")
+    parser.add_argument('--interval', type=float, default=2, help="Simulated seconds between readings")
+    parser.add_argument('--setpoint', type=float, default=22)
+    parser.add_argument('--seed', default=1)
+    parser.add_argument('--start', default=None, help="Simulated start, ISO time or epoch seconds")
+    args = parser.parse_args()
+
+    names = sorted(CONTROLLERS) if args.controller == 'all' else [args.controller]
+    start = parse_start(args.start) if args.start else None
+    print(f"Simulating {args.hours:g}h at setpoint {args.setpoint:g}°C")
+    for name in names:
+        results = simulate(name, args.hours, args.interval, args.setpoint, args.seed, start)
+        print(f"{name:>10}: " + ", ".join(f"{key}={value}" for key, value in results.items()))
+
+if __name__ == "__main__":
+    main()
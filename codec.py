@@ -0,0 +1,165 @@
+import json
+import struct
+from array import array
+import threading
+import zlib
+from datetime import datetime
+
+# Wire Format Configuration
+COMPACT_SUFFIX = "bin"  # smartroom/sensors/<type>/bin carries compact payloads
+FRAME_SUFFIX = "frame"  # smartroom/sensors/<type>/frame carries batched readings
+DEVICE_TOPIC_PREFIX = "smartroom/devices"  # Retained descriptors of compact devices
+COMPACT_VERSION = 1
+# version, device index, seq, epoch ms, value, publish_ts (29 bytes)
+COMPACT_READING = struct.Struct("<BIIqfd")
+# version, device index, seq, start epoch ms, period us, count, publish_ts,
+# followed by `count` float32 values (31 + 4 * count bytes)
+FRAME_HEADER = struct.Struct("<BIIqIHd")
+FRAME_MAX_SAMPLES = 0xFFFF
+
+SENSOR_UNITS = {
+    'temperature': '°C',
+    'humidity': '%',
+    'light': 'lux',
+    'noise': 'dB',
+    'motion': 'detected'
+}
+
+def device_index(sensor_id):
+    """Stable 32-bit index for a device, so publishers need no coordination"""
+    return zlib.crc32(sensor_id.encode())
+
+def is_compact(topic):
+    return topic.endswith("/" + COMPACT_SUFFIX)
+
+def is_frame(topic):
+    return topic.endswith("/" + FRAME_SUFFIX)
+
+def sensor_topic(prefix, sensor_type, compact=False):
+    topic = f"{prefix}/{sensor_type}"
+    return f"{topic}/{COMPACT_SUFFIX}" if compact else topic
+
+def frame_topic(prefix, sensor_type):
+    return f"{prefix}/{sensor_type}/{FRAME_SUFFIX}"
+
+def device_topic(sensor_id):
+    return f"{DEVICE_TOPIC_PREFIX}/{device_index(sensor_id):08x}"
+
+class DeviceRegistry:
+    """Descriptors (sensor_id, room) of compact devices keyed by device index
+
+    Compact readings carry only the device index; publishers announce each
+    device once as a retained JSON message on DEVICE_TOPIC_PREFIX so
+    subscribers can restore the fields that are not sent per reading.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.devices = {}
+
+    def register(self, descriptor):
+        sensor_id = descriptor.get('sensor_id')
+        if sensor_id is None:
+            return
+        with self.lock:
+            self.devices[device_index(sensor_id)] = descriptor
+
+    def handle_descriptor(self, payload):
+        self.register(json.loads(payload))
+
+    def lookup(self, index):
+        return self.devices.get(index)
+
+    def __len__(self):
+        return len(self.devices)
+
+devices = DeviceRegistry()
+
+def device_descriptor(sensor_id, sensor_type, room=None):
+    descriptor = {"sensor_id": sensor_id, "type": sensor_type}
+    if room is not None:
+        descriptor["room"] = room
+    return json.dumps(descriptor)
+
+def encode_reading(sensor_id, value, epoch, seq, publish_ts):
+    """Pack one reading; epoch is seconds and publish_ts time.monotonic()"""
+    return COMPACT_READING.pack(COMPACT_VERSION, device_index(sensor_id), seq & 0xFFFFFFFF,
+                                int(epoch * 1000), value, publish_ts)
+
+def decode_reading(sensor_type, payload, registry=devices):
+    """Unpack a compact reading into the same dict a JSON reading has"""
+    version, index, seq, epoch_ms, value, publish_ts = COMPACT_READING.unpack(payload)
+    if version != COMPACT_VERSION:
+        raise ValueError(f"Unsupported compact payload version {version}")
+    descriptor = registry.lookup(index) if registry is not None else None
+    data = {
+        "sensor_id": descriptor["sensor_id"] if descriptor else f"dev_{index:08x}",
+        "type": sensor_type,
+        "value": round(value, 2),
+        "unit": SENSOR_UNITS.get(sensor_type, ''),
+        "timestamp": datetime.fromtimestamp(epoch_ms / 1000).isoformat(),
+        "seq": seq,
+        "publish_ts": publish_ts
+    }
+    if descriptor and "room" in descriptor:
+        data["room"] = descriptor["room"]
+    return data
+
+def encode_frame(sensor_id, values, start, period, seq, publish_ts):
+    """Pack consecutive readings taken every `period` seconds from `start`"""
+    if len(values) > FRAME_MAX_SAMPLES:
+        raise ValueError(f"Frame holds at most {FRAME_MAX_SAMPLES} samples")
+    header = FRAME_HEADER.pack(COMPACT_VERSION, device_index(sensor_id), seq & 0xFFFFFFFF,
+                               int(start * 1000), int(period * 1e6), len(values), publish_ts)
+    return header + array('f', values).tobytes()
+
+def decode_frame(sensor_type, payload, registry=devices):
+    """Unpack a frame into a reading dict with the newest sample as `value`
+
+    The extra `values`, `start` (epoch seconds) and `period` (seconds) keys
+    carry the whole batch; consumers that only look at `value` see the
+    latest reading as if it had been published on its own.
+    """
+    version, index, seq, start_ms, period_us, count, publish_ts = \
+        FRAME_HEADER.unpack_from(payload)
+    if version != COMPACT_VERSION:
+        raise ValueError(f"Unsupported frame version {version}")
+    values = array('f')
+    values.frombytes(payload[FRAME_HEADER.size:FRAME_HEADER.size + count * values.itemsize])
+    if len(values) != count or not count:
+        raise ValueError(f"Frame declares {count} samples but carries {len(values)}")
+    values = [round(value, 2) for value in values]
+    start = start_ms / 1000
+    period = period_us / 1e6
+    descriptor = registry.lookup(index) if registry is not None else None
+    data = {
+        "sensor_id": descriptor["sensor_id"] if descriptor else f"dev_{index:08x}",
+        "type": sensor_type,
+        "value": values[-1],
+        "unit": SENSOR_UNITS.get(sensor_type, ''),
+        "timestamp": datetime.fromtimestamp(start + period * (count - 1)).isoformat(),
+        "seq": seq,
+        "publish_ts": publish_ts,
+        "values": values,
+        "start": start,
+        "period": period
+    }
+    if descriptor and "room" in descriptor:
+        data["room"] = descriptor["room"]
+    return data
+
+def decode_payload(topic, payload, registry=devices):
+    """Decode a JSON, compact or frame payload, chosen by the topic suffix
+
+    Raises ValueError (including JSON and struct errors) for bad payloads.
+    """
+    if is_compact(topic):
+        try:
+            return decode_reading(topic.split('/')[2], payload, registry)
+        except struct.error as e:
+            raise ValueError(f"Bad compact payload: {e}")
+    if is_frame(topic):
+        try:
+            return decode_frame(topic.split('/')[2], payload, registry)
+        except struct.error as e:
+            raise ValueError(f"Bad frame payload: {e}")
+    return json.loads(payload.decode())
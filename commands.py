@@ -0,0 +1,174 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from simclock import get_clock
+from metrics import LatencyHistogram
+
+# Command Tracking Configuration
+COMMAND_TOPIC_PREFIX = "smartroom/commands"  # smartroom/commands/<actuator type>
+ACK_TOPIC_PREFIX = "smartroom/acks"  # smartroom/acks/<actuator type>, published by actuators
+COMMAND_TIMEOUT = 5.0  # Real seconds to wait for an ack before a command fails
+COMMAND_SWEEP_INTERVAL = 0.5  # Real seconds between timeout checks
+COMMAND_RECENT = 50  # Completed commands kept for the API
+COMMAND_EXPIRED_MEMORY = 1000  # Timed-out ids remembered to recognise late acks
+
+def new_command_id():
+    return uuid.uuid4().hex[:16]
+
+class CommandTracker:
+    """Pending actuator commands matched to acks by correlation id
+
+    track() stamps a command with a command_id and starts its timer. An ack
+    carrying the same id completes it and records the round trip in a
+    per-actuator-type LatencyHistogram; commands without an ack after
+    `timeout` real seconds fail. on_result(result) is called for every
+    completed or failed command.
+    """
+    def __init__(self, timeout=COMMAND_TIMEOUT, on_result=None):
+        self.timeout = timeout
+        self.on_result = on_result
+        self.lock = threading.Lock()
+        self.pending = {}  # command_id -> {'actuator_type', 'command', 'sent'}
+        self.expired = OrderedDict()  # command_id -> actuator_type of timed-out commands
+        self.recent = deque(maxlen=COMMAND_RECENT)
+        self.latency = {}  # actuator type -> LatencyHistogram of round trips
+        self.thread = None
+        self.running = False
+
+        # Counters
+        self.sent = 0
+        self.acked = 0
+        self.rejected = 0  # Invalid, or acked with none of the fields applied
+        self.timed_out = 0
+        self.late = 0  # Acks that arrived after their command timed out
+        self.unmatched = 0  # Acks for commands this tracker never sent
+
+    def start(self):
+        """Start the timeout sweep thread"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="command-timeouts")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(COMMAND_SWEEP_INTERVAL * 4)
+            self.thread = None
+
+    def track(self, actuator_type, command, sent=None):
+        """Assign a command_id (unless the command has one) and start its timer"""
+        command_id = command.setdefault('command_id', new_command_id())
+        with self.lock:
+            self.pending[command_id] = {
+                'actuator_type': actuator_type,
+                'command': command,
+                'sent': time.monotonic() if sent is None else sent
+            }
+            self.sent += 1
+        return command_id
+
+    def reject(self, actuator_type, command, error):
+        """Fail a command that was never sent; returns its result"""
+        command_id = command.setdefault('command_id', new_command_id())
+        entry = {'actuator_type': actuator_type, 'command': command}
+        with self.lock:
+            self.sent += 1
+            self.rejected += 1
+            result = self._result(command_id, entry, 'rejected', actuator_id=command.get('actuator_id'),
+                                  error=error)
+        self._report(result)
+        return result
+
+    def ack(self, ack, recv_time=None):
+        """Complete the command an ack refers to; returns its result or None"""
+        recv_time = time.monotonic() if recv_time is None else recv_time
+        command_id = ack.get('command_id')
+        with self.lock:
+            entry = self.pending.pop(command_id, None)
+            if entry is None:
+                if command_id in self.expired:
+                    self.late += 1
+                else:
+                    self.unmatched += 1
+                return None
+            rtt = max(0.0, recv_time - entry['sent'])
+            histogram = self.latency.get(entry['actuator_type'])
+            if histogram is None:
+                histogram = self.latency[entry['actuator_type']] = LatencyHistogram()
+            histogram.record(rtt)
+            status = ack.get('status', 'applied')
+            if status == 'applied':
+                self.acked += 1
+            else:
+                self.rejected += 1
+            result = self._result(command_id, entry, status, rtt_ms=round(rtt * 1000, 3),
+                                  actuator_id=ack.get('actuator_id'), applied=ack.get('applied', []),
+                                  ignored=ack.get('ignored', []), state=ack.get('state'))
+        self._report(result)
+        return result
+
+    def expire(self, now=None):
+        """Fail commands whose ack is overdue; returns their results"""
+        now = time.monotonic() if now is None else now
+        results = []
+        with self.lock:
+            for command_id, entry in list(self.pending.items()):
+                if now - entry['sent'] >= self.timeout:
+                    del self.pending[command_id]
+                    self.expired[command_id] = entry['actuator_type']
+                    self.timed_out += 1
+                    results.append(self._result(command_id, entry, 'timeout',
+                                                actuator_id=entry['command'].get('actuator_id')))
+            while len(self.expired) > COMMAND_EXPIRED_MEMORY:
+                self.expired.popitem(last=False)
+        for result in results:
+            self._report(result)
+        return results
+
+    def _result(self, command_id, entry, status, **fields):
+        result = {
+            'command_id': command_id,
+            'actuator_type': entry['actuator_type'],
+            'status': status,
+            'timestamp': get_clock().now().isoformat()
+        }
+        result.update(fields)
+        self.recent.append(result)
+        return result
+
+    def _report(self, result):
+        if self.on_result:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                print(f"Error reporting command result: {e}")
+
+    def _run(self):
+        while self.running:
+            time.sleep(COMMAND_SWEEP_INTERVAL)
+            self.expire()
+
+    def get_stats(self):
+        """Counters, round-trip percentiles (ms) per actuator type and recent results"""
+        with self.lock:
+            overall = LatencyHistogram()
+            for histogram in self.latency.values():
+                overall.merge(histogram)
+            return {
+                'timeout': self.timeout,
+                'pending': len(self.pending),
+                'sent': self.sent,
+                'acked': self.acked,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'late': self.late,
+                'unmatched': self.unmatched,
+                'latency': overall.summary(),
+                'latency_by_actuator': {actuator_type: histogram.summary()
+                                        for actuator_type, histogram in self.latency.items()},
+                'recent': list(self.recent)
+            }
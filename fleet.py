@@ -0,0 +1,221 @@
+import argparse
+import json
+import time
+import numpy as np
+from sensor import MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_PREFIX, create_client
+from simclock import get_clock
+from codec import sensor_topic, device_topic, device_descriptor, encode_reading
+
+# Fleet Configuration
+FLEET_ROOMS = 100
+FLEET_CONNECTIONS = 4
+FLEET_INTERVAL = 2  # Seconds between fleet ticks
+
+# Sensor types simulated per room: type -> (sensor id prefix, unit, min, max)
+FLEET_SENSOR_TYPES = {
+    'temperature': ('temp', '°C', 18, 28),
+    'humidity': ('hum', '%', 30, 70),
+    'light': ('light', 'lux', 0, 1000),
+    'noise': ('noise', 'dB', 30, 80),
+    'motion': ('motion', 'detected', 0, 1)
+}
+
+class SensorFleet:
+    """Vectorized simulation of N rooms x M sensor types
+
+    Each tick computes the next reading for every device of a type in one
+    NumPy operation, reproducing the random walks, day/night effects and
+    noise spikes of the individual sensor classes in sensor.py. Readings are
+    published through a small pool of shared MQTT connections instead of
+    one client and thread per sensor.
+    """
+    def __init__(self, rooms=FLEET_ROOMS, sensor_types=None, connections=FLEET_CONNECTIONS,
+                 interval=FLEET_INTERVAL, seed=None, clock=None, compact=False):
+        self.sensor_types = list(sensor_types or FLEET_SENSOR_TYPES)
+        for sensor_type in self.sensor_types:
+            if sensor_type not in FLEET_SENSOR_TYPES:
+                raise ValueError(f"Unknown sensor type: {sensor_type}")
+        self.room_ids = [f"room_{index:04d}" for index in range(rooms)]
+        self.num_connections = max(1, connections)
+        self.interval = interval
+        self.compact = compact
+        self.clock = clock or get_clock()
+        if seed is None and self.clock.seed is not None:
+            seed = int(self.clock.rng_for("fleet").random() * 2**32)
+        self.rng = np.random.default_rng(seed)
+        self.clients = []
+        self.running = False
+        self.seq = 0
+
+        # Per-room simulation state
+        self.values = {}
+        for sensor_type in self.sensor_types:
+            _, _, min_val, max_val = FLEET_SENSOR_TYPES[sensor_type]
+            self.values[sensor_type] = np.full(rooms, (min_val + max_val) / 2, dtype=np.float64)
+        self.time_of_day_effect = np.zeros(rooms)
+        self.motion_duration = np.zeros(rooms, dtype=np.int64)
+
+        # Counters
+        self.published = 0
+
+    @property
+    def num_devices(self):
+        return len(self.room_ids) * len(self.sensor_types)
+
+    def random_walk(self, sensor_type):
+        """Bounded random walk plus measurement noise (Sensor.generate_data)"""
+        _, _, min_val, max_val = FLEET_SENSOR_TYPES[sensor_type]
+        state = self.values[sensor_type]
+        state += self.rng.uniform(-2, 2, state.shape)
+        np.clip(state, min_val, max_val, out=state)
+        return state + self.rng.uniform(-0.5, 0.5, state.shape)
+
+    def generate(self, hour=None):
+        """Return {sensor_type: readings array} for every room"""
+        if hour is None:
+            hour = self.clock.now().hour
+        rooms = len(self.room_ids)
+        readings = {}
+
+        for sensor_type in self.sensor_types:
+            if sensor_type == 'temperature':
+                step = 0.1 if 6 <= hour <= 18 else -0.1
+                self.time_of_day_effect = np.clip(self.time_of_day_effect + step, -2, 3)
+                values = self.random_walk(sensor_type) + self.time_of_day_effect
+            elif sensor_type == 'light':
+                if 6 <= hour <= 8:
+                    low, high = 100, 300
+                elif 9 <= hour <= 17:
+                    low, high = 400, 800
+                elif 18 <= hour <= 20:
+                    low, high = 200, 400
+                else:
+                    low, high = 0, 100
+                self.values[sensor_type] = self.rng.uniform(low, high, rooms)
+                values = self.values[sensor_type] + self.rng.uniform(-50, 50, rooms)
+            elif sensor_type == 'noise':
+                values = self.random_walk(sensor_type)
+                spikes = self.rng.random(rooms) < 0.1
+                values = np.where(spikes, np.minimum(80, values + self.rng.uniform(10, 30, rooms)), values)
+            elif sensor_type == 'motion':
+                probability = 0.7 if 9 <= hour <= 22 else 0.1
+                present = self.motion_duration > 0
+                starts = ~present & (self.rng.random(rooms) < probability)
+                self.motion_duration = np.where(present, self.motion_duration - 1, self.motion_duration)
+                self.motion_duration[starts] = self.rng.integers(10, 31, int(starts.sum()))
+                values = (present | starts).astype(np.float64)
+            else:
+                values = self.random_walk(sensor_type)
+            readings[sensor_type] = np.round(values, 2)
+
+        return readings
+
+    def connect_mqtt(self):
+        """Open the shared connection pool"""
+        for index in range(self.num_connections):
+            client = create_client(f"fleet_{index}_{int(time.time())}")
+            try:
+                client.connect(MQTT_BROKER, MQTT_PORT, 60)
+                client.loop_start()
+                self.clients.append(client)
+            except Exception as e:
+                print(f"Failed to connect fleet connection {index}: {e}")
+        print(f"Fleet connected with {len(self.clients)} MQTT connections")
+        if self.compact and self.clients:
+            self.announce()
+    
+    def announce(self):
+        """Publish retained descriptors so decoders can map device indexes back"""
+        for sensor_type in self.sensor_types:
+            prefix = FLEET_SENSOR_TYPES[sensor_type][0]
+            for room in self.room_ids:
+                sensor_id = f"{prefix}_{room}"
+                self.clients[0].publish(device_topic(sensor_id),
+                                        device_descriptor(sensor_id, sensor_type, room), retain=True)
+
+    def publish(self, readings):
+        """Publish one tick of readings, spreading devices over the pool"""
+        if not self.clients:
+            return
+        epoch = self.clock.time()
+        timestamp = self.clock.now().isoformat()
+        device = 0
+        for sensor_type, values in readings.items():
+            prefix, unit, _, _ = FLEET_SENSOR_TYPES[sensor_type]
+            topic = sensor_topic(MQTT_TOPIC_PREFIX, sensor_type, self.compact)
+            if sensor_type == 'motion':
+                values = values.astype(np.int64)
+            for room, value in zip(self.room_ids, values.tolist()):
+                if self.compact:
+                    payload = encode_reading(f"{prefix}_{room}", value, epoch, self.seq, time.monotonic())
+                    self.clients[device % len(self.clients)].publish(topic, payload)
+                    device += 1
+                    continue
+                payload = json.dumps({
+                    "sensor_id": f"{prefix}_{room}",
+                    "type": sensor_type,
+                    "room": room,
+                    "value": value,
+                    "unit": unit,
+                    "timestamp": timestamp,
+                    "seq": self.seq,
+                    "publish_ts": time.monotonic()
+                })
+                self.clients[device % len(self.clients)].publish(topic, payload)
+                device += 1
+        self.seq += 1
+        self.published += device
+
+    def run(self, duration=None):
+        """Tick the fleet until stopped or `duration` seconds elapse"""
+        self.running = True
+        self.connect_mqtt()
+        print(f"Simulating {len(self.room_ids)} rooms x {len(self.sensor_types)} sensors "
+              f"= {self.num_devices} devices every {self.interval}s")
+
+        started = time.monotonic()
+        next_tick = started
+        while self.running:
+            tick_start = time.monotonic()
+            self.publish(self.generate())
+            elapsed = time.monotonic() - tick_start
+            print(f"Fleet tick {self.seq}: {self.num_devices} readings in {elapsed * 1000:.1f} ms")
+
+            if duration is not None and time.monotonic() - started >= duration:
+                break
+            next_tick += self.clock.real_seconds(self.interval)
+            time.sleep(max(0, next_tick - time.monotonic()))
+
+        self.stop()
+
+    def stop(self):
+        """Stop the fleet and close all connections"""
+        self.running = False
+        for client in self.clients:
+            client.loop_stop()
+            client.disconnect()
+        self.clients = []
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of Smart Study Room sensors")
+    parser.add_argument('--rooms', type=int, default=FLEET_ROOMS)
+    parser.add_argument('--types', default=','.join(FLEET_SENSOR_TYPES),
+                        help="Comma-separated sensor types per room")
+    parser.add_argument('--connections', type=int, default=FLEET_CONNECTIONS)
+    parser.add_argument('--interval', type=float, default=FLEET_INTERVAL)
+    parser.add_argument('--duration', type=float, default=None, help="Seconds to run (default: forever)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--compact', action='store_true', help="Publish the compact binary format")
+    args = parser.parse_args()
+
+    fleet = SensorFleet(args.rooms, args.types.split(','), args.connections,
+                        args.interval, args.seed, compact=args.compact)
+    try:
+        fleet.run(args.duration)
+    except KeyboardInterrupt:
+        print("\nShutting down fleet...")
+        fleet.stop()
+    print(f"Fleet stopped after publishing {fleet.published} readings.")
+
+if __name__ == "__main__":
+    main()
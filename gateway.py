@@ -1,24 +1,410 @@
 import json
+import queue
 import threading
 import time
 from datetime import datetime
 from collections import defaultdict, deque
+import numpy as np
 import paho.mqtt.client as mqtt
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
+from storage import create_store, to_epoch
+from simclock import get_clock
+from codec import decode_payload, devices, DEVICE_TOPIC_PREFIX
+from notifications import NotificationFilter
+from commands import CommandTracker, COMMAND_TOPIC_PREFIX, ACK_TOPIC_PREFIX
+from metrics import LatencyRecorder, MetricsRegistry
+from analytics import Rollups, StreamingStats, ComfortTracker, lttb, minmax_decimate, COUNT, START, MIN, MAX, SUM
 
 # Configuration
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 WEB_PORT = 5000
 
+# Ingest pipeline configuration
+INGEST_WORKERS = 2
+INGEST_QUEUE_SIZE = 1000  # Per worker
+INGEST_OVERFLOW_POLICY = "drop_oldest"  # drop_oldest, drop_newest or block
+
+# History store configuration
+HISTORY_BACKEND = "sqlite"  # None keeps history in memory only
+HISTORY_DB_PATH = "sensor_history.db"
+HISTORY_SIZE = 100  # In-memory points per sensor type
+HISTORY_MAX_POINTS = 500  # Default /api/history points per series
+
+# Comfort configuration
+COMFORT_RANGES = {
+    'temperature': (20, 24),
+    'humidity': (40, 60),
+    'light': (300, 700),
+    'noise': (0, 45)
+}
+DEFAULT_ROOM = "default"  # Room for readings that do not carry one
+
+# WebSocket fan-out configuration
+FANOUT_TICK = 0.25  # Seconds between batch_update frames (0 disables batching)
+FANOUT_HISTORY_TAIL = 10  # Coalesced readings kept per sensor in each frame
+
 # Flask app setup
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'smart-study-room-secret'
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+def topic_labels(topic):
+    """(category, type) metric labels for a topic, bounded by the number of device types
+    
+    Per-device topics (smartroom/devices/<index>) collapse into one series.
+    """
+    parts = topic.split('/')
+    category = parts[1] if len(parts) > 1 else ''
+    if category == 'devices' or len(parts) < 3:
+        return category, ''
+    return category, parts[2]
+
+def to_epoch_ns(seconds):
+    """Epoch seconds to integer epoch nanoseconds (microsecond aligned)"""
+    return int(round(seconds * 1e6)) * 1000
+
+class SensorHistory:
+    """Fixed-capacity columnar ring buffer of sensor readings
+
+    Values are float64 and timestamps int64 epoch nanoseconds, preallocated
+    once. Every point is written twice (at i and i + capacity) so the most
+    recent n points are always one contiguous slice: appends are O(1) and
+    windows are zero-copy views. Views are read-only and only valid until the
+    buffer wraps past them - copy them to keep them across appends.
+    """
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.times = np.zeros(capacity * 2, dtype=np.int64)
+        self.values = np.zeros(capacity * 2, dtype=np.float64)
+        self.head = 0  # Next write position
+        self.size = 0
+    
+    def __len__(self):
+        return self.size
+    
+    def append(self, epoch_ns, value):
+        """Append one reading (None values are stored as NaN)"""
+        value = np.nan if value is None else value
+        head = self.head
+        self.times[head] = self.times[head + self.capacity] = epoch_ns
+        self.values[head] = self.values[head + self.capacity] = value
+        self.head = (head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+    
+    def extend(self, epoch_ns, values):
+        """Append many readings at once"""
+        epoch_ns = np.asarray(epoch_ns, dtype=np.int64)[-self.capacity:]
+        values = np.asarray(values, dtype=np.float64)[-self.capacity:]
+        count = len(values)
+        positions = (self.head + np.arange(count)) % self.capacity
+        self.times[positions] = self.times[positions + self.capacity] = epoch_ns
+        self.values[positions] = self.values[positions + self.capacity] = values
+        self.head = (self.head + count) % self.capacity
+        self.size = min(self.capacity, self.size + count)
+    
+    def last(self, n=None):
+        """Zero-copy (times, values) views of the newest n points, oldest first"""
+        n = self.size if n is None else max(0, min(n, self.size))
+        end = self.head + self.capacity
+        times = self.times[end - n:end]
+        values = self.values[end - n:end]
+        times.flags.writeable = False
+        values.flags.writeable = False
+        return times, values
+    
+    def window(self, start_ns=None, end_ns=None):
+        """Zero-copy (times, values) views of points within [start_ns, end_ns]"""
+        times, values = self.last()
+        lo = 0 if start_ns is None else np.searchsorted(times, start_ns, side='left')
+        hi = len(times) if end_ns is None else np.searchsorted(times, end_ns, side='right')
+        return times[lo:hi], values[lo:hi]
+    
+    def latest(self):
+        """Return the newest (epoch_ns, value) or None when empty"""
+        if not self.size:
+            return None
+        index = (self.head - 1) % self.capacity
+        return int(self.times[index]), float(self.values[index])
+    
+    def to_list(self):
+        """Convert to the [{'timestamp': iso, 'value': v}] API shape"""
+        times, values = self.last()
+        return [
+            {
+                'timestamp': datetime.fromtimestamp(ns / 1e9).isoformat(),
+                'value': None if np.isnan(value) else value
+            }
+            for ns, value in zip(times.tolist(), values.tolist())
+        ]
+
+class IngestPipeline:
+    """Bounded ingest queues drained by a pool of worker threads
+
+    The MQTT network thread only enqueues raw (topic, payload, recv_time)
+    tuples; workers do the decoding, processing and fan-out. Messages are
+    sharded onto per-worker queues by topic so readings from one sensor are
+    always handled in arrival order.
+
+    Overflow policies when a worker queue is full:
+      - drop_oldest: discard the oldest queued message to make room
+      - drop_newest: discard the incoming message
+      - block: wait for a free slot (back-pressures the MQTT client)
+    """
+    POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(self, handler, num_workers=INGEST_WORKERS,
+                 max_size=INGEST_QUEUE_SIZE, overflow_policy=INGEST_OVERFLOW_POLICY):
+        if overflow_policy not in self.POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.handler = handler
+        self.num_workers = max(1, num_workers)
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.queues = [queue.Queue(maxsize=max_size) for _ in range(self.num_workers)]
+        self.workers = []
+        self.running = False
+        
+        # Counters
+        self.stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+    
+    def start(self):
+        """Start the worker threads"""
+        if self.running:
+            return
+        self.running = True
+        for index, work_queue in enumerate(self.queues):
+            worker = threading.Thread(target=self._worker, args=(work_queue,),
+                                      name=f"ingest-worker-{index}")
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+    
+    def stop(self, timeout=5):
+        """Stop the workers after draining queued messages"""
+        if not self.running:
+            return
+        self.running = False
+        for work_queue in self.queues:
+            work_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+    
+    def submit(self, topic, payload, recv_time=None):
+        """Enqueue a raw message; returns False if it was dropped"""
+        if recv_time is None:
+            recv_time = time.monotonic()
+        item = (topic, payload, recv_time)
+        work_queue = self.queues[hash(topic) % self.num_workers]
+        
+        if self.overflow_policy == "block":
+            work_queue.put(item)
+        else:
+            try:
+                work_queue.put_nowait(item)
+            except queue.Full:
+                if self.overflow_policy == "drop_newest":
+                    self._count_drop()
+                    return False
+                # drop_oldest: evict until the new message fits
+                while True:
+                    try:
+                        work_queue.get_nowait()
+                        self._count_drop()
+                    except queue.Empty:
+                        pass
+                    try:
+                        work_queue.put_nowait(item)
+                        break
+                    except queue.Full:
+                        continue
+        
+        depth = work_queue.qsize()
+        with self.stats_lock:
+            self.enqueued += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+        return True
+    
+    def _count_drop(self):
+        with self.stats_lock:
+            self.dropped += 1
+    
+    def _worker(self, work_queue):
+        """Drain one queue until a stop sentinel is received"""
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            try:
+                self.handler(*item)
+            except Exception as e:
+                with self.stats_lock:
+                    self.errors += 1
+                print(f"Error in ingest worker: {e}")
+            with self.stats_lock:
+                self.processed += 1
+    
+    def get_stats(self):
+        """Return queue depth and drop counters"""
+        depths = [work_queue.qsize() for work_queue in self.queues]
+        with self.stats_lock:
+            return {
+                'workers': self.num_workers,
+                'overflow_policy': self.overflow_policy,
+                'capacity': self.max_size * self.num_workers,
+                'depth': sum(depths),
+                'depth_per_worker': depths,
+                'max_depth': self.max_depth,
+                'enqueued': self.enqueued,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors
+            }
+
+class FanoutBatcher:
+    """Coalesces dashboard updates and emits one batch_update frame per tick
+
+    Multiple readings of the same (category, type) within a tick collapse into
+    the latest value plus a compact [timestamp, value] tail for sensors.
+    Notification messages are never coalesced; all of them are forwarded.
+    """
+    def __init__(self, emit_func, tick=FANOUT_TICK, history_tail=FANOUT_HISTORY_TAIL, latency=None):
+        self.emit_func = emit_func
+        self.latency = latency
+        self.tick = tick
+        self.history_tail = history_tail
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.pending_notifications = []
+        self.thread = None
+        self.running = False
+        
+        # Counters
+        self.updates_received = 0
+        self.frames_emitted = 0
+    
+    def start(self):
+        """Start the tick thread"""
+        if self.running or self.tick <= 0:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="fanout-tick")
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def stop(self):
+        """Stop the tick thread and flush anything still pending"""
+        self.running = False
+        if self.thread:
+            self.thread.join(self.tick * 4)
+            self.thread = None
+        self.flush()
+    
+    def add(self, category, device_type, data, enqueued_at=None):
+        """Queue an update for the next frame"""
+        if enqueued_at is None:
+            enqueued_at = time.monotonic()
+        
+        if self.tick <= 0:
+            # Batching disabled - emit immediately
+            self.emit_func('update', {
+                'category': category,
+                'type': device_type,
+                'data': data
+            })
+            self._record_emitted(device_type, [(enqueued_at, data.get('publish_ts'))])
+            return
+        
+        key = (category, device_type)
+        with self.lock:
+            self.updates_received += 1
+            entry = self.pending.get(key)
+            if entry is None:
+                entry = {'data': data, 'count': 0, 'history': deque(maxlen=self.history_tail),
+                         'timings': []}
+                self.pending[key] = entry
+            entry['data'] = data
+            entry['count'] += 1
+            if self.latency:
+                entry['timings'].append((enqueued_at, data.get('publish_ts')))
+            if category == "sensors" and self.history_tail:
+                entry['history'].append([data.get('timestamp'), data.get('value')])
+            if 'notification' in device_type:
+                self.pending_notifications.append(data)
+    
+    def flush(self):
+        """Emit all pending updates as a single batch_update frame"""
+        with self.lock:
+            pending, notifications = self.pending, self.pending_notifications
+            self.pending = {}
+            self.pending_notifications = []
+        
+        if not pending and not notifications:
+            return
+        
+        updates = []
+        for (category, device_type), entry in pending.items():
+            update = {
+                'category': category,
+                'type': device_type,
+                'data': entry['data'],
+                'count': entry['count']
+            }
+            if entry['count'] > 1 and entry['history']:
+                update['history'] = list(entry['history'])
+            updates.append(update)
+        
+        self.emit_func('batch_update', {
+            'timestamp': get_clock().now().isoformat(),
+            'emitted_at': time.monotonic(),
+            'updates': updates,
+            'notifications': notifications
+        })
+        with self.lock:
+            self.frames_emitted += 1
+        
+        for (_, device_type), entry in pending.items():
+            self._record_emitted(device_type, entry['timings'])
+    
+    def _record_emitted(self, device_type, timings):
+        """Record emit and end-to-end latency for readings just sent"""
+        if not self.latency:
+            return
+        now = time.monotonic()
+        for enqueued_at, publish_ts in timings:
+            self.latency.record('emit', device_type, now - enqueued_at)
+            if publish_ts is not None and 0 <= now - publish_ts < 3600:
+                self.latency.record('total', device_type, now - publish_ts)
+    
+    def _run(self):
+        while self.running:
+            time.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error emitting batch update: {e}")
+    
+    def get_stats(self):
+        """Return fan-out counters"""
+        with self.lock:
+            return {
+                'tick': self.tick,
+                'pending': len(self.pending),
+                'updates_received': self.updates_received,
+                'frames_emitted': self.frames_emitted
+            }
+
 class IoTGateway:
     """Central gateway for IoT data processing and routing"""
     def __init__(self):
@@ -30,18 +416,119 @@ class IoTGateway:
             self.mqtt_client = mqtt.Client("gateway_main")
         self.sensor_data = defaultdict(dict)
         self.actuator_states = defaultdict(dict)
-        self.data_history = defaultdict(lambda: deque(maxlen=100))
+        self.data_history = defaultdict(lambda: SensorHistory(HISTORY_SIZE))
         self.notifications = deque(maxlen=50)
+        self.alert_filter = NotificationFilter()
+        self.pending_alerts = deque()  # Alerts raised under the lock, emitted after it is released
         self.running = False
+        self.lock = threading.RLock()
+        
+        # Snapshot cache - bumped on every state mutation
+        self.boot_id = format(int(time.time()), 'x')
+        self.generation = 0
+        self.snapshot_cache = None  # (generation, data, json_bytes)
+        self.latency = LatencyRecorder()
+        self.ingest = IngestPipeline(self.handle_message)
+        self.fanout = FanoutBatcher(self.emit_event, latency=self.latency)
+        self.commands = CommandTracker(on_result=self.report_command)
+        self.store = None
+        self.connected_clients = 0
+        self.setup_metrics()
         
         # Analytics
         self.study_sessions = []
-        self.comfort_violations = defaultdict(int)
+        self.comfort = ComfortTracker()
+        self.rollups = Rollups()
+        self.stats = StreamingStats()
+        
+    def setup_metrics(self):
+        """Register Prometheus metrics for the /metrics endpoint"""
+        self.metrics = MetricsRegistry()
+        m = self.metrics
+        
+        self.messages_ingested = m.counter(
+            'gateway_messages_ingested_total', 'MQTT messages received', ('category', 'type'))
+        self.decode_errors = m.counter(
+            'gateway_decode_errors_total', 'MQTT payloads that failed to decode', ('category', 'type'))
+        self.processing_errors = m.counter(
+            'gateway_processing_errors_total', 'Messages that failed during processing', ('category',))
+        self.emits = m.counter(
+            'gateway_socketio_emits_total', 'Socket.IO events emitted', ('event',))
+        self.commands_published = m.counter(
+            'gateway_commands_published_total', 'Commands published to actuators', ('actuator_type',))
+        self.command_results = m.counter(
+            'gateway_command_results_total', 'Commands acked, rejected or timed out', ('actuator_type', 'status'))
+        self.command_rtt_seconds = m.histogram(
+            'gateway_command_rtt_seconds', 'Command publish to ack round trip', ('actuator_type',))
+        self.on_message_seconds = m.histogram(
+            'gateway_on_message_seconds', 'Time spent in the MQTT on_message callback')
+        self.handle_message_seconds = m.histogram(
+            'gateway_handle_message_seconds', 'Time to decode, process and queue a message', ('category',))
+        self.process_sensor_seconds = m.histogram(
+            'gateway_process_sensor_data_seconds', 'Time spent in process_sensor_data', ('sensor',))
+        self.dashboard_data_seconds = m.histogram(
+            'gateway_get_dashboard_data_seconds', 'Time spent building dashboard snapshots')
+        
+        m.gauge('gateway_socketio_clients', 'Connected Socket.IO clients',
+                lambda: self.connected_clients)
+        m.gauge('gateway_ingest_queue_depth', 'Messages waiting per ingest worker',
+                lambda: [((str(i),), q.qsize()) for i, q in enumerate(self.ingest.queues)],
+                ('worker',))
+        m.gauge('gateway_ingest_queue_capacity', 'Ingest queue capacity per worker',
+                lambda: self.ingest.max_size)
+        m.callback_counter('gateway_ingest_dropped_total', 'Messages dropped by the overflow policy',
+                           lambda: self.ingest.dropped)
+        m.gauge('gateway_fanout_pending', 'Coalesced updates waiting for the next frame',
+                lambda: len(self.fanout.pending))
+        m.gauge('gateway_history_points', 'Readings held in memory per sensor',
+                lambda: [((k,), len(v)) for k, v in list(self.data_history.items())], ('sensor',))
+        m.gauge('gateway_history_store_pending', 'Readings buffered for the next group commit',
+                lambda: len(self.store.buffer) if self.store else 0)
+        m.gauge('gateway_notifications', 'Notifications held for the dashboard',
+                lambda: len(self.notifications))
+        m.callback_counter('gateway_alerts_suppressed_total', 'Alerts dropped as duplicates or rate limited',
+                           lambda: self.alert_filter.suppressed)
+        m.gauge('gateway_commands_pending', 'Commands waiting for an ack',
+                lambda: len(self.commands.pending))
+    
+    def emit_event(self, event, payload):
+        """Emit a Socket.IO event to all dashboards"""
+        socketio.emit(event, payload)
+        self.emits.inc(event)
+    
+    def open_store(self, backend=HISTORY_BACKEND, path=HISTORY_DB_PATH):
+        """Open the persistent history store and reload recent history"""
+        try:
+            self.store = create_store(backend, path)
+        except Exception as e:
+            print(f"Failed to open history store: {e}")
+            self.store = None
+        if not self.store:
+            return
         
+        with self.lock:
+            for sensor_type in self.store.sensors():
+                rows = self.store.latest(sensor_type, HISTORY_SIZE)
+                if rows:
+                    self.data_history[sensor_type].extend(
+                        [to_epoch_ns(ts) for ts, _, _ in rows],
+                        [np.nan if value is None else value for _, value, _ in rows])
+                
+                # Rebuild rollups from the store for each level's retention
+                for resolution, retention in self.rollups.level_specs:
+                    since = get_clock().time() - resolution * retention
+                    self.rollups.load(sensor_type, resolution,
+                                      self.store.aggregate(sensor_type, resolution, since))
+            self.generation += 1
+        print(f"History store opened: {path}")
+    
     def connect_mqtt(self):
         """Connect to MQTT broker"""
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
+        self.ingest.start()
+        self.fanout.start()
+        self.commands.start()
         
         try:
             self.mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
@@ -53,50 +540,123 @@ class IoTGateway:
     def on_connect(self, client, userdata, flags, rc):
         """Callback for MQTT connection"""
         print(f"Gateway connected with result code {rc}")
-        # Subscribe to all topics
-        client.subscribe("smartroom/+/+")
+        # Subscribe to all topics (including compact sensor/<type>/bin readings)
+        client.subscribe("smartroom/#")
     
     def on_message(self, client, userdata, msg):
-        """Process incoming MQTT messages"""
+        """Hand incoming MQTT messages to the ingest pipeline"""
+        with self.on_message_seconds.time():
+            self.messages_ingested.inc(*topic_labels(msg.topic))
+            self.ingest.submit(msg.topic, msg.payload, time.monotonic())
+    
+    def handle_message(self, topic, payload, recv_time):
+        """Decode, process and fan out a raw MQTT message
+        
+        recv_time is time.monotonic() at MQTT receipt. Sensor payloads carry
+        publish_ts from the same system-wide monotonic clock, so broker and
+        total latencies are only meaningful when components share a host.
+        """
+        started = time.monotonic()
         try:
-            data = json.loads(msg.payload.decode())
-            topic_parts = msg.topic.split('/')
+            if topic.startswith(DEVICE_TOPIC_PREFIX):
+                devices.handle_descriptor(payload)
+                return
+            data = decode_payload(topic, payload)
+        except ValueError as e:
+            self.decode_errors.inc(*topic_labels(topic))
+            print(f"Error decoding message on {topic}: {e}")
+            return
+        
+        if topic.startswith(ACK_TOPIC_PREFIX):
+            # Round trip measured from publish to MQTT receipt of the ack
+            self.commands.ack(data, recv_time)
+            return
+        
+        category = 'unknown'
+        try:
+            topic_parts = topic.split('/')
             
             if len(topic_parts) >= 3:
                 category = topic_parts[1]
                 device_type = topic_parts[2]
                 
-                if category == "sensors":
-                    self.process_sensor_data(device_type, data)
-                elif category == "actuators":
-                    self.process_actuator_data(device_type, data)
+                self.record_receipt(device_type, data, recv_time, started)
+                
+                with self.lock:
+                    if category == "sensors":
+                        with self.process_sensor_seconds.time(device_type):
+                            self.process_sensor_data(device_type, data)
+                    elif category == "actuators":
+                        self.process_actuator_data(device_type, data)
+                self.emit_alerts()
+                
+                processed = time.monotonic()
+                self.latency.record('processing', device_type, processed - started)
                 
-                # Emit to web dashboard via WebSocket
-                socketio.emit('update', {
-                    'category': category,
-                    'type': device_type,
-                    'data': data
-                })
+                # Queue for the next WebSocket batch to the dashboard
+                self.fanout.add(category, device_type, data, processed)
+                self.handle_message_seconds.observe(time.monotonic() - started, category)
                 
         except Exception as e:
+            self.processing_errors.inc(category)
             print(f"Error processing message: {e}")
     
+    def record_receipt(self, device_type, data, recv_time, started):
+        """Record broker transit, queue wait and sequence gaps for a message"""
+        self.latency.record('queue_wait', device_type, started - recv_time)
+        
+        publish_ts = data.get('publish_ts')
+        if isinstance(publish_ts, (int, float)) and 0 <= recv_time - publish_ts < 3600:
+            self.latency.record('broker', device_type, recv_time - publish_ts)
+        
+        seq = data.get('seq')
+        if isinstance(seq, int):
+            self.latency.track_sequence(data.get('sensor_id', device_type), seq)
+    
     def process_sensor_data(self, sensor_type, data):
         """Process and store sensor data"""
         self.sensor_data[sensor_type] = data
+        if 'values' in data:
+            self.process_sensor_frame(sensor_type, data)
+            return
         
         # Store history
-        history_entry = {
-            'timestamp': data.get('timestamp', datetime.now().isoformat()),
-            'value': data.get('value')
-        }
-        self.data_history[sensor_type].append(history_entry)
+        timestamp = to_epoch(data.get('timestamp'))
+        value = data.get('value')
+        self.data_history[sensor_type].append(to_epoch_ns(timestamp), value)
+        self.rollups.add(sensor_type, timestamp, value)
+        self.stats.add(sensor_type, timestamp, value)
+        if self.store:
+            self.store.append(sensor_type, timestamp, data.get('sensor_id'), value)
         
         # Analytics
-        self.analyze_comfort_levels(sensor_type, data.get('value'))
+        self.analyze_comfort_levels(sensor_type, value, timestamp, data.get('room', DEFAULT_ROOM))
         
         # Edge processing - immediate responses
         self.edge_processing(sensor_type, data)
+        self.generation += 1
+    
+    def process_sensor_frame(self, sensor_type, data):
+        """Process a batched frame of evenly spaced readings in bulk"""
+        values = data['values']
+        timestamps = data['start'] + data['period'] * np.arange(len(values))
+        room = data.get('room', DEFAULT_ROOM)
+        
+        # One vectorized ring write and one store batch for the whole frame
+        self.data_history[sensor_type].extend(np.round(timestamps * 1e6).astype(np.int64) * 1000, values)
+        timestamps = timestamps.tolist()
+        if self.store:
+            sensor_id = data.get('sensor_id')
+            self.store.extend([(sensor_type, timestamp, sensor_id, value)
+                               for timestamp, value in zip(timestamps, values)])
+        for timestamp, value in zip(timestamps, values):
+            self.rollups.add(sensor_type, timestamp, value)
+            self.stats.add(sensor_type, timestamp, value)
+            self.analyze_comfort_levels(sensor_type, value, timestamp, room)
+        
+        # Edge processing on the frame's extremes, so a spike mid-frame still alerts
+        self.edge_processing(sensor_type, data, min(values), max(values))
+        self.generation += 1
     
     def process_actuator_data(self, actuator_type, data):
         """Process actuator state updates"""
@@ -107,66 +667,194 @@ class IoTGateway:
             self.notifications.append({
                 'timestamp': data.get('timestamp'),
                 'message': data.get('message'),
-                'type': actuator_type
+                'type': actuator_type,
+                'count': data.get('count', 1)
             })
+        self.generation += 1
     
-    def analyze_comfort_levels(self, sensor_type, value):
-        """Track comfort level violations"""
-        comfort_ranges = {
-            'temperature': (20, 24),
-            'humidity': (40, 60),
-            'light': (300, 700),
-            'noise': (0, 45)
-        }
-        
-        if sensor_type in comfort_ranges:
-            min_val, max_val = comfort_ranges[sensor_type]
-            if value < min_val or value > max_val:
-                self.comfort_violations[sensor_type] += 1
+    def analyze_comfort_levels(self, sensor_type, value, timestamp, room=DEFAULT_ROOM):
+        """Track comfort level violations over the recent window"""
+        if sensor_type in COMFORT_RANGES and value is not None:
+            min_val, max_val = COMFORT_RANGES[sensor_type]
+            violated = value < min_val or value > max_val
+            self.comfort.record(room, sensor_type, timestamp, violated)
     
-    def edge_processing(self, sensor_type, data):
-        """Perform edge computing for immediate responses"""
+    def edge_processing(self, sensor_type, data, low=None, high=None):
+        """Perform edge computing for immediate responses
+        
+        `low`/`high` are the extremes of a batch of readings; a single
+        reading passes neither and its value is used for both.
+        """
         value = data.get('value')
+        low = value if low is None else low
+        high = value if high is None else high
         
         # Critical alerts
-        if sensor_type == 'temperature' and (value < 16 or value > 30):
-            self.send_alert("CRITICAL: Temperature out of safe range!")
-        elif sensor_type == 'noise' and value > 70:
-            self.send_alert("WARNING: Very high noise level detected!")
+        if value is not None:
+            if sensor_type == 'temperature' and (low < 16 or high > 30):
+                self.send_alert("CRITICAL: Temperature out of safe range!")
+            elif sensor_type == 'noise' and high > 70:
+                self.send_alert("WARNING: Very high noise level detected!")
+        self.flush_alerts()
     
     def send_alert(self, message):
-        """Send immediate alerts"""
+        """Send an immediate alert unless it is a duplicate or over its rate limit"""
+        if self.alert_filter.admit(message):
+            self.queue_alert(message)
+    
+    def flush_alerts(self):
+        """Send summaries of alerts suppressed during the last window"""
+        for message, count in self.alert_filter.due_summaries():
+            self.queue_alert(message, count)
+    
+    def queue_alert(self, message, count=1):
+        """Add an alert to the notification list and queue it for emit_alerts()
+        
+        Alerts are raised while the gateway lock is held, so the Socket.IO
+        emit is left to the caller once the lock is released.
+        """
         alert = {
             'type': 'gateway_alert',
             'message': message,
-            'timestamp': datetime.now().isoformat(),
-            'severity': 'high'
+            'timestamp': get_clock().now().isoformat(),
+            'severity': 'high',
+            'count': count
         }
         
-        # Emit to dashboard
-        socketio.emit('alert', alert)
-        
         # Store in notifications
-        self.notifications.append(alert)
+        with self.lock:
+            self.notifications.append(alert)
+            self.generation += 1
+        self.pending_alerts.append(alert)
+    
+    def emit_alerts(self):
+        """Push queued alerts to the dashboard; call without holding the lock"""
+        while True:
+            try:
+                alert = self.pending_alerts.popleft()
+            except IndexError:
+                return
+            self.emit_event('alert', alert)
     
     def get_dashboard_data(self):
         """Compile data for dashboard"""
-        return {
-            'sensors': dict(self.sensor_data),
-            'actuators': dict(self.actuator_states),
-            'history': {k: list(v) for k, v in self.data_history.items()},
-            'notifications': list(self.notifications),
-            'analytics': {
-                'comfort_violations': dict(self.comfort_violations),
-                'study_sessions': self.study_sessions[-10:]  # Last 10 sessions
+        with self.lock:
+            return {
+                'sensors': dict(self.sensor_data),
+                'actuators': dict(self.actuator_states),
+                'history': {k: v.to_list() for k, v in self.data_history.items()},
+                'notifications': list(self.notifications),
+                'analytics': {
+                    'comfort_violations': self.comfort.violations(),
+                    'study_sessions': self.study_sessions[-10:]  # Last 10 sessions
+                }
             }
+    
+    def get_dashboard_snapshot(self):
+        """Return (generation, data, json_bytes), rebuilding only after a mutation"""
+        with self.lock:
+            cached = self.snapshot_cache
+            if cached and cached[0] == self.generation:
+                return cached
+            generation = self.generation
+            with self.dashboard_data_seconds.time():
+                data = self.get_dashboard_data()
+        
+        # Serialize outside the lock so ingest is not held up
+        snapshot = (generation, data, json.dumps(data).encode())
+        with self.lock:
+            if self.snapshot_cache is None or self.snapshot_cache[0] < generation:
+                self.snapshot_cache = snapshot
+        return snapshot
+    
+    def snapshot_etag(self, generation):
+        """ETag for a snapshot generation, unique across gateway restarts"""
+        return f"{self.boot_id}-{generation}"
+    
+    def query_history(self, sensor_type, start, end, max_points=HISTORY_MAX_POINTS):
+        """Return at most max_points [epoch_s, value] pairs for one sensor
+        
+        Uses the cheapest source that covers [start, end] at the needed
+        resolution: the in-memory ring, the coarsest rollup level no wider
+        than (end - start) / max_points, or raw rows from the history store.
+        """
+        width = (end - start) / max_points
+        source = None
+        
+        with self.lock:
+            history = self.data_history.get(sensor_type)
+            if history is not None and (len(history) < history.capacity or
+                                        history.last()[0][0] <= to_epoch_ns(start)):
+                times, values = history.window(to_epoch_ns(start), to_epoch_ns(end))
+                times, values = times / 1e9, values.copy()
+                source = 'memory'
+            else:
+                levels = self.rollups.sensors.get(sensor_type, {})
+                for resolution in sorted(levels, reverse=True):
+                    level = levels[resolution]
+                    if resolution > width or not level.buckets:
+                        continue
+                    if len(level.buckets) < level.retention or level.oldest() <= start:
+                        buckets = level.query(start, end)
+                        source = f'rollup_{resolution}s'
+                        break
+        
+        if source is None and self.store:
+            rows = self.store.query(sensor_type, start, end)
+            times = np.array([row[0] for row in rows], dtype=np.float64)
+            values = np.array([np.nan if row[1] is None else row[1] for row in rows],
+                              dtype=np.float64)
+            source = 'store'
+        elif source is None:
+            times = values = np.empty(0)
+            source = 'none'
+        
+        if source.startswith('rollup'):
+            times = np.array([b[START] for b in buckets], dtype=np.float64)
+            if len(buckets) <= max_points:
+                values = np.array([b[SUM] / b[COUNT] for b in buckets])
+            else:
+                times, values = minmax_decimate(times, [b[MIN] for b in buckets],
+                                                [b[MAX] for b in buckets], max_points)
+        else:
+            valid = ~np.isnan(values)
+            times, values = lttb(times[valid], values[valid], max_points)
+        
+        return {
+            'sensor': sensor_type,
+            'source': source,
+            'points': [[t, v] for t, v in zip(times.tolist(), values.tolist())]
         }
     
     def send_command(self, actuator_type, command):
-        """Send control commands to actuators"""
-        topic = f"smartroom/commands/{actuator_type}"
-        self.mqtt_client.publish(topic, json.dumps(command))
+        """Send a control command to actuators; returns its command_id
+        
+        The command is tracked until the actuator acks it or it times out
+        (see CommandTracker); the outcome is emitted as a command_result event.
+        Raises ValueError (after reporting the rejection) for commands that
+        address no actuator.
+        """
+        topic = f"{COMMAND_TOPIC_PREFIX}/{actuator_type}"
+        command = dict(command)
+        if 'actuator_id' not in command:
+            # No actuator would ever ack it; fail now instead of at the timeout
+            error = "Command needs an actuator_id"
+            self.commands.reject(actuator_type, command, error)
+            raise ValueError(error)
+        command_id = self.commands.track(actuator_type, command)
+        self.mqtt_client.publish(topic, json.dumps(command), qos=1)
+        self.commands_published.inc(actuator_type)
         print(f"Command sent to {actuator_type}: {command}")
+        return command_id
+    
+    def report_command(self, result):
+        """Count a command outcome and push it to the dashboards"""
+        self.command_results.inc(result['actuator_type'], result['status'])
+        if 'rtt_ms' in result:
+            self.command_rtt_seconds.observe(result['rtt_ms'] / 1000, result['actuator_type'])
+        if result['status'] != 'applied':
+            print(f"Command {result['command_id']} to {result['actuator_type']}: {result['status']}")
+        self.emit_event('command_result', result)
 
 # Create global gateway instance
 gateway = IoTGateway()
@@ -179,8 +867,11 @@ def index():
 
 @app.route('/api/data')
 def get_data():
-    """API endpoint for current data"""
-    return jsonify(gateway.get_dashboard_data())
+    """API endpoint for current data (304 when the client copy is current)"""
+    generation, _, body = gateway.get_dashboard_snapshot()
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(gateway.snapshot_etag(generation))
+    return response.make_conditional(request)
 
 @app.route('/api/command', methods=['POST'])
 def send_command():
@@ -189,20 +880,129 @@ def send_command():
     actuator_type = data.get('actuator_type')
     command = data.get('command')
     
-    if actuator_type and command:
-        gateway.send_command(actuator_type, command)
-        return jsonify({'status': 'success'})
+    if actuator_type and isinstance(command, dict):
+        try:
+            command_id = gateway.send_command(actuator_type, command)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        return jsonify({'status': 'success', 'command_id': command_id})
     
     return jsonify({'status': 'error', 'message': 'Invalid command'}), 400
 
+@app.route('/api/ingest')
+def get_ingest_stats():
+    """API endpoint for ingest queue depth and drop counters"""
+    return jsonify(gateway.ingest.get_stats())
+
+@app.route('/api/fanout')
+def get_fanout_stats():
+    """API endpoint for WebSocket fan-out counters"""
+    return jsonify(gateway.fanout.get_stats())
+
+@app.route('/api/commands')
+def get_command_stats():
+    """API endpoint for pending commands, failures and round-trip latency"""
+    return jsonify(gateway.commands.get_stats())
+
+@app.route('/api/alerts')
+def get_alert_stats():
+    """API endpoint for gateway alert dedup and rate-limit counters"""
+    return jsonify(gateway.alert_filter.get_stats())
+
+def parse_time_arg(value):
+    """Parse an epoch-seconds or ISO timestamp query argument (None passes through)"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/rollups')
+def get_rollups():
+    """API endpoint for pre-aggregated buckets of one sensor"""
+    sensor = request.args.get('sensor')
+    try:
+        resolution = int(request.args.get('resolution', 60))
+        start = parse_time_arg(request.args.get('from'))
+        end = parse_time_arg(request.args.get('to'))
+        with gateway.lock:
+            buckets = gateway.rollups.query(sensor, resolution, start, end)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    return jsonify({'sensor': sensor, 'resolution': resolution, 'buckets': buckets})
+
+@app.route('/api/history')
+def get_history():
+    """API endpoint for downsampled sensor history over a time range"""
+    sensors = request.args.get('sensor')
+    try:
+        end = parse_time_arg(request.args.get('to')) or get_clock().time()
+        start = parse_time_arg(request.args.get('from'))
+        if start is None:
+            start = end - 3600
+        max_points = int(request.args.get('max_points', HISTORY_MAX_POINTS))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    if end <= start or max_points < 2:
+        return jsonify({'status': 'error', 'message': 'Invalid time range or max_points'}), 400
+    
+    if sensors:
+        sensor_types = sensors.split(',')
+    else:
+        with gateway.lock:
+            sensor_types = list(gateway.data_history.keys())
+    
+    return jsonify({
+        'from': start,
+        'to': end,
+        'max_points': max_points,
+        'series': [gateway.query_history(s, start, end, max_points) for s in sensor_types]
+    })
+
+@app.route('/api/comfort')
+def get_comfort():
+    """API endpoint for windowed comfort scores per room with history"""
+    room_filter = request.args.get('room')
+    window = request.args.get('window', type=float)
+    
+    with gateway.lock:
+        rooms = [room_filter] if room_filter else gateway.comfort.rooms()
+        result = {
+            'window': window or gateway.comfort.window,
+            'score': calculate_comfort_score(gateway.comfort, room_filter, window),
+            'rooms': {
+                room: {
+                    'score': calculate_comfort_score(gateway.comfort, room, window),
+                    'sensors': gateway.comfort.room_violations(room, window),
+                    'history': [[t, score] for t, score in gateway.comfort.score_history(room)]
+                }
+                for room in rooms
+            }
+        }
+    return jsonify(result)
+
+@app.route('/api/metrics')
+def get_metrics():
+    """API endpoint for per-stage latency percentiles"""
+    return jsonify(gateway.latency.summary())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text-format metrics endpoint"""
+    return Response(gateway.metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/analytics')
 def get_analytics():
     """API endpoint for analytics data"""
-    analytics = {
-        'comfort_score': calculate_comfort_score(gateway.comfort_violations),
-        'sensor_trends': analyze_trends(gateway.data_history),
-        'recommendations': generate_recommendations(gateway.sensor_data)
-    }
+    with gateway.lock:
+        analytics = {
+            'comfort_score': calculate_comfort_score(gateway.comfort),
+            'sensor_trends': analyze_trends(gateway.stats),
+            'recommendations': generate_recommendations(gateway.sensor_data)
+        }
     return jsonify(analytics)
 
 # WebSocket events
@@ -210,20 +1010,33 @@ def get_analytics():
 def handle_connect():
     """Handle client connection"""
     print('Client connected')
+    with gateway.lock:
+        gateway.connected_clients += 1
     emit('connected', {'data': 'Connected to Smart Study Room Gateway'})
     
     # Send initial data
-    emit('initial_data', gateway.get_dashboard_data())
+    emit('initial_data', gateway.get_dashboard_snapshot()[1])
+    gateway.emits.inc('initial_data')
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
     print('Client disconnected')
+    with gateway.lock:
+        gateway.connected_clients = max(0, gateway.connected_clients - 1)
 
 @socketio.on('request_update')
 def handle_update_request():
     """Handle manual update requests"""
-    emit('update_data', gateway.get_dashboard_data())
+    emit('update_data', gateway.get_dashboard_snapshot()[1])
+    gateway.emits.inc('update_data')
+
+@socketio.on('rendered')
+def handle_rendered(data):
+    """Record emit-to-render round trip reported by a dashboard"""
+    emitted_at = data.get('emitted_at') if isinstance(data, dict) else None
+    if isinstance(emitted_at, (int, float)):
+        gateway.latency.record('render', 'dashboard', time.monotonic() - emitted_at)
 
 @socketio.on('send_command')
 def handle_command(data):
@@ -231,46 +1044,27 @@ def handle_command(data):
     actuator_type = data.get('actuator_type')
     command = data.get('command')
     
-    if actuator_type and command:
-        gateway.send_command(actuator_type, command)
-        emit('command_sent', {'status': 'success'})
+    if actuator_type and isinstance(command, dict):
+        try:
+            command_id = gateway.send_command(actuator_type, command)
+        except ValueError as e:
+            emit('command_sent', {'status': 'error', 'message': str(e)})
+            return
+        emit('command_sent', {'status': 'success', 'command_id': command_id})
 
 # Analytics functions
-def calculate_comfort_score(violations):
-    """Calculate overall comfort score"""
-    total_violations = sum(violations.values())
-    if total_violations == 0:
-        return 100
-    
-    # Deduct points for violations
-    score = max(0, 100 - (total_violations * 2))
-    return score
-
-def analyze_trends(history):
-    """Analyze sensor data trends"""
+def calculate_comfort_score(comfort, room=None, window=None):
+    """Calculate comfort score as the share of in-range readings in the recent window"""
+    return comfort.score(room, window)
+
+def analyze_trends(stats):
+    """Analyze sensor data trends from the streaming statistics engine"""
     trends = {}
     
-    for sensor_type, data_points in history.items():
-        if len(data_points) >= 10:
-            values = [point['value'] for point in data_points[-10:]]
-            avg = sum(values) / len(values)
-            
-            # Simple trend detection
-            recent_avg = sum(values[-5:]) / 5
-            older_avg = sum(values[:5]) / 5
-            
-            if recent_avg > older_avg * 1.1:
-                trend = "increasing"
-            elif recent_avg < older_avg * 0.9:
-                trend = "decreasing"
-            else:
-                trend = "stable"
-            
-            trends[sensor_type] = {
-                'current': values[-1],
-                'average': round(avg, 2),
-                'trend': trend
-            }
+    for sensor_type in list(stats.sensors):
+        summary = stats.summary(sensor_type)
+        if summary:
+            trends[sensor_type] = summary
     
     return trends
 
@@ -291,7 +1085,7 @@ def generate_recommendations(sensor_data):
     light_data = sensor_data.get('light', {})
     if light_data:
         light = light_data.get('value', 500)
-        hour = datetime.now().hour
+        hour = get_clock().now().hour
         
         if 9 <= hour <= 17 and light < 300:
             recommendations.append("Low light during study hours. Consider opening curtains or turning on lights.")
@@ -309,7 +1103,8 @@ def generate_recommendations(sensor_data):
 
 def run_gateway():
     """Run the gateway with MQTT and web server"""
-    # Start MQTT connection
+    # Restore persisted history, then start MQTT connection
+    gateway.open_store()
     gateway.connect_mqtt()
     
     # Start Flask-SocketIO server
@@ -321,5 +1116,10 @@ if __name__ == "__main__":
         run_gateway()
     except KeyboardInterrupt:
         print("\nShutting down gateway...")
+        gateway.ingest.stop()
+        gateway.fanout.stop()
+        gateway.commands.stop()
+        if gateway.store:
+            gateway.store.close()
         gateway.mqtt_client.loop_stop()
         gateway.mqtt_client.disconnect()
\ No newline at end of file
@@ -0,0 +1,344 @@
+import math
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+
+# Histogram Configuration
+SUB_BUCKET_BITS = 5  # 32 sub-buckets per power of two (~3% relative error)
+MIN_RESOLUTION = 1e-6  # Smallest distinguishable latency in seconds (1 us)
+
+# Latency stages from sensor publish to dashboard render
+STAGES = ('broker', 'queue_wait', 'processing', 'emit', 'total', 'render')
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies in seconds
+
+    Values are bucketed by power of two with 2**SUB_BUCKET_BITS linear
+    sub-buckets each, so recording is O(1), memory is bounded by the value
+    range and percentiles carry a fixed relative error.
+    """
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.min = None
+
+    @staticmethod
+    def bucket_index(value):
+        units = max(1, int(value / MIN_RESOLUTION))
+        exponent = units.bit_length() - 1
+        if exponent < SUB_BUCKET_BITS:
+            return units
+        shift = exponent - SUB_BUCKET_BITS
+        return ((shift + 1) << SUB_BUCKET_BITS) + ((units >> shift) - (1 << SUB_BUCKET_BITS))
+
+    @staticmethod
+    def bucket_value(index):
+        """Upper bound of a bucket in seconds"""
+        if index < (1 << SUB_BUCKET_BITS):
+            return (index + 1) * MIN_RESOLUTION
+        shift = (index >> SUB_BUCKET_BITS) - 1
+        sub = (index & ((1 << SUB_BUCKET_BITS) - 1)) + (1 << SUB_BUCKET_BITS)
+        return ((sub + 1) << shift) * MIN_RESOLUTION
+
+    def record(self, value):
+        value = max(0.0, value)
+        index = self.bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, p):
+        """Value at percentile p (0-100), within the bucket's relative error"""
+        if not self.count:
+            return None
+        target = max(1, int(math.ceil(self.count * p / 100)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    def summary(self, scale=1000):
+        """Summary with values in milliseconds by default"""
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count * scale, 3),
+            'min': round(self.min * scale, 3),
+            'p50': round(self.percentile(50) * scale, 3),
+            'p95': round(self.percentile(95) * scale, 3),
+            'p99': round(self.percentile(99) * scale, 3),
+            'max': round(self.max * scale, 3)
+        }
+
+class LatencyRecorder:
+    """Per-stage, per-sensor-type latency histograms plus sequence tracking"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (stage, sensor_type) -> LatencyHistogram
+        self.sequences = {}  # sensor_id -> {'last', 'received', 'gaps', 'out_of_order'}
+
+    def record(self, stage, sensor_type, seconds):
+        with self.lock:
+            histogram = self.histograms.get((stage, sensor_type))
+            if histogram is None:
+                histogram = self.histograms[(stage, sensor_type)] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def track_sequence(self, sensor_id, seq):
+        """Count gaps and reordering in a device's sequence numbers"""
+        with self.lock:
+            state = self.sequences.get(sensor_id)
+            if state is None:
+                self.sequences[sensor_id] = {'last': seq, 'received': 1, 'gaps': 0, 'out_of_order': 0}
+                return
+            state['received'] += 1
+            if seq > state['last']:
+                state['gaps'] += seq - state['last'] - 1
+                state['last'] = seq
+            elif seq < state['last']:
+                if seq == 0:
+                    # Device restarted
+                    state['last'] = seq
+                else:
+                    state['out_of_order'] += 1
+
+    def summary(self):
+        """p50/p95/p99 per stage overall and per sensor type (milliseconds)"""
+        with self.lock:
+            stages = {}
+            by_sensor = {}
+            for (stage, sensor_type), histogram in self.histograms.items():
+                stages.setdefault(stage, LatencyHistogram()).merge(histogram)
+                by_sensor.setdefault(sensor_type, {})[stage] = histogram.summary()
+            sequences = {sensor_id: {k: v for k, v in state.items() if k != 'last'}
+                         for sensor_id, state in self.sequences.items()}
+        return {
+            'unit': 'ms',
+            'stages': {stage: stages[stage].summary() for stage in STAGES if stage in stages},
+            'sensors': by_sensor,
+            'sequence': sequences
+        }
+
+# Prometheus exporter configuration
+DEFAULT_TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                        0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class ShardHolder:
+    """Thread-local owner of a shard; its finalizer retires the shard"""
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self):
+        self.shard = {}
+
+class ShardedMetric(ABC):
+    """Base for metrics whose writes go to a per-thread shard
+
+    Each thread updates only its own dict, so the hot path takes no lock; a
+    lock is taken once per thread to register its shard and at scrape time
+    the shards are summed. When a thread exits its shard is folded into
+    `retired`, so short-lived request threads do not accumulate shards.
+    """
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.local = threading.local()
+        self.shards = {}  # id(holder) -> shard of a live thread
+        self.retired = {}  # Totals of threads that have exited
+        self.shards_lock = threading.Lock()
+
+    def shard(self):
+        holder = getattr(self.local, 'holder', None)
+        if holder is None:
+            holder = self.local.holder = ShardHolder()
+            key = id(holder)
+            with self.shards_lock:
+                self.shards[key] = holder.shard
+            weakref.finalize(holder, self.retire, key)
+        return holder.shard
+
+    def retire(self, key):
+        """Fold the shard of an exited thread into the retired totals"""
+        with self.shards_lock:
+            shard = self.shards.pop(key, None)
+            if shard:
+                self.merge(self.retired, shard)
+
+    @abstractmethod
+    def merge(self, totals, shard):
+        """Add the per-label values of `shard` into `totals`"""
+
+    def totals(self):
+        """Sum of the retired totals and every live shard"""
+        with self.shards_lock:
+            shards = [shard.copy() for shard in self.shards.values()]
+            totals = {}
+            self.merge(totals, self.retired)
+        for shard in shards:
+            self.merge(totals, shard)
+        return totals
+
+class Counter(ShardedMetric):
+    """Monotonic counter, optionally labelled"""
+    metric_type = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        shard = self.shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def merge(self, totals, shard):
+        for key, value in shard.items():
+            totals[key] = totals.get(key, 0) + value
+
+    def collect(self):
+        return [(f'{self.name}{format_labels(self.labels, key)}', value)
+                for key, value in sorted(self.totals().items())]
+
+class Histogram(ShardedMetric):
+    """Cumulative-bucket histogram in the Prometheus style"""
+    metric_type = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_TIME_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        shard = self.shard()
+        state = shard.get(label_values)
+        if state is None:
+            state = shard[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        counts = state[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+        state[1] += value
+        state[2] += 1
+
+    def merge(self, totals, shard):
+        for key, (counts, total, count) in list(shard.items()):
+            merged = totals.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            for index, value in enumerate(list(counts)):
+                merged[0][index] += value
+            merged[1] += total
+            merged[2] += count
+
+    def collect(self):
+        samples = []
+        for key, (counts, total, count) in sorted(self.totals().items()):
+            cumulative = 0
+            for bound, value in zip(self.buckets + (float('inf'),), counts):
+                cumulative += value
+                labels = format_labels(self.labels, key, f'le="{format_value(float(bound))}"')
+                samples.append((f'{self.name}_bucket{labels}', cumulative))
+            samples.append((f'{self.name}_sum{format_labels(self.labels, key)}', total))
+            samples.append((f'{self.name}_count{format_labels(self.labels, key)}', count))
+        return samples
+
+    def time(self, *label_values):
+        """Context manager observing the elapsed time of a block"""
+        return _Timer(self, label_values)
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from a callback at scrape time
+
+    The callback returns a number, or a list of (label_values, number) pairs.
+    """
+    def __init__(self, name, help_text, func, labels=(), metric_type='gauge'):
+        self.name = name
+        self.help_text = help_text
+        self.func = func
+        self.labels = tuple(labels)
+        self.metric_type = metric_type
+
+    def collect(self):
+        result = self.func()
+        if isinstance(result, (int, float)):
+            return [(self.name, result)]
+        return [(f'{self.name}{format_labels(self.labels, key)}', value) for key, value in result]
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text format"""
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_TIME_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, func, labels=()):
+        return self.register(CallbackMetric(name, help_text, func, labels))
+
+    def callback_counter(self, name, help_text, func, labels=()):
+        return self.register(CallbackMetric(name, help_text, func, labels, 'counter'))
+
+    def render(self):
+        """Render all metrics as Prometheus exposition text (format 0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.collect()
+            except Exception as e:
+                print(f"Error collecting metric {metric.name}: {e}")
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            for sample, value in samples:
+                lines.append(f'{sample} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
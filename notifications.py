@@ -0,0 +1,106 @@
+import re
+import threading
+from simclock import get_clock
+
+# Notification Filter Configuration (simulated seconds)
+NOTIFY_DEDUP_WINDOW = 60  # Identical notifications within this window are dropped
+NOTIFY_RATE = 1 / 300  # Sustained notifications per second per fingerprint
+NOTIFY_BURST = 3  # Notifications a fingerprint may send back to back
+NOTIFY_AGGREGATE_WINDOW = 300  # Seconds between summaries of suppressed notifications
+
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+
+def fingerprint(message):
+    """Message with numbers masked, so changing readings count as repeats"""
+    return NUMBER_PATTERN.sub('#', message)
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second up to `capacity`"""
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class NotificationFilter:
+    """Dedup, per-fingerprint rate limiting and aggregation of notifications
+
+    admit() decides whether a notification goes out now. Suppressed ones are
+    counted per fingerprint and due_summaries() turns them into one
+    "message (x14 in last 5 min)" notification per aggregation window.
+    """
+    def __init__(self, clock=None, dedup_window=NOTIFY_DEDUP_WINDOW, rate=NOTIFY_RATE,
+                 burst=NOTIFY_BURST, aggregate_window=NOTIFY_AGGREGATE_WINDOW):
+        self.clock = clock or get_clock()
+        self.dedup_window = dedup_window
+        self.rate = rate
+        self.burst = burst
+        self.aggregate_window = aggregate_window
+        self.lock = threading.Lock()
+        self.keys = {}  # fingerprint -> state dict
+
+        # Counters
+        self.admitted = 0
+        self.suppressed = 0
+        self.summaries = 0
+
+    def admit(self, message, now=None):
+        """Return True if the notification should be sent now"""
+        now = self.clock.time() if now is None else now
+        key = fingerprint(message)
+        with self.lock:
+            state = self.keys.get(key)
+            if state is None:
+                state = self.keys[key] = {
+                    'bucket': TokenBucket(self.rate, self.burst, now),
+                    'last_sent': None,
+                    'message': message,
+                    'suppressed': 0,
+                    'first_suppressed': None
+                }
+            duplicate = state['last_sent'] is not None and now - state['last_sent'] < self.dedup_window
+            if not duplicate and state['bucket'].take(now):
+                state['last_sent'] = now
+                self.admitted += 1
+                return True
+            state['message'] = message  # Summaries quote the latest wording
+            state['suppressed'] += 1
+            if state['first_suppressed'] is None:
+                state['first_suppressed'] = now
+            self.suppressed += 1
+            return False
+
+    def due_summaries(self, now=None):
+        """Return [(summary message, count)] for windows that have elapsed"""
+        now = self.clock.time() if now is None else now
+        summaries = []
+        with self.lock:
+            for state in self.keys.values():
+                if state['suppressed'] and now - state['first_suppressed'] >= self.aggregate_window:
+                    minutes = max(1, round((now - state['first_suppressed']) / 60))
+                    summaries.append((f"{state['message']} (×{state['suppressed']} in last {minutes} min)",
+                                      state['suppressed']))
+                    state['suppressed'] = 0
+                    state['first_suppressed'] = None
+                    state['last_sent'] = now
+            self.summaries += len(summaries)
+        return summaries
+
+    def get_stats(self):
+        with self.lock:
+            pending = sum(state['suppressed'] for state in self.keys.values())
+        return {
+            'admitted': self.admitted,
+            'suppressed': self.suppressed,
+            'summaries': self.summaries,
+            'pending': pending,
+            'fingerprints': len(self.keys)
+        }
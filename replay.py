@@ -0,0 +1,265 @@
+import argparse
+import struct
+import time
+from sensor import MQTT_BROKER, MQTT_PORT, create_client
+
+# Traffic Log Configuration
+RECORD_TOPIC = "smartroom/#"
+LOG_MAGIC = b"SRTLOG2\n"
+LOG_HEADER = struct.Struct("<d")  # Recording start, epoch seconds
+TOPIC_RECORD = struct.Struct("<cIH")  # b'T', topic id, name length
+MESSAGE_RECORD = struct.Struct("<cIQI")  # b'M', topic id, offset in us, payload length
+# Record layouts by log version; version 1 logs used 16-bit topic ids
+LOG_FORMATS = {
+    b"SRTLOG1\n": (struct.Struct("<cHH"), struct.Struct("<cHQI")),
+    LOG_MAGIC: (TOPIC_RECORD, MESSAGE_RECORD)
+}
+FLUSH_INTERVAL = 1.0  # Seconds between recorder flushes
+
+class ReplayMessage:
+    """Minimal stand-in for paho's MQTTMessage (topic and payload only)"""
+    __slots__ = ('topic', 'payload')
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+class TrafficRecorder:
+    """Capture MQTT traffic to a compact append-only binary log
+
+    The log starts with LOG_MAGIC and the recording start time. Each topic is
+    written once as a 'T' record assigning it a 32-bit id, so a large fleet's
+    per-device topics cannot run out of ids; every message is a 17-byte 'M'
+    record (topic id, microseconds since the start, payload length) followed
+    by the raw payload bytes.
+    """
+    def __init__(self, path, topic=RECORD_TOPIC):
+        self.path = path
+        self.topic = topic
+        self.file = None
+        self.topic_ids = {}
+        self.started = None
+        self.last_flush = 0
+        self.mqtt_client = create_client(f"recorder_{int(time.time())}")
+
+        # Counters
+        self.recorded = 0
+        self.bytes_written = 0
+
+    def open(self):
+        self.file = open(self.path, 'wb')
+        self.started = time.monotonic()
+        self.file.write(LOG_MAGIC + LOG_HEADER.pack(time.time()))
+        self.bytes_written = len(LOG_MAGIC) + LOG_HEADER.size
+
+    def record(self, topic, payload, recv_time=None):
+        """Append one message; recv_time is time.monotonic() at receipt"""
+        if recv_time is None:
+            recv_time = time.monotonic()
+        topic_id = self.topic_ids.get(topic)
+        if topic_id is None:
+            topic_id = self.topic_ids[topic] = len(self.topic_ids)
+            name = topic.encode()
+            self.file.write(TOPIC_RECORD.pack(b'T', topic_id, len(name)) + name)
+            self.bytes_written += TOPIC_RECORD.size + len(name)
+        offset_us = max(0, int((recv_time - self.started) * 1e6))
+        self.file.write(MESSAGE_RECORD.pack(b'M', topic_id, offset_us, len(payload)) + payload)
+        self.bytes_written += MESSAGE_RECORD.size + len(payload)
+        self.recorded += 1
+
+        if recv_time - self.last_flush >= FLUSH_INTERVAL:
+            self.file.flush()
+            self.last_flush = recv_time
+
+    def on_connect(self, client, userdata, flags, rc):
+        print(f"Recorder connected with result code {rc}")
+        client.subscribe(self.topic)
+
+    def on_message(self, client, userdata, msg):
+        try:
+            self.record(msg.topic, msg.payload, time.monotonic())
+        except Exception as e:
+            print(f"Error recording message on {msg.topic}: {e}")
+
+    def run(self, duration=None):
+        """Record until interrupted or `duration` seconds elapse"""
+        self.open()
+        self.mqtt_client.on_connect = self.on_connect
+        self.mqtt_client.on_message = self.on_message
+        try:
+            self.mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
+            self.mqtt_client.loop_start()
+            print(f"Recording {self.topic} to {self.path}")
+            while duration is None or time.monotonic() - self.started < duration:
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.mqtt_client.loop_stop()
+        self.mqtt_client.disconnect()
+        if self.file:
+            self.file.close()
+            self.file = None
+        print(f"Recorded {self.recorded} messages ({self.bytes_written} bytes) to {self.path}")
+
+def read_log(path):
+    """Yield (offset_seconds, topic, payload) for every message in a log"""
+    topics = {}
+    with open(path, 'rb') as log:
+        formats = LOG_FORMATS.get(log.read(len(LOG_MAGIC)))
+        if formats is None:
+            raise ValueError(f"{path} is not a traffic log")
+        topic_record, message_record = formats
+        log.read(LOG_HEADER.size)
+        while True:
+            kind = log.read(1)
+            if not kind:
+                return
+            if kind == b'T':
+                header = kind + log.read(topic_record.size - 1)
+                if len(header) < topic_record.size:
+                    return  # Truncated by an interrupted recording
+                _, topic_id, length = topic_record.unpack(header)
+                topics[topic_id] = log.read(length).decode()
+            elif kind == b'M':
+                header = kind + log.read(message_record.size - 1)
+                if len(header) < message_record.size:
+                    return
+                _, topic_id, offset_us, length = message_record.unpack(header)
+                payload = log.read(length)
+                if len(payload) < length:
+                    return
+                yield offset_us / 1e6, topics[topic_id], payload
+            else:
+                raise ValueError(f"Corrupt traffic log {path}: unknown record {kind!r}")
+
+class TrafficReplayer:
+    """Replay a traffic log into a handler at a chosen speed
+
+    speed=1 keeps the recorded timing, speed=N plays N times faster and
+    speed=0 replays as fast as possible. The handler is called as
+    handler(topic, payload).
+    """
+    def __init__(self, path, speed=1.0, loops=1):
+        self.path = path
+        self.speed = speed
+        self.loops = loops
+        self.running = False
+
+        # Counters
+        self.replayed = 0
+        self.elapsed = 0.0
+
+    def replay(self, handler):
+        """Replay the log; returns (messages, elapsed seconds)"""
+        self.running = True
+        started = time.monotonic()
+        base = 0.0  # Offset of the current loop within the replay
+        loop = 0
+        while self.running and (self.loops == 0 or loop < self.loops):
+            last_offset = 0.0
+            for offset, topic, payload in read_log(self.path):
+                if not self.running:
+                    break
+                last_offset = offset
+                if self.speed > 0:
+                    delay = started + (base + offset) / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                handler(topic, payload)
+                self.replayed += 1
+            base += last_offset
+            loop += 1
+        self.running = False
+        self.elapsed = time.monotonic() - started
+        return self.replayed, self.elapsed
+
+    def stop(self):
+        self.running = False
+
+def mqtt_target():
+    """Republish to the broker; returns (handler, cleanup)"""
+    client = create_client(f"replayer_{int(time.time())}")
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_start()
+
+    def cleanup():
+        client.loop_stop()
+        client.disconnect()
+    return lambda topic, payload: client.publish(topic, payload), cleanup
+
+def gateway_target():
+    """Feed IoTGateway.on_message in-process, without a broker"""
+    from gateway import gateway
+    gateway.ingest.start()
+    gateway.fanout.start()
+
+    def cleanup():
+        gateway.ingest.stop()
+        gateway.fanout.stop()
+        print(f"Gateway ingest stats: {gateway.ingest.get_stats()}")
+    return lambda topic, payload: gateway.on_message(None, None, ReplayMessage(topic, payload)), cleanup
+
+def actuators_target():
+    """Feed the actuators in-process, evaluating them on relevant updates"""
+    from actuator import (RULES_PATH, ActuatorDispatcher, SmartLight, ClimateControl,
+                          FocusMode, NotificationSystem)
+    from rules import RuleEngine
+    dispatcher = ActuatorDispatcher(RuleEngine(RULES_PATH))
+    for actuator in (SmartLight(), ClimateControl(), FocusMode(), NotificationSystem()):
+        dispatcher.add(actuator)
+
+    def handler(topic, payload):
+        for actuator in dispatcher.dispatch(topic, payload):
+            actuator.evaluate()
+
+    def cleanup():
+        print(f"Actuator dispatch: {dispatcher.decoded} decodes, {dispatcher.delivered} deliveries")
+    return handler, cleanup
+
+REPLAY_TARGETS = {
+    'mqtt': mqtt_target,
+    'gateway': gateway_target,
+    'actuators': actuators_target
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay Smart Study Room MQTT traffic")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help="Capture smartroom/# to a log")
+    record_parser.add_argument('path')
+    record_parser.add_argument('--topic', default=RECORD_TOPIC)
+    record_parser.add_argument('--duration', type=float, default=None, help="Seconds to record (default: forever)")
+
+    play_parser = subparsers.add_parser('play', help="Replay a log")
+    play_parser.add_argument('path')
+    play_parser.add_argument('--speed', type=float, default=1.0,
+                             help="Playback speed multiplier; 0 replays as fast as possible")
+    play_parser.add_argument('--loops', type=int, default=1, help="Times to replay the log (0: forever)")
+    play_parser.add_argument('--target', choices=sorted(REPLAY_TARGETS), default='mqtt')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        recorder = TrafficRecorder(args.path, args.topic)
+        try:
+            recorder.run(args.duration)
+        except KeyboardInterrupt:
+            print("\nStopping recorder...")
+        return
+
+    handler, cleanup = REPLAY_TARGETS[args.target]()
+    replayer = TrafficReplayer(args.path, args.speed, args.loops)
+    try:
+        replayer.replay(handler)
+    except KeyboardInterrupt:
+        print("\nStopping replay...")
+    finally:
+        cleanup()
+    rate = replayer.replayed / replayer.elapsed if replayer.elapsed else 0
+    print(f"Replayed {replayer.replayed} messages to {args.target} "
+          f"in {replayer.elapsed:.2f}s ({rate:.0f} msg/s)")
+
+if __name__ == "__main__":
+    main()
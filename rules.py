@@ -0,0 +1,337 @@
+import json
+import operator
+import os
+import threading
+import time
+from simclock import get_clock
+
+# Rule Engine Configuration
+RULES_RELOAD_INTERVAL = 2.0  # Real seconds between rules file change checks
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'between': lambda value, bounds: bounds[0] <= value <= bounds[1],
+    'outside': lambda value, bounds: value < bounds[0] or value > bounds[1]
+}
+
+class FormatValues(dict):
+    """Message format fields; unknown names render as '?'"""
+    def __missing__(self, key):
+        return '?'
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+class FieldRef:
+    """Condition bound read from an actuator field, plus an offset
+
+    Written as {"field": "target_temp", "add": 2} in a condition value; the
+    field is read from the rule's own actuator unless "actuator" names
+    another actuator type.
+    """
+    def __init__(self, spec, rule_name):
+        field = spec.get('field')
+        if not isinstance(field, str):
+            raise ValueError(f"Rule {rule_name}: field reference needs a 'field' name")
+        add = spec.get('add', 0)
+        if not is_number(add):
+            raise ValueError(f"Rule {rule_name}: 'add' of {field!r} must be a number")
+        self.actuator = spec.get('actuator')
+        self.field = field
+        self.add = add
+
+    def __str__(self):
+        name = f"{self.actuator}.{self.field}" if self.actuator else self.field
+        return f"{name}{self.add:+g}" if self.add else name
+
+    def resolve(self, lookup, default_actuator):
+        owner = lookup(self.actuator or default_actuator)
+        value = getattr(owner, self.field, None) if owner is not None else None
+        return value + self.add if is_number(value) else None
+
+def parse_operand(value, rule_name):
+    if isinstance(value, dict):
+        return FieldRef(value, rule_name)
+    return value
+
+class Condition:
+    """One test on a sensor value or an actuator field
+
+    Sensor conditions may require the test to have held for `duration`
+    simulated seconds. Actuator conditions read the field from the live
+    actuator object when a rule is selected. Values may reference actuator
+    fields (see FieldRef); such conditions are also tested at selection so
+    they follow changes of the field.
+    """
+    def __init__(self, spec, rule_name):
+        if not isinstance(spec, dict):
+            raise ValueError(f"Rule {rule_name}: each condition must be an object")
+        if 'sensor' in spec:
+            self.kind = 'sensor'
+            self.source = spec['sensor']
+            self.field = 'value'
+        elif 'actuator' in spec:
+            self.kind = 'actuator'
+            self.source = spec['actuator']
+            self.field = spec.get('field', 'state')
+        else:
+            raise ValueError(f"Rule {rule_name}: condition needs 'sensor' or 'actuator'")
+        if not isinstance(self.source, str) or not isinstance(self.field, str):
+            raise ValueError(f"Rule {rule_name}: condition source and field must be strings")
+        op = spec.get('op', '==')
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {rule_name}: unknown operator {op!r}")
+        self.op = op
+        self.test_func = OPERATORS[op]
+        if 'value' not in spec:
+            raise ValueError(f"Rule {rule_name}: condition on {self.source} needs a 'value'")
+        value = spec['value']
+        if op in ('between', 'outside'):
+            if not (isinstance(value, list) and len(value) == 2):
+                raise ValueError(f"Rule {rule_name}: {op!r} needs a [low, high] value")
+            self.value = [parse_operand(bound, rule_name) for bound in value]
+            self.dynamic = any(isinstance(bound, FieldRef) for bound in self.value)
+        else:
+            self.value = parse_operand(value, rule_name)
+            self.dynamic = isinstance(self.value, FieldRef)
+        duration = spec.get('for', 0)
+        if not is_number(duration):
+            raise ValueError(f"Rule {rule_name}: 'for' must be a number of seconds")
+        self.duration = float(duration)
+        if self.dynamic and self.duration:
+            raise ValueError(f"Rule {rule_name}: 'for' cannot be combined with a field reference")
+        shown = f"[{self.value[0]}, {self.value[1]}]" if isinstance(self.value, list) else self.value
+        self.label = spec.get('label', f"{self.source} {op} {shown}: {{value}}")
+        if not isinstance(self.label, str):
+            raise ValueError(f"Rule {rule_name}: 'label' must be a string")
+
+    def resolve(self, lookup, default_actuator):
+        """Condition value with field references read from the actuators"""
+        if not self.dynamic:
+            return self.value
+        if isinstance(self.value, list):
+            return [bound.resolve(lookup, default_actuator) if isinstance(bound, FieldRef) else bound
+                    for bound in self.value]
+        return self.value.resolve(lookup, default_actuator)
+
+    def test(self, value, bound=None):
+        bound = self.value if bound is None else bound
+        try:
+            return value is not None and self.test_func(value, bound)
+        except TypeError:
+            return False
+
+class Rule:
+    """Conditions -> actions for one actuator type
+
+    The rule is active when at least `min_matches` conditions hold (all of
+    them by default). Within an actuator type and group, the active rule
+    with the highest priority (then earliest in the file) is applied.
+    """
+    def __init__(self, spec, order):
+        if not isinstance(spec, dict):
+            raise ValueError(f"Rule {order}: each rule must be an object")
+        self.name = spec.get('name', f"rule_{order}")
+        if not isinstance(self.name, str):
+            raise ValueError(f"Rule {order}: 'name' must be a string")
+        if not isinstance(spec.get('actuator'), str):
+            raise ValueError(f"Rule {self.name}: missing 'actuator'")
+        self.actuator = spec['actuator']
+        self.group = spec.get('group', 'default')
+        self.priority = spec.get('priority', 0)
+        if not is_number(self.priority):
+            raise ValueError(f"Rule {self.name}: 'priority' must be a number")
+        self.order = order
+        when = spec.get('when', [])
+        if not isinstance(when, list):
+            raise ValueError(f"Rule {self.name}: 'when' must be a list of conditions")
+        self.conditions = [Condition(condition, self.name) for condition in when]
+        self.min_matches = spec.get('min_matches', len(self.conditions))
+        if not isinstance(self.min_matches, int) or isinstance(self.min_matches, bool):
+            raise ValueError(f"Rule {self.name}: 'min_matches' must be an integer")
+        self.actions = spec.get('set', {})
+        if not isinstance(self.actions, dict):
+            raise ValueError(f"Rule {self.name}: 'set' must be an object")
+        self.notify = spec.get('notify')
+        if self.notify is not None and not isinstance(self.notify, str):
+            raise ValueError(f"Rule {self.name}: 'notify' must be a string")
+        # Static sensor conditions are cached by observe(); the rest are tested in select()
+        self.sensor_conditions = [(index, condition) for index, condition in enumerate(self.conditions)
+                                  if condition.kind == 'sensor' and not condition.dynamic]
+        self.field_conditions = [(index, condition) for index, condition in enumerate(self.conditions)
+                                 if condition.kind == 'sensor' and condition.dynamic]
+        self.actuator_conditions = [(index, condition) for index, condition in enumerate(self.conditions)
+                                    if condition.kind == 'actuator']
+
+    @property
+    def sensors(self):
+        return {condition.source for condition in self.conditions if condition.kind == 'sensor'}
+
+class RulePlan:
+    """Compiled rules indexed by the sensor types and actuator types they use"""
+    def __init__(self, spec):
+        self.rules = [Rule(rule, order) for order, rule in enumerate(spec.get('rules', []))]
+        # Evaluation state is keyed by rule name, so names must be unique
+        names = set()
+        for rule in self.rules:
+            if rule.name in names:
+                raise ValueError(f"Duplicate rule name {rule.name!r}")
+            names.add(rule.name)
+        self.by_sensor = {}  # sensor type -> rules with a condition on it
+        self.by_actuator = {}  # actuator type -> rules in selection order
+        for rule in self.rules:
+            for sensor_type in rule.sensors:
+                self.by_sensor.setdefault(sensor_type, []).append(rule)
+            self.by_actuator.setdefault(rule.actuator, []).append(rule)
+        for rules in self.by_actuator.values():
+            rules.sort(key=lambda rule: (-rule.priority, rule.order))
+
+    def sensors_for(self, actuator_type):
+        sensors = set()
+        for rule in self.by_actuator.get(actuator_type, ()):
+            sensors |= rule.sensors
+        return sensors
+
+def compile_rules(spec):
+    """Build a RulePlan from a parsed rules document (raises ValueError)"""
+    if not isinstance(spec, dict) or not isinstance(spec.get('rules', []), list):
+        raise ValueError("Rules document must be an object with a 'rules' list")
+    return RulePlan(spec)
+
+def load_rules(path):
+    with open(path) as f:
+        return compile_rules(json.load(f))
+
+class RuleEngine:
+    """Evaluates a RulePlan incrementally and reloads it when the file changes
+
+    observe() re-tests only the sensor conditions that reference the
+    reading's type and caches the results; select() combines the cached
+    results with actuator conditions to pick each group's winning rule.
+    """
+    def __init__(self, path=None, reload_interval=RULES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.plan = RulePlan({})
+        self.mtime = None
+        self.last_check = 0
+        self.actuators = {}  # actuator type -> actuator, for cross-actuator conditions
+        self.values = {}  # sensor type -> latest value
+        self.results = {}  # (rule name, condition index) -> bool
+        self.since = {}  # (rule name, condition index) -> simulated time it became true
+
+        # Counters
+        self.evaluated = 0
+        self.reloads = 0
+        if path:
+            self.reload()
+
+    def reload(self):
+        """Load the rules file; keep the current plan if it is invalid"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        try:
+            plan = load_rules(self.path)
+        except Exception as e:
+            # Remember the broken version so it is not re-parsed on every check
+            print(f"Error loading rules from {self.path}: {e}")
+            self.mtime = mtime
+            return False
+        with self.lock:
+            self.plan = plan
+            self.mtime = mtime
+            self.results = {}
+            self.since = {}
+            now = get_clock().time()
+            for rule in plan.rules:
+                self._evaluate(rule, now)
+        self.reloads += 1
+        print(f"Loaded {len(plan.rules)} rules from {self.path}")
+        return True
+
+    def maybe_reload(self):
+        """Reload if the file changed; returns True when a new plan is active"""
+        now = time.monotonic()
+        if not self.path or now - self.last_check < self.reload_interval:
+            return False
+        self.last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        return self.reload()
+
+    def register(self, actuator):
+        self.actuators[actuator.actuator_type] = actuator
+
+    def has_rules(self, actuator_type):
+        return actuator_type in self.plan.by_actuator
+
+    def sensors_for(self, actuator_type):
+        return self.plan.sensors_for(actuator_type)
+
+    def observe(self, sensor_type, value, now=None):
+        """Record a reading and re-test only the rules that reference it"""
+        now = get_clock().time() if now is None else now
+        with self.lock:
+            self.values[sensor_type] = value
+            for rule in self.plan.by_sensor.get(sensor_type, ()):
+                self._evaluate(rule, now, sensor_type)
+
+    def _evaluate(self, rule, now, sensor_type=None):
+        for index, condition in rule.sensor_conditions:
+            if sensor_type is not None and condition.source != sensor_type:
+                continue
+            key = (rule.name, index)
+            held = condition.test(self.values.get(condition.source))
+            if held:
+                started = self.since.setdefault(key, now)
+                held = now - started >= condition.duration
+            else:
+                self.since.pop(key, None)
+            self.results[key] = held
+            self.evaluated += 1
+
+    def select(self, actuator):
+        """Return [(rule, format values)] for each group's winning rule"""
+        with self.lock:
+            rules = self.plan.by_actuator.get(actuator.actuator_type, ())
+            values = FormatValues(self.values)
+            winners = {}
+
+            def lookup(actuator_type):
+                if actuator_type == actuator.actuator_type:
+                    return actuator
+                return self.actuators.get(actuator_type)
+
+            for rule in rules:
+                if rule.group in winners:
+                    continue
+                matched = [(condition, self.values.get(condition.source))
+                           for index, condition in rule.sensor_conditions
+                           if self.results.get((rule.name, index))]
+                for _, condition in rule.field_conditions:
+                    value = self.values.get(condition.source)
+                    if condition.test(value, condition.resolve(lookup, rule.actuator)):
+                        matched.append((condition, value))
+                for _, condition in rule.actuator_conditions:
+                    owner = lookup(condition.source)
+                    field = getattr(owner, condition.field, None) if owner else None
+                    if condition.test(field, condition.resolve(lookup, rule.actuator)):
+                        matched.append((condition, field))
+                if len(matched) >= rule.min_matches:
+                    fields = FormatValues(values)
+                    fields['matched'] = "\n".join(condition.label.format(value=value)
+                                                  for condition, value in matched)
+                    winners[rule.group] = (rule, fields)
+            return list(winners.values())
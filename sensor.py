@@ -1,14 +1,31 @@
-import random
 import time
 import json
+import heapq
 import threading
 import paho.mqtt.client as mqtt
-from datetime import datetime
+from simclock import get_clock
+from climate import CLIMATE_STATE_TOPIC, PLANT_NOISE, ThermalPlant
+from codec import (sensor_topic, frame_topic, device_topic, device_descriptor,
+                   encode_reading, encode_frame)
 
 # MQTT Configuration
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 MQTT_TOPIC_PREFIX = "smartroom/sensors"
+SENSOR_INTERVAL = 2  # Seconds between readings
+SENSOR_COMPACT = False  # Publish the compact binary format (see codec.py)
+SENSOR_BATCH_SIZE = 1  # Samples per published frame (1 disables batching)
+SENSOR_BATCH_WINDOW = 1000  # Max milliseconds of samples held in one frame
+SENSOR_THERMAL_PLANT = False  # Read temperature from a ThermalPlant driven by the HVAC state
+
+def create_client(client_id):
+    """Create an MQTT client compatible with paho-mqtt 1.x and 2.x"""
+    try:
+        # Try new version (2.0+) with callback API version
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id)
+    except AttributeError:
+        # Fall back to old version
+        return mqtt.Client(client_id)
 
 class Sensor:
     """Base sensor class"""
@@ -19,16 +36,40 @@ class Sensor:
         self.min_val = min_val
         self.max_val = max_val
         self.current_value = (min_val + max_val) / 2
-        try:
-            # Try new version (2.0+) with callback API version
-            self.mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, f"{sensor_type}_{sensor_id}")
-        except AttributeError:
-            # Fall back to old version
-            self.mqtt_client = mqtt.Client(f"{sensor_type}_{sensor_id}")
+        self.seq = 0
+        self.interval = SENSOR_INTERVAL
+        self.room = None  # Included in payloads when set
+        self.verbose = True  # Print each reading
+        self.compact = SENSOR_COMPACT
+        self.announced = False
+        self.batch_size = SENSOR_BATCH_SIZE
+        self.batch_window = SENSOR_BATCH_WINDOW
+        self.frame_values = []
+        self.frame_start = None
+        self.clock = get_clock()
+        self._random = None
+        # Created on connect, or shared by a SensorRuntime
+        self.mqtt_client = None
+        self.owns_client = False
         self.running = False
         
+    @property
+    def random(self):
+        """Per-device random generator, seeded from the simulation clock"""
+        if self._random is None:
+            self._random = self.clock.rng_for(f"{self.sensor_type}_{self.sensor_id}")
+        return self._random
+    
+    def set_clock(self, clock):
+        """Use a different simulation clock (and re-derive the RNG)"""
+        self.clock = clock
+        self._random = None
+    
     def connect_mqtt(self):
         """Connect to MQTT broker"""
+        if self.mqtt_client is None:
+            self.mqtt_client = create_client(f"{self.sensor_type}_{self.sensor_id}")
+            self.owns_client = True
         try:
             self.mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
             self.mqtt_client.loop_start()
@@ -39,29 +80,83 @@ class Sensor:
     def generate_data(self):
         """Generate realistic sensor data with some randomness"""
         # Add realistic fluctuations
-        change = random.uniform(-2, 2)
+        change = self.random.uniform(-2, 2)
         self.current_value += change
         
         # Keep within bounds
         self.current_value = max(self.min_val, min(self.max_val, self.current_value))
         
         # Add some noise
-        noise = random.uniform(-0.5, 0.5)
+        noise = self.random.uniform(-0.5, 0.5)
         return round(self.current_value + noise, 2)
     
     def publish_data(self, value):
         """Publish sensor data to MQTT"""
+        if self.batch_size > 1:
+            self.add_to_frame(value)
+            return
+        if self.compact:
+            self.publish_compact(value)
+            return
         data = {
             "sensor_id": self.sensor_id,
             "type": self.sensor_type,
             "value": value,
             "unit": self.unit,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": self.clock.now().isoformat(),
+            "seq": self.seq,
+            "publish_ts": time.monotonic()  # For end-to-end latency tracking
         }
+        self.seq += 1
+        if self.room is not None:
+            data["room"] = self.room
         
-        topic = f"{MQTT_TOPIC_PREFIX}/{self.sensor_type}"
+        topic = sensor_topic(MQTT_TOPIC_PREFIX, self.sensor_type)
         self.mqtt_client.publish(topic, json.dumps(data))
-        print(f"{self.sensor_type}: {value}{self.unit}")
+        if self.verbose:
+            print(f"{self.sensor_type}: {value}{self.unit}")
+    
+    def announce(self):
+        """Publish the retained descriptor binary payloads refer to"""
+        if not self.announced:
+            self.mqtt_client.publish(device_topic(self.sensor_id),
+                                     device_descriptor(self.sensor_id, self.sensor_type, self.room),
+                                     retain=True)
+            self.announced = True
+    
+    def publish_compact(self, value):
+        """Publish a 29-byte binary reading, announcing the device first"""
+        self.announce()
+        payload = encode_reading(self.sensor_id, value, self.clock.time(), self.seq, time.monotonic())
+        self.seq += 1
+        self.mqtt_client.publish(sensor_topic(MQTT_TOPIC_PREFIX, self.sensor_type, True), payload)
+        if self.verbose:
+            print(f"{self.sensor_type}: {value}{self.unit}")
+    
+    def add_to_frame(self, value):
+        """Hold a sample until batch_size samples or batch_window ms are buffered"""
+        now = self.clock.time()
+        if self.frame_start is None:
+            self.frame_start = now
+        self.frame_values.append(value)
+        if len(self.frame_values) >= self.batch_size or \
+           (now - self.frame_start) * 1000 >= self.batch_window:
+            self.publish_frame()
+    
+    def publish_frame(self):
+        """Publish buffered samples as one frame (samples are `interval` apart)"""
+        if not self.frame_values:
+            return
+        self.announce()
+        payload = encode_frame(self.sensor_id, self.frame_values, self.frame_start,
+                               self.interval, self.seq, time.monotonic())
+        self.seq += 1
+        self.mqtt_client.publish(frame_topic(MQTT_TOPIC_PREFIX, self.sensor_type), payload)
+        if self.verbose:
+            print(f"{self.sensor_type}: {len(self.frame_values)} samples, "
+                  f"last {self.frame_values[-1]}{self.unit}")
+        self.frame_values = []
+        self.frame_start = None
     
     def run(self):
         """Main sensor loop"""
@@ -71,24 +166,33 @@ class Sensor:
         while self.running:
             value = self.generate_data()
             self.publish_data(value)
-            time.sleep(2)  # Send data every 2 seconds
+            self.clock.sleep(self.interval)
     
     def stop(self):
         """Stop the sensor"""
         self.running = False
-        self.mqtt_client.loop_stop()
-        self.mqtt_client.disconnect()
+        if self.mqtt_client is not None:
+            self.publish_frame()
+        if self.owns_client:
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
 
 class TemperatureSensor(Sensor):
     """Temperature sensor with realistic patterns"""
     def __init__(self, sensor_id="temp_01"):
         super().__init__(sensor_id, "temperature", "°C", 18, 28)
         self.time_of_day_effect = 0
+        self.plant = None  # ThermalPlant to measure instead of the random walk
     
     def generate_data(self):
         """Generate temperature data with day/night patterns"""
+        if self.plant is not None:
+            # Closed loop: measure the simulated room, which the HVAC state affects
+            self.current_value = self.plant.temperature(self.clock.time())
+            return round(self.current_value + self.random.gauss(0, PLANT_NOISE), 2)
+        
         # Simulate day/night temperature variations
-        hour = datetime.now().hour
+        hour = self.clock.now().hour
         if 6 <= hour <= 18:  # Daytime
             self.time_of_day_effect = min(3, self.time_of_day_effect + 0.1)
         else:  # Nighttime
@@ -109,20 +213,20 @@ class LightSensor(Sensor):
     
     def generate_data(self):
         """Generate light data based on time of day"""
-        hour = datetime.now().hour
+        hour = self.clock.now().hour
         
         # Simulate natural light patterns
         if 6 <= hour <= 8:  # Early morning
-            self.current_value = random.uniform(100, 300)
+            self.current_value = self.random.uniform(100, 300)
         elif 9 <= hour <= 17:  # Daytime
-            self.current_value = random.uniform(400, 800)
+            self.current_value = self.random.uniform(400, 800)
         elif 18 <= hour <= 20:  # Evening
-            self.current_value = random.uniform(200, 400)
+            self.current_value = self.random.uniform(200, 400)
         else:  # Night
-            self.current_value = random.uniform(0, 100)
+            self.current_value = self.random.uniform(0, 100)
         
         # Add random fluctuations (clouds, etc.)
-        return round(self.current_value + random.uniform(-50, 50), 2)
+        return round(self.current_value + self.random.uniform(-50, 50), 2)
 
 class NoiseSensor(Sensor):
     """Noise level sensor"""
@@ -135,8 +239,8 @@ class NoiseSensor(Sensor):
         base_noise = super().generate_data()
         
         # Occasional noise spikes (10% chance)
-        if random.random() < 0.1:
-            spike = random.uniform(10, 30)
+        if self.random.random() < 0.1:
+            spike = self.random.uniform(10, 30)
             return round(min(self.max_val, base_noise + spike), 2)
         
         return round(base_noise, 2)
@@ -150,7 +254,7 @@ class MotionSensor(Sensor):
     def generate_data(self):
         """Generate motion detection data"""
         # Simulate study sessions with breaks
-        hour = datetime.now().hour
+        hour = self.clock.now().hour
         
         # More likely to detect motion during study hours
         if 9 <= hour <= 22:
@@ -162,15 +266,115 @@ class MotionSensor(Sensor):
         if self.motion_duration > 0:
             self.motion_duration -= 1
             return 1
-        elif random.random() < motion_probability:
+        elif self.random.random() < motion_probability:
             # Start a new presence period
-            self.motion_duration = random.randint(10, 30)  # 20-60 seconds
+            self.motion_duration = self.random.randint(10, 30)  # 20-60 seconds
             return 1
         
         return 0
 
+class SensorRuntime:
+    """Runs many sensors over one MQTT connection and one scheduler thread
+    
+    Next fire times are kept in a heap, so the runtime needs two threads
+    (scheduler plus the MQTT network loop) and one socket regardless of how
+    many sensors it hosts. Sensors are rescheduled at a fixed rate from their
+    previous fire time, so publish times do not drift.
+    """
+    def __init__(self, client_id="sensor_runtime"):
+        self.mqtt_client = create_client(client_id)
+        self.heap = []  # (next fire time, sequence, sensor)
+        self.subscriptions = {}  # topic -> callback(client, userdata, msg)
+        self.counter = 0  # Tie-breaker for sensors firing at the same time
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        
+        # Counters
+        self.published = 0
+        self.max_lateness = 0.0
+    
+    def add(self, sensor, delay=0):
+        """Schedule a sensor on the shared connection"""
+        sensor.mqtt_client = self.mqtt_client
+        sensor.owns_client = False
+        sensor.running = True
+        with self.condition:
+            heapq.heappush(self.heap, (time.monotonic() + delay, self.counter, sensor))
+            self.counter += 1
+            self.condition.notify()
+    
+    def subscribe(self, topic, callback):
+        """Deliver messages on `topic` to callback(client, userdata, msg)"""
+        self.subscriptions[topic] = callback
+        self.mqtt_client.message_callback_add(topic, callback)
+        self.mqtt_client.subscribe(topic)  # No-op until connected; on_connect resubscribes
+    
+    def on_connect(self, client, userdata, flags, rc):
+        for topic in self.subscriptions:
+            client.subscribe(topic)
+    
+    def connect_mqtt(self):
+        """Connect the shared client to the MQTT broker"""
+        self.mqtt_client.on_connect = self.on_connect
+        try:
+            self.mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
+            self.mqtt_client.loop_start()
+            print("Sensor runtime connected to MQTT broker")
+        except Exception as e:
+            print(f"Failed to connect sensor runtime: {e}")
+    
+    def start(self):
+        """Connect and start the scheduler thread"""
+        self.running = True
+        self.connect_mqtt()
+        self.thread = threading.Thread(target=self.run_scheduler, name="sensor-scheduler")
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def run_scheduler(self):
+        """Fire each sensor when its next publish time comes due"""
+        while True:
+            with self.condition:
+                while self.running and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                    self.condition.wait(timeout)
+                if not self.running:
+                    return
+                fire_at, order, sensor = heapq.heappop(self.heap)
+            
+            now = time.monotonic()
+            self.max_lateness = max(self.max_lateness, now - fire_at)
+            if not sensor.running:
+                continue
+            try:
+                sensor.publish_data(sensor.generate_data())
+                self.published += 1
+            except Exception as e:
+                print(f"Error publishing {sensor.sensor_type}: {e}")
+            
+            interval = sensor.clock.real_seconds(sensor.interval)
+            next_fire = fire_at + interval
+            if next_fire < now:
+                next_fire = now + interval  # Fell behind; skip missed slots
+            with self.condition:
+                heapq.heappush(self.heap, (next_fire, order, sensor))
+    
+    def stop(self):
+        """Stop scheduling and close the shared connection"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
+        for _, _, sensor in self.heap:
+            sensor.running = False
+            sensor.publish_frame()  # Flush partial batches
+        self.mqtt_client.loop_stop()
+        self.mqtt_client.disconnect()
+
 def run_all_sensors():
-    """Run all sensors in separate threads"""
+    """Run all sensors on one shared connection and scheduler"""
     sensors = [
         TemperatureSensor(),
         HumiditySensor(),
@@ -179,16 +383,17 @@ def run_all_sensors():
         MotionSensor()
     ]
     
-    threads = []
-    
     print("Starting Smart Study Room Sensors...")
     
-    for sensor in sensors:
-        thread = threading.Thread(target=sensor.run)
-        thread.daemon = True
-        thread.start()
-        threads.append((thread, sensor))
-        time.sleep(0.5)  # Stagger sensor starts
+    runtime = SensorRuntime()
+    runtime.start()
+    if SENSOR_THERMAL_PLANT:
+        # The retained climate_control state drives the simulated room
+        plant = ThermalPlant(sensors[0].clock)
+        sensors[0].plant = plant
+        runtime.subscribe(CLIMATE_STATE_TOPIC, plant.on_message)
+    for index, sensor in enumerate(sensors):
+        runtime.add(sensor, delay=index * 0.5)  # Stagger sensor starts
     
     try:
         # Keep running until interrupted
@@ -196,10 +401,7 @@ def run_all_sensors():
             time.sleep(1)
     except KeyboardInterrupt:
         print("\nShutting down sensors...")
-        for _, sensor in threads:
-            sensor.stop()
-        for thread, _ in threads:
-            thread.join()
+        runtime.stop()
         print("All sensors stopped.")
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+# Simulation Configuration (environment variables shared by all components)
+#   SIM_SPEEDUP - simulated seconds per real second (default 1)
+#   SIM_SEED    - seed for device random number generators
+#   SIM_START   - simulated start time, ISO string or epoch seconds
+#   SIM_ANCHOR  - real epoch seconds at which SIM_START applies, so separate
+#                 processes agree on the simulated time
+
+class SimulationClock:
+    """Wall clock replacement with a speedup factor and seedable RNGs
+
+    Simulated time runs `speedup` times faster than real time from `start`.
+    With speedup=1 and no start it behaves like datetime.now()/time.sleep().
+    Latency measurements should keep using time.monotonic(); this clock is
+    for the simulated world (timestamps, time of day, sleeps between
+    readings).
+    """
+    def __init__(self, speedup=1.0, start=None, seed=None, anchor=None):
+        if speedup <= 0:
+            raise ValueError("speedup must be positive")
+        self.speedup = speedup
+        self.anchor = anchor if anchor is not None else time.time()
+        self.start = start if start is not None else self.anchor
+        self.seed = seed
+
+    def time(self):
+        """Simulated epoch seconds"""
+        return self.start + (time.time() - self.anchor) * self.speedup
+
+    def now(self):
+        """Simulated local datetime"""
+        return datetime.fromtimestamp(self.time())
+
+    def real_seconds(self, sim_seconds):
+        """Real seconds corresponding to a simulated duration"""
+        return sim_seconds / self.speedup
+
+    def sleep(self, sim_seconds):
+        """Sleep for a simulated duration"""
+        time.sleep(self.real_seconds(sim_seconds))
+
+    def rng_for(self, name):
+        """Random generator for one device, reproducible from the seed
+
+        Each device gets its own stream so results do not depend on how
+        threads interleave. Unseeded clocks return an unseeded generator.
+        """
+        if self.seed is None:
+            return random.Random()
+        return random.Random(f"{self.seed}:{name}")
+
+class VirtualClock(SimulationClock):
+    """Discrete-event clock where time only moves when sleep() is called
+
+    Useful for single-threaded scenario runs: a week of readings can be
+    generated as fast as the CPU allows and is fully deterministic.
+    """
+    def __init__(self, start=None, seed=None):
+        super().__init__(1.0, start, seed)
+        self.current = self.start
+        self.lock = threading.Lock()
+
+    def time(self):
+        return self.current
+
+    def real_seconds(self, sim_seconds):
+        return 0.0
+
+    def sleep(self, sim_seconds):
+        self.advance(sim_seconds)
+
+    def advance(self, sim_seconds):
+        with self.lock:
+            self.current += max(0.0, sim_seconds)
+
+def parse_start(value):
+    """Parse SIM_START as epoch seconds or an ISO timestamp"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def clock_from_env(environ=None):
+    """Build the process clock from SIM_* environment variables"""
+    environ = os.environ if environ is None else environ
+    speedup = float(environ.get('SIM_SPEEDUP', 1))
+    seed = environ.get('SIM_SEED')
+    start = environ.get('SIM_START')
+    anchor = environ.get('SIM_ANCHOR')
+    return SimulationClock(
+        speedup=speedup,
+        start=parse_start(start) if start else None,
+        seed=seed,
+        anchor=float(anchor) if anchor else None
+    )
+
+def simulation_env(speedup=1.0, seed=None, start=None):
+    """SIM_* variables for child processes sharing one simulated timeline"""
+    env = {'SIM_SPEEDUP': str(speedup), 'SIM_ANCHOR': repr(time.time())}
+    if seed is not None:
+        env['SIM_SEED'] = str(seed)
+    if start is not None:
+        env['SIM_START'] = str(start)
+    return env
+
+_clock = clock_from_env()
+
+def get_clock():
+    """Return the process-wide simulation clock"""
+    return _clock
+
+def set_clock(clock):
+    """Replace the process-wide simulation clock"""
+    global _clock
+    _clock = clock
@@ -4,12 +4,14 @@ Smart Study Room IoT System
 Main startup script for the complete IoT application
 """
 
+import argparse
 import subprocess
 import sys
 import time
 import os
 import signal
 from datetime import datetime
+from simclock import simulation_env
 
 class SmartStudyRoomStarter:
     def __init__(self):
@@ -185,6 +187,16 @@ class SmartStudyRoomStarter:
 
 def main():
     """Entry point"""
+    parser = argparse.ArgumentParser(description="Start the Smart Study Room IoT system")
+    parser.add_argument('--speedup', type=float, default=1.0,
+                        help="Simulated seconds per real second (e.g. 1000)")
+    parser.add_argument('--seed', default=None, help="Seed for reproducible sensor data")
+    parser.add_argument('--start', default=None, help="Simulated start time (ISO or epoch seconds)")
+    args = parser.parse_args()
+    
+    # Child processes read the shared simulated timeline from SIM_* variables
+    os.environ.update(simulation_env(args.speedup, args.seed, args.start))
+    
     starter = SmartStudyRoomStarter()
     
     # Handle Ctrl+C gracefully
@@ -0,0 +1,232 @@
+import sqlite3
+import threading
+from datetime import datetime
+from simclock import get_clock
+
+# Storage Configuration
+DEFAULT_DB_PATH = "sensor_history.db"
+COMMIT_INTERVAL = 0.5  # Seconds between group commits
+COMMIT_BATCH_ROWS = 500  # Commit early once this many rows are buffered
+
+class TimeSeriesStore:
+    """Base class for append-only sensor history backends
+
+    Rows are (sensor, timestamp, device_id, value) with timestamp in epoch
+    seconds. Backends buffer appends and commit them in groups.
+    """
+    def append(self, sensor, timestamp, device_id, value):
+        """Buffer one reading for the next group commit"""
+        raise NotImplementedError
+
+    def query(self, sensor, start=None, end=None, device_id=None, limit=None):
+        """Return [(timestamp, value, device_id), ...] in time order"""
+        raise NotImplementedError
+
+    def latest(self, sensor, limit):
+        """Return the most recent `limit` readings in time order"""
+        raise NotImplementedError
+
+    def sensors(self):
+        """Return the sensor types present in the store"""
+        raise NotImplementedError
+
+    def aggregate(self, sensor, resolution, start=None):
+        """Return [start, count, min, max, sum, sumsq, first, last] buckets"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Commit buffered rows immediately"""
+        pass
+
+    def close(self):
+        """Flush and release resources"""
+        pass
+
+class SQLiteStore(TimeSeriesStore):
+    """SQLite time-series store in WAL mode with group commit
+
+    A single writer thread commits buffered rows every `commit_interval`
+    seconds or as soon as `batch_rows` are pending, so each reading costs one
+    row plus one index entry and a shared fsync rather than a transaction.
+    """
+    def __init__(self, path=DEFAULT_DB_PATH, commit_interval=COMMIT_INTERVAL,
+                 batch_rows=COMMIT_BATCH_ROWS):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.batch_rows = batch_rows
+        self.buffer = []
+        self.condition = threading.Condition()
+        self.running = True
+
+        # Counters
+        self.rows_written = 0
+        self.commits = 0
+
+        self.write_conn = self._connect()
+        self.write_conn.executescript("""
+            CREATE TABLE IF NOT EXISTS readings (
+                sensor TEXT NOT NULL,
+                ts REAL NOT NULL,
+                device_id TEXT,
+                value REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_readings_sensor_ts ON readings (sensor, ts);
+        """)
+        self.write_lock = threading.Lock()
+        self.read_conn = self._connect()
+        self.read_lock = threading.Lock()
+
+        self.writer = threading.Thread(target=self._writer, name="history-writer")
+        self.writer.daemon = True
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def append(self, sensor, timestamp, device_id, value):
+        with self.condition:
+            self.buffer.append((sensor, timestamp, device_id, value))
+            if len(self.buffer) >= self.batch_rows:
+                self.condition.notify()
+
+    def extend(self, rows):
+        """Buffer many (sensor, timestamp, device_id, value) rows at once"""
+        with self.condition:
+            self.buffer.extend(rows)
+            if len(self.buffer) >= self.batch_rows:
+                self.condition.notify()
+
+    def _writer(self):
+        while True:
+            with self.condition:
+                if self.running and len(self.buffer) < self.batch_rows:
+                    self.condition.wait(self.commit_interval)
+                running = self.running
+            self.flush()
+            if not running:
+                break
+
+    def flush(self):
+        with self.condition:
+            rows, self.buffer = self.buffer, []
+        if not rows:
+            return
+        with self.write_lock:
+            try:
+                with self.write_conn:
+                    self.write_conn.executemany(
+                        "INSERT INTO readings (sensor, ts, device_id, value) VALUES (?, ?, ?, ?)",
+                        rows)
+                self.rows_written += len(rows)
+                self.commits += 1
+            except sqlite3.Error as e:
+                print(f"Failed to write sensor history: {e}")
+
+    def _pending(self, sensor, start, end, device_id):
+        """Buffered rows not yet committed that match a query"""
+        with self.condition:
+            return [
+                (ts, value, dev) for s, ts, dev, value in self.buffer
+                if s == sensor
+                and (start is None or ts >= start)
+                and (end is None or ts <= end)
+                and (device_id is None or dev == device_id)
+            ]
+
+    def query(self, sensor, start=None, end=None, device_id=None, limit=None):
+        sql = "SELECT ts, value, device_id FROM readings WHERE sensor = ?"
+        params = [sensor]
+        if start is not None:
+            sql += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND ts <= ?"
+            params.append(end)
+        if device_id is not None:
+            sql += " AND device_id = ?"
+            params.append(device_id)
+        sql += " ORDER BY ts"
+
+        with self.read_lock:
+            rows = self.read_conn.execute(sql, params).fetchall()
+        rows.extend(self._pending(sensor, start, end, device_id))
+        if limit is not None:
+            rows = rows[:limit]
+        return rows
+
+    def latest(self, sensor, limit):
+        with self.read_lock:
+            rows = self.read_conn.execute(
+                "SELECT ts, value, device_id FROM readings WHERE sensor = ? "
+                "ORDER BY ts DESC LIMIT ?", (sensor, limit)).fetchall()
+        rows.reverse()
+        rows.extend(self._pending(sensor, None, None, None))
+        return rows[-limit:]
+
+    def sensors(self):
+        with self.read_lock:
+            rows = self.read_conn.execute("SELECT DISTINCT sensor FROM readings").fetchall()
+        return [row[0] for row in rows]
+
+    def aggregate(self, sensor, resolution, start=None):
+        self.flush()
+        bucket = "CAST(ts / ? AS INTEGER) * ?"
+        where = "sensor = ? AND value IS NOT NULL AND ts >= ?"
+        params = (resolution, resolution, sensor, start if start is not None else 0)
+
+        with self.read_lock:
+            totals = self.read_conn.execute(
+                f"SELECT {bucket} AS b, COUNT(value), MIN(value), MAX(value), SUM(value), "
+                f"SUM(value * value) FROM readings WHERE {where} GROUP BY b ORDER BY b",
+                params).fetchall()
+            # SQLite takes bare columns from the row that satisfied MIN()/MAX()
+            firsts = {b: value for b, value, _ in self.read_conn.execute(
+                f"SELECT {bucket} AS b, value, MIN(ts) FROM readings WHERE {where} GROUP BY b",
+                params)}
+            lasts = {b: value for b, value, _ in self.read_conn.execute(
+                f"SELECT {bucket} AS b, value, MAX(ts) FROM readings WHERE {where} GROUP BY b",
+                params)}
+        return [list(row) + [firsts[row[0]], lasts[row[0]]] for row in totals]
+
+    def get_stats(self):
+        """Return write counters"""
+        with self.condition:
+            pending = len(self.buffer)
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'pending': pending,
+            'rows_written': self.rows_written,
+            'commits': self.commits
+        }
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.writer.join(self.commit_interval * 4 + 1)
+        self.flush()
+        self.write_conn.close()
+        self.read_conn.close()
+
+def create_store(backend, path=DEFAULT_DB_PATH):
+    """Create a history store by backend name ('sqlite' or None)"""
+    if not backend:
+        return None
+    if backend == "sqlite":
+        return SQLiteStore(path)
+    raise ValueError(f"Unknown history backend: {backend}")
+
+def to_epoch(timestamp):
+    """Convert an ISO timestamp string (or epoch number) to epoch seconds"""
+    if timestamp is None:
+        return get_clock().time()
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except ValueError:
+        return get_clock().time()
@@ -0,0 +1,63 @@
+import json
+from types import SimpleNamespace
+from actuator import ActuatorDispatcher, ClimateControl, FocusMode, SmartLight
+from climate import make_controller
+from simclock import VirtualClock
+
+def reading(sensor_type, value):
+    topic = f"smartroom/sensors/{sensor_type}"
+    payload = json.dumps({"sensor_id": f"{sensor_type}_1", "type": sensor_type, "value": value}).encode()
+    return topic, payload
+
+def test_only_relevant_sensors_wake_an_actuator():
+    light = SmartLight()
+    topic, payload = reading("noise", 40)
+    light.on_message(None, None, SimpleNamespace(topic=topic, payload=payload))
+    assert not light.update_event.is_set()
+    assert light.sensor_data["noise"]["value"] == 40
+
+    topic, payload = reading("motion", 1)
+    light.on_message(None, None, SimpleNamespace(topic=topic, payload=payload))
+    assert light.update_event.is_set()
+
+def test_settings_command_wakes_actuator():
+    climate = ClimateControl()
+    command = {"actuator_id": climate.actuator_id, "target_temp": 21.5}
+    climate.on_message(None, None, SimpleNamespace(topic="smartroom/commands/climate_control",
+                                                   payload=json.dumps(command).encode()))
+    assert climate.target_temp == 21.5
+    assert climate.update_event.is_set()
+
+def test_dispatcher_routes_readings_to_interested_actuators():
+    dispatcher = ActuatorDispatcher()
+    light, climate, focus = SmartLight(), ClimateControl(), FocusMode()
+    for actuator in (light, climate, focus):
+        dispatcher.add(actuator)
+
+    assert dispatcher.dispatch(*reading("temperature", 22.0)) == [climate]
+    assert dispatcher.dispatch(*reading("motion", 1)) == [light, focus]
+    assert dispatcher.dispatch(*reading("pressure", 1000)) == ()
+    assert dispatcher.decoded == 3
+    assert dispatcher.delivered == 3
+    assert light.sensor_data["motion"] is focus.sensor_data["motion"]
+
+def test_climate_mode_limits_the_controller():
+    climate = ClimateControl()
+    climate.clock = VirtualClock(start=0)
+    climate.controller = make_controller('pid', climate.target_temp)
+    climate.mode = "COOL"
+    for _ in range(360):
+        climate.control(18)
+        assert climate.output == 0.0
+        climate.clock.advance(10)
+    assert climate.state == "IDLE"
+    # The cold spell under COOL left no integral behind to overshoot with
+    assert climate.controller.integral == 0.0
+
+    climate.mode = "HEAT"
+    climate.control(18)
+    assert climate.state == "HEATING"
+
+    climate.mode = "OFF"
+    climate.control(30)
+    assert (climate.state, climate.output) == ("OFF", 0.0)
@@ -0,0 +1,92 @@
+import numpy as np
+from analytics import lttb, minmax_decimate, WindowStats
+
+def test_lttb_keeps_endpoints_and_threshold():
+    times = np.arange(1000, dtype=float)
+    values = np.sin(times / 50)
+    out_t, out_v = lttb(times, values, 100)
+    assert len(out_t) == len(out_v) == 100
+    assert out_t[0] == 0 and out_t[-1] == 999
+    assert np.all(np.diff(out_t) > 0)
+
+def test_lttb_keeps_spike():
+    times = np.arange(500, dtype=float)
+    values = np.zeros(500)
+    values[237] = 50.0
+    out_t, out_v = lttb(times, values, 20)
+    assert 237.0 in out_t
+    assert out_v.max() == 50.0
+
+def test_lttb_short_series_unchanged():
+    out_t, out_v = lttb([1, 2, 3], [4, 5, 6], 10)
+    assert list(out_t) == [1, 2, 3]
+    assert list(out_v) == [4, 5, 6]
+
+def test_minmax_decimate_keeps_extremes():
+    times = np.arange(1000, dtype=float)
+    mins = np.full(1000, 20.0)
+    maxs = np.full(1000, 21.0)
+    mins[400] = 5.0
+    maxs[812] = 40.0
+    out_t, out_v = minmax_decimate(times, mins, maxs, 50)
+    assert len(out_t) <= 50
+    assert out_v.min() == 5.0 and out_v.max() == 40.0
+    assert np.all(np.diff(out_t) >= 0)
+
+def test_minmax_decimate_few_buckets_returns_midpoints():
+    out_t, out_v = minmax_decimate([0, 1], [1, 3], [3, 5], 10)
+    assert list(out_t) == [0, 1]
+    assert list(out_v) == [2, 4]
+
+def window_points(stats, times, values):
+    """Readings inside the buckets WindowStats still holds"""
+    newest = int(times[-1] // stats.width)
+    inside = (times // stats.width).astype(int) > newest - stats.slots
+    return times[inside], values[inside]
+
+def test_window_stats_matches_numpy():
+    rng = np.random.default_rng(7)
+    times = np.sort(rng.uniform(0, 3600, 5000))
+    values = 20 + times * 0.001 + rng.normal(0, 0.3, len(times))
+    stats = WindowStats(600)
+    for t, v in zip(times, values):
+        stats.add(t, v)
+    kept_t, kept_v = window_points(stats, times, values)
+    assert stats.count == len(kept_v)
+    assert abs(stats.mean - kept_v.mean()) < 1e-9
+    assert abs(stats.std_dev() - kept_v.std(ddof=1)) < 1e-9
+    assert abs(stats.slope() - np.polyfit(kept_t, kept_v, 1)[0]) < 1e-9
+
+def test_window_stats_expires_old_readings():
+    stats = WindowStats(60, buckets=6)
+    for t in range(60):
+        stats.add(t, 100.0)
+    for t in range(120, 130):
+        stats.add(t, 1.0)
+    assert stats.count == 10
+    assert stats.mean == 1.0
+    assert len(stats.buckets) <= 6
+
+def test_window_stats_memory_is_bounded():
+    stats = WindowStats(60, buckets=10)
+    for i in range(100000):
+        stats.add(i * 0.01, 20.0)
+    assert len(stats.buckets) <= 10
+    assert stats.count <= 6000
+
+def test_window_stats_drops_readings_older_than_window():
+    stats = WindowStats(60, buckets=6)
+    stats.add(1000, 5.0)
+    stats.add(10, 50.0)
+    stats.add(995, 7.0)
+    assert stats.count == 2
+    assert stats.mean == 6.0
+
+def test_window_stats_trend():
+    rising, flat = WindowStats(600), WindowStats(600)
+    for t in range(0, 600, 5):
+        rising.add(t, 20 + t * 0.01)
+        flat.add(t, 20.0)
+    assert rising.trend() == "increasing"
+    assert abs(rising.slope() - 0.01) < 1e-9
+    assert flat.trend() == "stable"
@@ -0,0 +1,78 @@
+import pytest
+from climate import (HysteresisController, PIDController, hvac_state, make_controller, simulate,
+                     state_output)
+
+def test_pid_output_sign_and_clamp():
+    pid = PIDController(22, gains=(1.0, 0.0, 0.0), filter_time=0)
+    assert pid.update(21.5, 0) == pytest.approx(0.5)
+    assert pid.update(22.3, 1) == pytest.approx(-0.3)
+    assert pid.update(10, 2) == 1.0
+    assert pid.update(40, 3) == -1.0
+
+def test_pid_anti_windup():
+    pid = PIDController(22, gains=(1.0, 0.01, 0.0), filter_time=0)
+    for now in range(0, 1000, 10):
+        assert pid.update(17, now) == 1.0
+    assert pid.integral == 0.0
+    # Without anti-windup the integral would hold the heating on past the setpoint
+    assert pid.update(22.5, 1000) < 0
+
+def test_pid_integral_removes_steady_error():
+    pid = PIDController(22, gains=(0.5, 0.01, 0.0), filter_time=0)
+    outputs = [pid.update(21.8, now) for now in range(0, 100, 10)]
+    assert outputs == sorted(outputs)
+    assert outputs[-1] > outputs[0]
+
+def test_hysteresis_band():
+    controller = HysteresisController(22, band=0.5, min_cycle=0)
+    assert controller.update(21.6, 0) == 0.0
+    assert controller.update(21.4, 10) == 1.0
+    assert controller.update(21.9, 20) == 1.0
+    assert controller.update(22.0, 30) == 0.0
+    assert controller.update(22.4, 40) == 0.0
+    assert controller.update(22.6, 50) == -1.0
+    assert controller.update(22.1, 60) == -1.0
+    assert controller.update(22.0, 70) == 0.0
+
+def test_hysteresis_min_cycle():
+    controller = HysteresisController(22, band=0.5, min_cycle=300)
+    assert controller.update(21, 0) == 1.0
+    assert controller.update(23, 100) == 1.0
+    assert controller.update(23, 299) == 1.0
+    assert controller.update(23, 300) == 0.0
+    assert controller.update(23, 400) == 0.0
+    assert controller.update(23, 600) == -1.0
+
+def test_hvac_state_round_trip():
+    for state in ("HEATING", "COOLING", "IDLE"):
+        assert hvac_state(state_output(state)) == state
+    assert hvac_state(0.01) == "IDLE"
+
+def test_make_controller():
+    assert make_controller(None, 22) is None
+    assert isinstance(make_controller('pid', 22), PIDController)
+    with pytest.raises(ValueError):
+        make_controller('bang-bang', 22)
+
+def test_closed_loop_beats_threshold():
+    threshold = simulate('threshold', hours=6, interval=10)
+    for name in ('pid', 'hysteresis'):
+        results = simulate(name, hours=6, interval=10)
+        assert results == simulate(name, hours=6, interval=10)
+        assert results['mean_abs_error'] < threshold['mean_abs_error']
+        assert results['switches_per_hour'] < threshold['switches_per_hour']
+
+def test_pid_limits_stop_windup():
+    pid = PIDController(22, gains=(0.5, 0.01, 0.0), limits=(-1.0, 0.0), filter_time=0)
+    for now in range(0, 3600, 10):
+        assert pid.update(18, now) == 0.0
+    assert pid.integral == 0.0
+    pid.low, pid.high = -1.0, 1.0
+    assert pid.update(22.5, 3600) < 0
+
+def test_hysteresis_limits_end_held_state():
+    controller = HysteresisController(22, band=0.5, min_cycle=300)
+    assert controller.update(21, 0) == 1.0
+    controller.low, controller.high = -1.0, 0.0
+    assert controller.update(21, 10) == 0.0
+    assert controller.update(20, 400) == 0.0
@@ -0,0 +1,64 @@
+import json
+import pytest
+from codec import (COMPACT_READING, DeviceRegistry, decode_frame, decode_payload, decode_reading,
+                   device_descriptor, encode_frame, encode_reading, frame_topic, sensor_topic)
+
+PREFIX = "smartroom/sensors"
+
+def registry_with(sensor_id, sensor_type, room=None):
+    registry = DeviceRegistry()
+    registry.handle_descriptor(device_descriptor(sensor_id, sensor_type, room).encode())
+    return registry
+
+def test_reading_round_trip():
+    registry = registry_with("temp_1", "temperature", room="lab")
+    payload = encode_reading("temp_1", 21.37, 1700000000.25, 42, 123.5)
+    assert len(payload) == COMPACT_READING.size
+    data = decode_reading("temperature", payload, registry)
+    assert data["sensor_id"] == "temp_1"
+    assert data["room"] == "lab"
+    assert data["value"] == 21.37
+    assert data["unit"] == "°C"
+    assert data["seq"] == 42
+    assert data["publish_ts"] == 123.5
+
+def test_reading_from_unknown_device():
+    data = decode_reading("humidity", encode_reading("hum_9", 55.0, 0, 1, 0.0), DeviceRegistry())
+    assert data["sensor_id"].startswith("dev_")
+    assert "room" not in data
+
+def test_frame_round_trip():
+    registry = registry_with("light_1", "light")
+    values = [100.0, 101.5, 103.25, 99.75]
+    payload = encode_frame("light_1", values, 1700000000.0, 0.5, 7, 1.0)
+    data = decode_frame("light", payload, registry)
+    assert data["values"] == values
+    assert data["value"] == values[-1]
+    assert data["start"] == 1700000000.0
+    assert data["period"] == 0.5
+    assert data["sensor_id"] == "light_1"
+
+def test_decode_payload_picks_format_by_topic():
+    registry = registry_with("noise_1", "noise")
+    compact = decode_payload(sensor_topic(PREFIX, "noise", compact=True),
+                             encode_reading("noise_1", 40.0, 0, 1, 0.0), registry)
+    frame = decode_payload(frame_topic(PREFIX, "noise"),
+                           encode_frame("noise_1", [41.0, 42.0], 0, 1, 2, 0.0), registry)
+    plain = decode_payload(sensor_topic(PREFIX, "noise"), json.dumps({"value": 43.0}).encode())
+    assert (compact["value"], frame["value"], plain["value"]) == (40.0, 42.0, 43.0)
+    assert compact["type"] == frame["type"] == "noise"
+
+@pytest.mark.parametrize("topic, payload", [
+    (sensor_topic(PREFIX, "temperature", compact=True), b"\x01\x02"),
+    (sensor_topic(PREFIX, "temperature", compact=True), b"\x09" + b"\x00" * (COMPACT_READING.size - 1)),
+    (frame_topic(PREFIX, "temperature"), b"\x01" * 10),
+    (frame_topic(PREFIX, "temperature"), encode_frame("temp_1", [1.0, 2.0], 0, 1, 0, 0.0)[:-4]),
+    (sensor_topic(PREFIX, "temperature"), b"{not json"),
+])
+def test_bad_payloads_raise_value_error(topic, payload):
+    with pytest.raises(ValueError):
+        decode_payload(topic, payload, DeviceRegistry())
+
+def test_frame_rejects_too_many_samples():
+    with pytest.raises(ValueError):
+        encode_frame("temp_1", [0.0] * 0x10000, 0, 1, 0, 0.0)
@@ -0,0 +1,83 @@
+import pytest
+from commands import COMMAND_EXPIRED_MEMORY, CommandTracker
+
+def tracker():
+    results = []
+    return CommandTracker(timeout=5.0, on_result=results.append), results
+
+def test_ack_completes_command_with_rtt():
+    commands, results = tracker()
+    command_id = commands.track('smart_light', {'actuator_id': 'light_01', 'state': 'ON'}, sent=100.0)
+    result = commands.ack({'command_id': command_id, 'actuator_id': 'light_01', 'applied': ['state'],
+                           'state': {'state': 'ON'}}, recv_time=100.025)
+    assert result['status'] == 'applied'
+    assert result['rtt_ms'] == pytest.approx(25.0)
+    assert result['applied'] == ['state']
+    assert results == [result]
+    stats = commands.get_stats()
+    assert (stats['sent'], stats['acked'], stats['pending']) == (1, 1, 0)
+    assert stats['latency']['count'] == 1
+    assert stats['latency_by_actuator']['smart_light']['p50'] == pytest.approx(25.0, rel=0.05)
+
+def test_keeps_existing_command_id():
+    commands, _ = tracker()
+    assert commands.track('smart_light', {'command_id': 'abc'}, sent=0) == 'abc'
+
+def test_rejected_ack():
+    commands, _ = tracker()
+    command_id = commands.track('climate_control', {'actuator_id': 'climate_01', 'mode': 'DRY'}, sent=0)
+    result = commands.ack({'command_id': command_id, 'status': 'rejected', 'ignored': ['mode']}, recv_time=0.01)
+    assert result['status'] == 'rejected'
+    assert result['ignored'] == ['mode']
+    assert commands.get_stats()['rejected'] == 1
+    assert commands.get_stats()['acked'] == 0
+
+def test_reject_without_sending():
+    commands, results = tracker()
+    result = commands.reject('smart_light', {'state': 'ON'}, "Command needs an actuator_id")
+    assert result['status'] == 'rejected'
+    assert result['error'] == "Command needs an actuator_id"
+    assert results == [result]
+    stats = commands.get_stats()
+    assert (stats['sent'], stats['rejected'], stats['pending']) == (1, 1, 0)
+
+def test_expire_times_out_overdue_commands():
+    commands, results = tracker()
+    old = commands.track('smart_light', {'actuator_id': 'light_01'}, sent=0)
+    fresh = commands.track('smart_light', {'actuator_id': 'light_01'}, sent=3)
+    assert commands.expire(now=4.9) == []
+    expired = commands.expire(now=5.0)
+    assert [result['command_id'] for result in expired] == [old]
+    assert expired[0]['status'] == 'timeout'
+    assert results == expired
+    assert [result['command_id'] for result in commands.expire(now=8.0)] == [fresh]
+    stats = commands.get_stats()
+    assert (stats['timed_out'], stats['pending']) == (2, 0)
+
+def test_late_and_unmatched_acks():
+    commands, results = tracker()
+    command_id = commands.track('focus_mode', {'actuator_id': 'focus_01'}, sent=0)
+    commands.expire(now=10)
+    assert commands.ack({'command_id': command_id}, recv_time=11) is None
+    assert commands.ack({'command_id': 'unknown'}, recv_time=11) is None
+    assert commands.ack({}, recv_time=11) is None
+    stats = commands.get_stats()
+    assert (stats['late'], stats['unmatched'], stats['acked']) == (1, 2, 0)
+    assert stats['latency'] == {'count': 0}
+    assert len(results) == 1
+
+def test_expired_memory_is_bounded():
+    commands, _ = tracker()
+    for index in range(COMMAND_EXPIRED_MEMORY + 10):
+        commands.track('smart_light', {'command_id': str(index)}, sent=0)
+    commands.expire(now=10)
+    assert len(commands.expired) == COMMAND_EXPIRED_MEMORY
+    assert commands.ack({'command_id': '0'}, recv_time=11) is None
+    assert commands.get_stats()['unmatched'] == 1
+
+def test_failing_callback_does_not_break_tracking():
+    def broken(result):
+        raise RuntimeError("dashboard gone")
+    commands = CommandTracker(on_result=broken)
+    command_id = commands.track('smart_light', {}, sent=0)
+    assert commands.ack({'command_id': command_id}, recv_time=0.1)['status'] == 'applied'
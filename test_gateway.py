@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+import numpy as np
+import pytest
+from gateway import IngestPipeline, IoTGateway, SensorHistory
+
+def reading(sensor_type, value, **fields):
+    data = {"sensor_id": f"{sensor_type}_1", "type": sensor_type, "value": value,
+            "timestamp": "2024-01-15T10:00:00"}
+    data.update(fields)
+    return f"smartroom/sensors/{sensor_type}", json.dumps(data).encode()
+
+def lock_is_free(lock):
+    """Whether another thread could take `lock` right now"""
+    free = []
+    def probe():
+        if lock.acquire(timeout=0.1):
+            lock.release()
+            free.append(True)
+    thread = threading.Thread(target=probe)
+    thread.start()
+    thread.join()
+    return bool(free)
+
+def test_alerts_are_emitted_outside_the_gateway_lock():
+    gateway = IoTGateway()
+    emitted = []
+    gateway.emit_event = lambda event, payload: emitted.append((event, payload, lock_is_free(gateway.lock)))
+    gateway.handle_message(*reading("noise", 85), time.monotonic())
+    gateway.handle_message(*reading("noise", 40), time.monotonic())
+    assert [(event, free) for event, _, free in emitted] == [("alert", True)]
+    assert emitted[0][1]["message"] == "WARNING: Very high noise level detected!"
+    assert len(gateway.notifications) == 1
+    assert not gateway.pending_alerts
+
+def frame(sensor_type, values):
+    data = {"sensor_id": f"{sensor_type}_1", "type": sensor_type, "value": values[-1], "values": values,
+            "start": 1705312800.0, "period": 1.0, "timestamp": "2024-01-15T10:00:09"}
+    return f"smartroom/sensors/{sensor_type}", json.dumps(data).encode()
+
+def test_frame_alerts_on_spike_before_newest_sample():
+    gateway = IoTGateway()
+    emitted = []
+    gateway.emit_event = lambda event, payload: emitted.append(payload['message'])
+    gateway.handle_message(*frame("noise", [40.0, 85.0, 42.0]), time.monotonic())
+    gateway.handle_message(*frame("temperature", [22.0, 14.5, 22.1]), time.monotonic())
+    gateway.handle_message(*frame("light", [300.0, 310.0]), time.monotonic())
+    assert emitted == ["WARNING: Very high noise level detected!", "CRITICAL: Temperature out of safe range!"]
+    assert len(gateway.data_history["noise"]) == 3
+
+def filled_pipeline(policy, submitted=5, max_size=3):
+    """A single-worker pipeline offered `submitted` messages before it starts"""
+    handled = []
+    pipeline = IngestPipeline(lambda topic, payload, recv_time: handled.append(payload),
+                              num_workers=1, max_size=max_size, overflow_policy=policy)
+    accepted = [pipeline.submit("smartroom/sensors/noise", index, 0.0) for index in range(submitted)]
+    return pipeline, handled, accepted
+
+def drain(pipeline):
+    pipeline.start()
+    pipeline.stop()
+    return pipeline.get_stats()
+
+def test_drop_oldest_keeps_newest_messages():
+    pipeline, handled, accepted = filled_pipeline("drop_oldest")
+    assert accepted == [True] * 5
+    stats = drain(pipeline)
+    assert handled == [2, 3, 4]
+    assert (stats['enqueued'], stats['dropped'], stats['processed'], stats['max_depth']) == (5, 2, 3, 3)
+
+def test_drop_newest_rejects_incoming_messages():
+    pipeline, handled, accepted = filled_pipeline("drop_newest")
+    assert accepted == [True, True, True, False, False]
+    stats = drain(pipeline)
+    assert handled == [0, 1, 2]
+    assert (stats['enqueued'], stats['dropped'], stats['processed']) == (3, 2, 3)
+
+def test_block_waits_for_a_free_slot():
+    pipeline, handled, accepted = filled_pipeline("block", submitted=2, max_size=2)
+    blocked = threading.Thread(target=pipeline.submit, args=("smartroom/sensors/noise", 2, 0.0))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+    pipeline.start()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    pipeline.stop()
+    assert handled == [0, 1, 2]
+    assert pipeline.get_stats()['dropped'] == 0
+
+def test_handler_errors_are_counted():
+    def handler(topic, payload, recv_time):
+        if payload == 1:
+            raise RuntimeError("bad message")
+    pipeline = IngestPipeline(handler, num_workers=2, max_size=10)
+    for index in range(3):
+        pipeline.submit(f"smartroom/sensors/{index}", index, 0.0)
+    stats = drain(pipeline)
+    assert (stats['processed'], stats['errors'], stats['dropped']) == (3, 1, 0)
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        IngestPipeline(print, overflow_policy="drop_all")
+
+def test_history_append_wraps_around():
+    history = SensorHistory(4)
+    assert history.latest() is None
+    for index in range(10):
+        history.append(index * 1000, float(index))
+    times, values = history.last()
+    assert len(history) == 4
+    assert times.tolist() == [6000, 7000, 8000, 9000]
+    assert values.tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert history.latest() == (9000, 9.0)
+    assert history.last(2)[1].tolist() == [8.0, 9.0]
+
+def test_history_extend_wraps_and_matches_append():
+    appended, extended = SensorHistory(5), SensorHistory(5)
+    for chunk in (range(0, 3), range(3, 7), range(7, 20)):
+        for index in chunk:
+            appended.append(index, float(index))
+        extended.extend(list(chunk), [float(index) for index in chunk])
+        assert extended.last()[0].tolist() == appended.last()[0].tolist()
+        assert extended.last()[1].tolist() == appended.last()[1].tolist()
+    assert extended.last()[1].tolist() == [15.0, 16.0, 17.0, 18.0, 19.0]
+    assert extended.latest() == appended.latest()
+
+def test_history_window_is_contiguous_view_after_wrap():
+    history = SensorHistory(8)
+    history.extend(np.arange(13) * 10, np.arange(13, dtype=float))
+    times, values = history.window(70, 110)
+    assert times.tolist() == [70, 80, 90, 100, 110]
+    assert values.tolist() == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert values.base is history.values
+    assert not values.flags.writeable
+    assert history.window(start_ns=115)[1].tolist() == [12.0]
+    assert history.window(end_ns=40)[1].size == 0
+
+def test_history_none_is_nan():
+    history = SensorHistory(3)
+    history.append(1, None)
+    history.append(2, 5.0)
+    assert np.isnan(history.last()[1][0])
+    assert [point['value'] for point in history.to_list()] == [None, 5.0]
@@ -0,0 +1,38 @@
+from notifications import NotificationFilter, TokenBucket, fingerprint
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(rate=0.1, capacity=3, now=0)
+    assert [bucket.take(0) for _ in range(4)] == [True, True, True, False]
+    assert not bucket.take(5)
+    assert bucket.take(10)
+    assert not bucket.take(10)
+
+def test_token_bucket_caps_at_capacity():
+    bucket = TokenBucket(rate=1, capacity=2, now=0)
+    assert [bucket.take(1000) for _ in range(3)] == [True, True, False]
+
+def test_fingerprint_masks_numbers():
+    assert fingerprint("Temp 24.5 in room 3") == fingerprint("Temp -19 in room 12")
+    assert fingerprint("Temp high") != fingerprint("Temp low")
+
+def make_filter():
+    return NotificationFilter(dedup_window=60, rate=1 / 300, burst=2, aggregate_window=300)
+
+def test_duplicates_within_window_are_dropped():
+    notify = make_filter()
+    assert notify.admit("Temperature 25.1", now=0)
+    assert not notify.admit("Temperature 25.3", now=30)
+    assert notify.admit("Temperature 25.4", now=61)
+    assert notify.admit("Humidity 80", now=62)
+
+def test_rate_limit_and_summary():
+    notify = make_filter()
+    sent = [notify.admit(f"Noise {i}", now=i * 61) for i in range(5)]
+    assert sent == [True, True, False, False, False]
+    assert notify.due_summaries(now=200) == []
+
+    summaries = notify.due_summaries(now=122 + 300)
+    assert summaries == [("Noise 4 (×3 in last 5 min)", 3)]
+    assert notify.due_summaries(now=1000) == []
+    assert notify.get_stats() == {'admitted': 2, 'suppressed': 3, 'summaries': 1,
+                                  'pending': 0, 'fingerprints': 1}
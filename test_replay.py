@@ -0,0 +1,44 @@
+import struct
+from replay import LOG_HEADER, TrafficRecorder, TrafficReplayer, read_log
+
+def record(path, messages):
+    recorder = TrafficRecorder(str(path))
+    recorder.open()
+    for topic, payload, offset in messages:
+        recorder.record(topic, payload, recorder.started + offset)
+    recorder.file.close()
+    return recorder
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "traffic.log"
+    messages = [("smartroom/sensors/noise", b'{"value": 40}', 0.0),
+                ("smartroom/sensors/light", b"\x00\x01binary", 0.5),
+                ("smartroom/sensors/noise", b"", 1.25)]
+    record(path, messages)
+    assert [(topic, payload, offset) for offset, topic, payload in read_log(path)] == messages
+
+    received = []
+    replayer = TrafficReplayer(str(path), speed=0, loops=2)
+    assert replayer.replay(lambda topic, payload: received.append(topic))[0] == 6
+    assert received == [topic for topic, _, _ in messages] * 2
+
+def test_more_topics_than_16_bit_ids(tmp_path):
+    path = tmp_path / "fleet.log"
+    topics = [f"smartroom/devices/{index:08x}" for index in range(70000)]
+    recorder = record(path, [(topic, b"{}", 0.0) for topic in topics])
+    assert recorder.recorded == 70000
+    assert [topic for _, topic, _ in read_log(path)] == topics
+
+def test_reads_version_1_logs(tmp_path):
+    path = tmp_path / "old.log"
+    name = b"smartroom/sensors/noise"
+    path.write_bytes(b"SRTLOG1\n" + LOG_HEADER.pack(0.0) +
+                     struct.pack("<cHH", b'T', 0, len(name)) + name +
+                     struct.pack("<cHQI", b'M', 0, 2500000, 2) + b"42")
+    assert list(read_log(path)) == [(2.5, "smartroom/sensors/noise", b"42")]
+
+def test_truncated_log_stops_cleanly(tmp_path):
+    path = tmp_path / "cut.log"
+    record(path, [("smartroom/sensors/noise", b"payload", 0.0), ("smartroom/sensors/noise", b"more", 1.0)])
+    path.write_bytes(path.read_bytes()[:-2])
+    assert len(list(read_log(path))) == 1
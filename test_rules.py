@@ -0,0 +1,148 @@
+import json
+import os
+from types import SimpleNamespace
+import pytest
+from rules import RuleEngine, compile_rules
+
+def engine_for(*rules):
+    engine = RuleEngine()
+    engine.plan = compile_rules({"rules": list(rules)})
+    return engine
+
+def climate(**fields):
+    return SimpleNamespace(actuator_type="climate_control", **fields)
+
+def selected(engine, actuator):
+    return [rule.name for rule, _ in engine.select(actuator)]
+
+@pytest.mark.parametrize("spec", [
+    [],
+    {"rules": {}},
+    {"rules": ["not a rule"]},
+    {"rules": [{"name": "r"}]},
+    {"rules": [{"name": 3, "actuator": "a"}]},
+    {"rules": [{"actuator": "a", "when": {}}]},
+    {"rules": [{"actuator": "a", "when": [{"value": 1}]}]},
+    {"rules": [{"actuator": "a", "when": [{"sensor": "noise", "op": "~", "value": 1}]}]},
+    {"rules": [{"actuator": "a", "when": [{"sensor": "noise"}]}]},
+    {"rules": [{"actuator": "a", "when": [{"sensor": "noise", "op": "between", "value": 1}]}]},
+    {"rules": [{"actuator": "a", "when": [{"sensor": "noise", "value": 1, "for": "1m"}]}]},
+    {"rules": [{"actuator": "a", "when": [{"sensor": "noise", "value": {"add": 1}}]}]},
+    {"rules": [{"actuator": "a", "when": [{"sensor": "noise", "value": {"field": "x", "add": "1"}}]}]},
+    {"rules": [{"actuator": "a", "when": [{"sensor": "noise", "value": {"field": "x"}, "for": 5}]}]},
+    {"rules": [{"actuator": "a", "min_matches": "1"}]},
+    {"rules": [{"actuator": "a", "priority": "high"}]},
+    {"rules": [{"actuator": "a", "set": ["state"]}]},
+    {"rules": [{"actuator": "a", "notify": 1}]},
+    {"rules": [{"name": "same", "actuator": "a"}, {"name": "same", "actuator": "b"}]},
+])
+def test_invalid_rules_raise_value_error(spec):
+    with pytest.raises(ValueError):
+        compile_rules(spec)
+
+def test_field_reference_follows_actuator_field():
+    engine = engine_for({"name": "cool", "actuator": "climate_control",
+                         "when": [{"sensor": "temperature", "op": ">",
+                                   "value": {"field": "target_temp", "add": 2}}]})
+    actuator = climate(target_temp=22)
+    engine.observe("temperature", 24.5, now=0)
+    assert selected(engine, actuator) == ["cool"]
+    actuator.target_temp = 23
+    assert selected(engine, actuator) == []
+    actuator.target_temp = None
+    assert selected(engine, actuator) == []
+
+def test_field_reference_to_other_actuator_and_between():
+    engine = engine_for({"name": "in_band", "actuator": "notification_system",
+                         "when": [{"sensor": "temperature", "op": "between",
+                                   "value": [{"field": "target_temp", "add": -1, "actuator": "climate_control"},
+                                             {"field": "target_temp", "add": 1, "actuator": "climate_control"}]}]})
+    engine.register(climate(target_temp=21))
+    notifier = SimpleNamespace(actuator_type="notification_system")
+    engine.observe("temperature", 21.8, now=0)
+    assert selected(engine, notifier) == ["in_band"]
+    engine.observe("temperature", 22.5, now=1)
+    assert selected(engine, notifier) == []
+
+def test_for_duration():
+    engine = engine_for({"name": "loud", "actuator": "focus_mode",
+                         "when": [{"sensor": "noise", "op": ">", "value": 70, "for": 60}]})
+    focus = SimpleNamespace(actuator_type="focus_mode")
+    engine.observe("noise", 75, now=0)
+    assert selected(engine, focus) == []
+    engine.observe("noise", 80, now=59)
+    assert selected(engine, focus) == []
+    engine.observe("noise", 72, now=60)
+    assert selected(engine, focus) == ["loud"]
+    # Dropping below the threshold restarts the timer
+    engine.observe("noise", 60, now=61)
+    engine.observe("noise", 75, now=62)
+    assert selected(engine, focus) == []
+    engine.observe("noise", 75, now=122)
+    assert selected(engine, focus) == ["loud"]
+
+def test_priority_and_groups():
+    engine = engine_for(
+        {"name": "low", "actuator": "climate_control", "priority": 1,
+         "when": [{"sensor": "temperature", "op": ">", "value": 20}]},
+        {"name": "high", "actuator": "climate_control", "priority": 5,
+         "when": [{"sensor": "temperature", "op": ">", "value": 25}]},
+        {"name": "first", "actuator": "climate_control", "group": "alerts",
+         "when": [{"sensor": "temperature", "op": ">", "value": 20}]},
+        {"name": "second", "actuator": "climate_control", "group": "alerts",
+         "when": [{"sensor": "temperature", "op": ">", "value": 20}]})
+    actuator = climate()
+    engine.observe("temperature", 22, now=0)
+    assert selected(engine, actuator) == ["low", "first"]
+    engine.observe("temperature", 26, now=1)
+    assert selected(engine, actuator) == ["high", "first"]
+
+def test_min_matches():
+    engine = engine_for({"name": "uncomfortable", "actuator": "notification_system", "min_matches": 2,
+                         "when": [{"sensor": "temperature", "op": ">", "value": 26},
+                                  {"sensor": "humidity", "op": ">", "value": 70},
+                                  {"sensor": "noise", "op": ">", "value": 60}]})
+    notifier = SimpleNamespace(actuator_type="notification_system")
+    engine.observe("temperature", 27, now=0)
+    assert selected(engine, notifier) == []
+    engine.observe("noise", 65, now=0)
+    assert selected(engine, notifier) == ["uncomfortable"]
+    _, fields = engine.select(notifier)[0]
+    assert fields['matched'].count("\n") == 1
+    assert fields['humidity'] == '?'
+
+def test_actuator_condition():
+    engine = engine_for({"name": "auto_only", "actuator": "climate_control",
+                         "when": [{"actuator": "climate_control", "field": "mode", "value": "AUTO"}]})
+    assert selected(engine, climate(mode="AUTO")) == ["auto_only"]
+    assert selected(engine, climate(mode="OFF")) == []
+
+def write_rules(path, rules, mtime):
+    path.write_text(rules if isinstance(rules, str) else json.dumps({"rules": rules}))
+    os.utime(path, (mtime, mtime))
+
+def test_invalid_reload_keeps_previous_plan(tmp_path):
+    path = tmp_path / "rules.json"
+    write_rules(path, [{"name": "quiet", "actuator": "focus_mode"}], 1000)
+    engine = RuleEngine(str(path), reload_interval=0)
+    assert [rule.name for rule in engine.plan.rules] == ["quiet"]
+
+    for mtime, broken in ((2000, "{not json"),
+                          (3000, [{"name": "a", "actuator": "x"}, {"name": "a", "actuator": "y"}]),
+                          (4000, [{"name": "bad", "actuator": "x", "when": [{"sensor": "noise"}]}])):
+        write_rules(path, broken, mtime)
+        assert not engine.maybe_reload()
+        assert [rule.name for rule in engine.plan.rules] == ["quiet"]
+        assert engine.mtime == mtime
+    assert engine.reloads == 1
+
+    write_rules(path, [{"name": "loud", "actuator": "focus_mode"}], 5000)
+    assert engine.maybe_reload()
+    assert [rule.name for rule in engine.plan.rules] == ["loud"]
+    assert engine.reloads == 2
+
+def test_shipped_rules_compile():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+    engine = RuleEngine(path)
+    assert engine.plan.rules
+    assert len({rule.name for rule in engine.plan.rules}) == len(engine.plan.rules)
@@ -8,11 +8,12 @@ import json
 import paho.mqtt.client as mqtt
 import threading
 import time
+from codec import decode_payload
 
 # MQTT Configuration
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
-MQTT_TOPIC = "smartroom/+/+"
+MQTT_TOPIC = "smartroom/sensors/#"
 
 class DataVisualizer:
     """Real-time data visualization for IoT sensors"""
@@ -74,7 +75,7 @@ class DataVisualizer:
     def on_message(self, client, userdata, msg):
         """Process incoming sensor data"""
         try:
-            data = json.loads(msg.payload.decode())
+            data = decode_payload(msg.topic, msg.payload)
             sensor_type = data.get('type')
             
             if sensor_type in self.data_buffers: